@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Formato binario compacto (memory-mappable) da matriz de bairros.
+
+Layout (little-endian, secoes alinhadas em 8 bytes):
+  - cabecalho: magic "RBMX", versao (u16), reservado (u16), n (u32),
+    quantidade de secoes (u32)
+  - diretorio de secoes: tag ASCII de 8 bytes, offset (u64), tamanho (u64)
+  - secao "order": nomes dos bairros em UTF-8 separados por "\\n"
+  - secoes "dist_m" / "dur_s": n*n uint32 em ordem de linha, com
+    NULL_U32 representando celula sem rota
+
+O leitor mapeia o arquivo com mmap e responde pares por indice em O(1),
+sem parsear JSON.
+
+Uso (converter uma matriz JSON existente):
+  python Docs/scripts/bairro_matrix_bin.py Docs/data/imperatriz_bairros_matriz.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any
+
+MAGIC = b"RBMX"
+FORMAT_VERSION = 1
+NULL_U32 = 0xFFFFFFFF
+HEADER = struct.Struct("<4sHHII")
+SECTION = struct.Struct("<8sQQ")
+ALIGN = 8
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _tag(name: str) -> bytes:
+    raw = name.encode("ascii")
+    if len(raw) > 8:
+        raise ValueError(f"Tag de secao maior que 8 bytes: {name}")
+    return raw.ljust(8, b"\0")
+
+
+def pack_u32_matrix(rows: list[list[int | None]]) -> bytes:
+    values = array("I")
+    for row in rows:
+        values.extend(NULL_U32 if v is None else int(v) for v in row)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def pack_u32_array(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _layout(sizes: dict[str, int]) -> tuple[bytes, dict[str, int]]:
+    offset = _align(HEADER.size + SECTION.size * len(sizes))
+    directory: list[bytes] = []
+    offsets: dict[str, int] = {}
+    for name, size in sizes.items():
+        directory.append(SECTION.pack(_tag(name), offset, size))
+        offsets[name] = offset
+        offset = _align(offset + size)
+    return b"".join(directory), offsets
+
+
+def write_sections(path: Path, n: int, sections: dict[str, bytes], magic: bytes = MAGIC) -> None:
+    directory, offsets = _layout({name: len(payload) for name, payload in sections.items()})
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(HEADER.pack(magic, FORMAT_VERSION, 0, n, len(sections)))
+        fh.write(directory)
+        for name, payload in sections.items():
+            fh.write(b"\0" * (offsets[name] - fh.tell()))
+            fh.write(payload)
+    os.replace(tmp_path, path)
+
+
+def write_matrix_bin(
+    path: Path,
+    order: list[str],
+    distance_m: list[list[int | None]],
+    duration_s: list[list[int | None]],
+    extra_sections: dict[str, bytes] | None = None,
+) -> None:
+    sections: dict[str, bytes] = {
+        "order": "\n".join(order).encode("utf-8"),
+        "dist_m": pack_u32_matrix(distance_m),
+        "dur_s": pack_u32_matrix(duration_s),
+    }
+    sections.update(extra_sections or {})
+    write_sections(path, len(order), sections)
+
+
+class MatrixBinStreamWriter:
+    """Escreve o RBMX linha a linha, sem manter a matriz N x N em memoria.
+
+    O layout depende so de n, entao cada linha vai direto para o offset
+    final de `dist_m`/`dur_s`.
+    """
+
+    def __init__(self, path: Path, order: list[str]) -> None:
+        self.path = path
+        self.n = len(order)
+        order_bytes = "\n".join(order).encode("utf-8")
+        matrix_size = self.n * self.n * 4
+        directory, self.offsets = _layout({"order": len(order_bytes), "dist_m": matrix_size, "dur_s": matrix_size})
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = path.with_name(path.name + ".tmp")
+        self._fh = self._tmp_path.open("wb")
+        self._fh.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.n, 3))
+        self._fh.write(directory)
+        self._fh.seek(self.offsets["order"])
+        self._fh.write(order_bytes)
+
+    def _write_row(self, section: str, row_index: int, values: array) -> None:
+        if len(values) != self.n:
+            raise ValueError(f"Linha com {len(values)} valores, esperado {self.n}")
+        if sys.byteorder == "big":
+            values = array("I", values)
+            values.byteswap()
+        self._fh.seek(self.offsets[section] + row_index * self.n * 4)
+        self._fh.write(values.tobytes())
+
+    def write_row(self, row_index: int, distance_row: array, duration_row: array) -> None:
+        self._write_row("dist_m", row_index, distance_row)
+        self._write_row("dur_s", row_index, duration_row)
+
+    def close(self) -> None:
+        end = self.offsets["dur_s"] + self.n * self.n * 4
+        self._fh.truncate(end)
+        self._fh.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class SectionFile:
+    """Leitor mmap generico do container de secoes (cabecalho + diretorio)."""
+
+    def __init__(self, path: Path | str, magic: bytes = MAGIC) -> None:
+        self.path = Path(path)
+        self._fh = self.path.open("rb")
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, version, _reserved, n, section_count = HEADER.unpack_from(self._mm, 0)
+        if file_magic != magic:
+            self.close()
+            raise ValueError(f"Arquivo nao e {magic.decode('ascii')}: {self.path}")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Versao {magic.decode('ascii')} nao suportada: {version}")
+        self.n = n
+        self.sections: dict[str, tuple[int, int]] = {}
+        for k in range(section_count):
+            tag, offset, length = SECTION.unpack_from(self._mm, HEADER.size + k * SECTION.size)
+            self.sections[tag.rstrip(b"\0").decode("ascii")] = (offset, length)
+        self._view = memoryview(self._mm)
+        self._exports: list[memoryview] = []
+        self._order: list[str] | None = None
+
+    @property
+    def order(self) -> list[str]:
+        if self._order is None:
+            self._order = bytes(self.section("order")).decode("utf-8").split("\n") if self.n else []
+        return self._order
+
+    def section(self, name: str) -> memoryview:
+        offset, length = self.sections[name]
+        return self._view[offset : offset + length]
+
+    def typed_section(self, name: str, typecode: str) -> memoryview | array:
+        raw = self.section(name)
+        if sys.byteorder == "little":
+            view = raw.cast(typecode)
+            self._exports.append(view)
+            return view
+        values = array(typecode, raw.tobytes())
+        values.byteswap()
+        return values
+
+    def u32_section(self, name: str) -> memoryview | array:
+        return self.typed_section(name, "I")
+
+    def close(self) -> None:
+        # memoryviews precisam ser liberados antes de fechar o mmap.
+        for view in getattr(self, "_exports", []):
+            view.release()
+        if hasattr(self, "_view"):
+            self._view.release()
+        self._mm.close()
+        self._fh.close()
+
+    def __enter__(self) -> SectionFile:
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+
+class BinaryBairroMatrix(SectionFile):
+    """Leitor mmap da matriz binaria; lookups por indice sem parse."""
+
+    def __init__(self, path: Path | str) -> None:
+        super().__init__(path)
+        self.distance_m = self.u32_section("dist_m")
+        self.duration_s = self.u32_section("dur_s")
+        self._positions: dict[str, int] | None = None
+
+    def index_of(self, name: str) -> int | None:
+        if self._positions is None:
+            self._positions = {bairro: i for i, bairro in enumerate(self.order)}
+        return self._positions.get(name)
+
+    def lookup(self, origin: int, destination: int) -> tuple[int, int] | None:
+        cell = origin * self.n + destination
+        distance = self.distance_m[cell]
+        duration = self.duration_s[cell]
+        if distance == NULL_U32 or duration == NULL_U32:
+            return None
+        return distance, duration
+
+    def lookup_names(self, origin: str, destination: str) -> tuple[int, int] | None:
+        oi = self.index_of(origin)
+        di = self.index_of(destination)
+        if oi is None or di is None:
+            return None
+        return self.lookup(oi, di)
+
+    def __enter__(self) -> BinaryBairroMatrix:
+        return self
+
+
+def load_matrix_arrays(path: Path | str) -> tuple[list[str], array, array]:
+    matrix_path = Path(path)
+    if matrix_path.suffix.lower() == ".bin":
+        with BinaryBairroMatrix(matrix_path) as matrix:
+            return list(matrix.order), array("I", matrix.distance_m), array("I", matrix.duration_s)
+
+    payload = json.loads(matrix_path.read_text(encoding="utf-8"))
+    matrix = payload["matrix"]
+    distance = array("I", (NULL_U32 if v is None else int(v) for row in matrix["distance_m"] for v in row))
+    duration = array("I", (NULL_U32 if v is None else int(v) for row in matrix["duration_s"] for v in row))
+    return list(matrix["order"]), distance, duration
+
+
+def convert_json(json_path: Path, bin_path: Path) -> None:
+    payload = json.loads(json_path.read_text(encoding="utf-8"))
+    matrix = payload["matrix"]
+    write_matrix_bin(bin_path, matrix["order"], matrix["distance_m"], matrix["duration_s"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Converte a matriz JSON de bairros para RBMX.")
+    parser.add_argument("input", help="Matriz JSON gerada pelo generate_imperatriz_bairro_matrix.py.")
+    parser.add_argument("--output", help="Arquivo .bin de saida (default: mesmo nome com .bin).")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    out_path = Path(args.output) if args.output else in_path.with_suffix(".bin")
+    convert_json(in_path, out_path)
+    print(f"[DONE] Matriz binaria salva em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
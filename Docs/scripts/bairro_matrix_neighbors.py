@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Listas de vizinhos por origem (k mais proximos e raio de duracao/distancia).
+
+O despacho pergunta "quais bairros estao a ate N minutos desta coleta"; com
+so a matriz densa isso e varrer e ordenar a linha inteira a cada chamada.
+Aqui cada origem ganha, pre-calculadas, as colunas alcancaveis (distancia e
+duracao com rota, incluindo a propria origem) ordenadas por duracao e por
+distancia. Empates ficam na ordem da matriz.
+
+As listas vao no mesmo RBMX da matriz, como secoes extras:
+  - secao "nb_meta": JSON com o tipo do indice ("H" uint16 ate 65535
+    bairros, senao "I" uint32) e o limite por origem (0 = todos)
+  - secao "nb_off": n+1 uint32; a lista da origem i ocupa [off[i], off[i+1])
+  - secoes "nb_dur" / "nb_dist": indices de destino ordenados por duracao /
+    por distancia, mesmo offset nas duas
+
+Consultas: k mais proximos e fatia direta da lista; o raio e uma busca
+binaria (`bisect` com chave na linha da matriz), O(log n) por chamada. Com
+limite por origem, o raio so enxerga os `limit` primeiros vizinhos.
+
+Uso:
+  python Docs/scripts/bairro_matrix_neighbors.py Docs/data/imperatriz_bairros_matriz.json
+  python Docs/scripts/bairro_matrix_neighbors.py Docs/data/imperatriz_bairros_matriz.bin \\
+      --origin Centro --within-min 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any
+
+from bairro_matrix_bin import (
+    NULL_U32,
+    BinaryBairroMatrix,
+    SectionFile,
+    load_matrix_arrays,
+    pack_u32_array,
+    write_sections,
+)
+from bairro_name_index import BairroNameIndex
+
+META_SECTION = "nb_meta"
+OFFSET_SECTION = "nb_off"
+ORDER_SECTIONS = {"duration": "nb_dur", "distance": "nb_dist"}
+NEIGHBOR_SECTIONS = (META_SECTION, OFFSET_SECTION, *ORDER_SECTIONS.values())
+
+
+def parse_neighbor_limit(value: str | int) -> int | None:
+    """"all" -> 0 (todos), "off" -> None, "K" -> K vizinhos por origem."""
+    text = str(value).strip().lower()
+    if text == "off":
+        return None
+    if text in ("", "all"):
+        return 0
+    limit = int(text)
+    if limit < 0:
+        raise ValueError(f"Limite de vizinhos invalido: {value}")
+    return limit
+
+
+def index_typecode(n: int) -> str:
+    return "H" if n <= 0xFFFF else "I"
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def build_neighbor_lists(
+    n: int,
+    distance_m: array,
+    duration_s: array,
+    limit: int = 0,
+) -> tuple[array, dict[str, array]]:
+    """(offsets, {"duration": indices, "distance": indices}) com as linhas concatenadas."""
+    typecode = index_typecode(n)
+    offsets = array("I", [0])
+    lists = {by: array(typecode) for by in ORDER_SECTIONS}
+    columns = range(n)
+    for origin in range(n):
+        base = origin * n
+        dist_row = distance_m[base : base + n]
+        dur_row = duration_s[base : base + n]
+        reachable = [j for j in columns if dist_row[j] != NULL_U32 and dur_row[j] != NULL_U32]
+        # sorted e estavel: empates ficam na ordem da matriz.
+        by_duration = sorted(reachable, key=dur_row.__getitem__)
+        by_distance = sorted(reachable, key=dist_row.__getitem__)
+        if limit:
+            by_duration = by_duration[:limit]
+            by_distance = by_distance[:limit]
+        lists["duration"].extend(by_duration)
+        lists["distance"].extend(by_distance)
+        offsets.append(offsets[-1] + len(by_duration))
+    return offsets, lists
+
+
+def neighbor_sections(n: int, distance_m: array, duration_s: array, limit: int = 0) -> dict[str, bytes]:
+    offsets, lists = build_neighbor_lists(n, distance_m, duration_s, limit)
+    meta = {"index_type": index_typecode(n), "limit": limit, "orders": list(ORDER_SECTIONS)}
+    sections = {
+        META_SECTION: json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        OFFSET_SECTION: pack_u32_array(offsets),
+    }
+    for by, section in ORDER_SECTIONS.items():
+        sections[section] = _pack(lists[by])
+    return sections
+
+
+class NeighborMatrix(BinaryBairroMatrix):
+    """RBMX com listas de vizinhos; sem as secoes, ordena a linha na hora."""
+
+    def __init__(self, path: Path | str) -> None:
+        super().__init__(path)
+        self.meta: dict[str, Any] | None = None
+        self.offsets: Any = None
+        self.lists: dict[str, Any] = {}
+        if META_SECTION in self.sections:
+            self.meta = json.loads(bytes(self.section(META_SECTION)).decode("utf-8"))
+            self.offsets = self.u32_section(OFFSET_SECTION)
+            for by, section in ORDER_SECTIONS.items():
+                self.lists[by] = self.typed_section(section, self.meta["index_type"])
+        self._values = {"duration": self.duration_s, "distance": self.distance_m}
+
+    def neighbors(self, origin: int, by: str = "duration") -> Any:
+        """Destinos alcancaveis a partir de `origin`, do mais proximo ao mais distante."""
+        values = self._values[by]
+        base = origin * self.n
+        if self.offsets is None:
+            reachable = [
+                j
+                for j in range(self.n)
+                if self.distance_m[base + j] != NULL_U32 and self.duration_s[base + j] != NULL_U32
+            ]
+            return sorted(reachable, key=lambda j: values[base + j])
+        return self.lists[by][self.offsets[origin] : self.offsets[origin + 1]]
+
+    def _rows(self, origin: int, indices: Any) -> list[tuple[int, int, int]]:
+        base = origin * self.n
+        return [(j, self.distance_m[base + j], self.duration_s[base + j]) for j in indices]
+
+    def nearest(self, origin: int, k: int, by: str = "duration") -> list[tuple[int, int, int]]:
+        """Ate `k` vizinhos mais proximos: (indice, distance_m, duration_s)."""
+        return self._rows(origin, self.neighbors(origin, by)[:k])
+
+    def within_indices(self, origin: int, max_value: int, by: str = "duration") -> Any:
+        """Indices com duracao (s) ou distancia (m) <= `max_value`, sem copiar a lista."""
+        values = self._values[by]
+        base = origin * self.n
+        indices = self.neighbors(origin, by)
+        return indices[: bisect_right(indices, max_value, key=lambda j: values[base + j])]
+
+    def within(self, origin: int, max_value: int, by: str = "duration") -> list[tuple[int, int, int]]:
+        """Vizinhos ate `max_value`, do mais proximo ao mais distante: (indice, distance_m, duration_s)."""
+        return self._rows(origin, self.within_indices(origin, max_value, by))
+
+    def __enter__(self) -> NeighborMatrix:
+        return self
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera ou consulta listas de vizinhos por origem no RBMX.")
+    parser.add_argument("input", help="Matriz JSON/.bin (gera o .bin com vizinhos) ou .bin com vizinhos (consulta).")
+    parser.add_argument("--output", help="RBMX de saida (default: mesmo nome com .bin).")
+    parser.add_argument(
+        "--limit",
+        default="all",
+        help="Vizinhos guardados por origem: 'all' ou K (default: all).",
+    )
+    parser.add_argument("--origin", help="Bairro de origem (consulta).")
+    parser.add_argument("--k", type=int, help="Consulta os K vizinhos mais proximos.")
+    parser.add_argument("--within-min", type=float, help="Consulta vizinhos a ate N minutos.")
+    parser.add_argument("--within-m", type=int, help="Consulta vizinhos a ate N metros (ordem por distancia).")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    if args.origin:
+        with NeighborMatrix(in_path) as matrix:
+            oi = BairroNameIndex.from_order(matrix.order).resolve(args.origin)
+            if oi is None:
+                parser.error("Bairro fora da matriz.")
+            started = time.perf_counter()
+            if args.within_m is not None:
+                rows = matrix.within(oi, args.within_m, by="distance")
+            elif args.within_min is not None:
+                rows = matrix.within(oi, int(args.within_min * 60))
+            else:
+                rows = matrix.nearest(oi, args.k or 10)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(
+                json.dumps(
+                    {
+                        "origin": matrix.order[oi],
+                        "precomputed": matrix.meta is not None,
+                        "query_ms": round(elapsed_ms, 4),
+                        "neighbors": [
+                            {"bairro": matrix.order[j], "distance_m": distance, "duration_s": duration}
+                            for j, distance, duration in rows
+                        ],
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                flush=True,
+            )
+        return
+
+    limit = parse_neighbor_limit(args.limit)
+    if limit is None:
+        parser.error("--limit off nao gera nada.")
+    out_path = Path(args.output) if args.output else in_path.with_suffix(".bin")
+    sections: dict[str, bytes] = {}
+    if in_path.suffix.lower() == ".bin":
+        # Preserva as demais secoes extras (ex.: camadas por faixa horaria).
+        with SectionFile(in_path) as source:
+            sections = {
+                name: bytes(source.section(name)) for name in source.sections if name not in NEIGHBOR_SECTIONS
+            }
+    order, distance_m, duration_s = load_matrix_arrays(in_path)
+    if not sections:
+        sections = {
+            "order": "\n".join(order).encode("utf-8"),
+            "dist_m": pack_u32_array(distance_m),
+            "dur_s": pack_u32_array(duration_s),
+        }
+    sections.update(neighbor_sections(len(order), distance_m, duration_s, limit))
+    write_sections(out_path, len(order), sections)
+    print(f"[DONE] Listas de vizinhos de {len(order)} origens salvas em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
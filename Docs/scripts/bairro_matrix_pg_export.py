@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""Exporta a matriz de bairros para carga via COPY em locality_bairro_matrix.
+
+Gera, num diretorio de export:
+  - `bairros.csv`: bairros da cidade (id deterministico igual ao seed
+    `020_locality.seed.ts`, nome canonico e normalized_name);
+  - `matrix.csv` ou `matrix.copy` (COPY BINARY): so as celulas que mudaram
+    em relacao a matriz anterior (ou todas, sem matriz anterior);
+  - `load.sql`: script psql que sobe os arquivos para tabelas temporarias com
+    `\\copy` e faz upsert em lote (INSERT ... ON CONFLICT) numa transacao;
+  - `export_summary.json`: contagens do diff.
+
+Celulas que deixaram de ter rota nao sao apagadas no banco: a ultima rota
+valida continua servindo ate a proxima geracao resolver o par. Ja um bairro
+da cidade que saiu da matriz (fora de `bairros.csv`, que vai sempre
+completo) perde todos os pares no `load.sql` e fica com is_active = FALSE;
+o id segue valido para o historico.
+
+Matriz atual e anterior em RBMX (.bin) sao lidas via mmap, sem carregar as
+n*n celulas em memoria; o RBMX nao tem city/state, que vem de
+`--city`/`--state`.
+
+Uso:
+  python Docs/scripts/bairro_matrix_pg_export.py Docs/data/imperatriz_bairros_matriz.json \\
+    --previous /tmp/matriz_anterior.bin --output-dir /tmp/pg_export
+  python Docs/scripts/bairro_matrix_pg_export.py Docs/data/imperatriz_bairros_matriz.bin \\
+    --city Imperatriz --state MA --previous /tmp/matriz_anterior.bin --output-dir /tmp/pg_export
+  psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f /tmp/pg_export/load.sql
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import struct
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+from bairro_matrix_bin import NULL_U32, BinaryBairroMatrix, load_matrix_arrays
+
+SOURCE_PROVIDER = "local_bairro_matrix"
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\0"
+
+# Espelha Packages/Backend/prisma/seeds (ids fixos e aliases canonicos), para
+# que seed e carga via COPY apontem para as mesmas linhas de locality_bairros.
+FIXED_BAIRRO_IDS = {
+    "centro": "00000000-0000-0000-0000-000000000401",
+    "vila lobao": "00000000-0000-0000-0000-000000000402",
+    "bacuri": "00000000-0000-0000-0000-000000000404",
+    "parque sao jose": "00000000-0000-0000-0000-000000000403",
+    "sao jose": "00000000-0000-0000-0000-000000000403",
+}
+CANONICAL_NAMES = {"parque sao jose": "São José"}
+
+MATRIX_COLUMNS = (
+    ("origin_normalized", "text"),
+    ("destination_normalized", "text"),
+    ("distance_m", "int4"),
+    ("duration_s", "int4"),
+    ("source_provider", "text"),
+    ("source_metadata", "jsonb"),
+)
+BAIRRO_COLUMNS = (("id", "uuid"), ("name", "text"), ("normalized_name", "text"))
+
+
+def normalize_bairro(value: str) -> str:
+    text = unicodedata.normalize("NFD", value)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def deterministic_bairro_id(city: str, state: str, normalized_name: str) -> str:
+    digest = list(hashlib.sha1(f"roodi:locality:{city}|{state}|{normalized_name}".encode("utf-8")).hexdigest()[:32])
+    digest[12] = "5"
+    digest[16] = format((int(digest[16], 16) & 0x3) | 0x8, "x")
+    raw = "".join(digest)
+    return f"{raw[0:8]}-{raw[8:12]}-{raw[12:16]}-{raw[16:20]}-{raw[20:32]}"
+
+
+def canonical_bairros(order: list[str], city: str, state: str) -> list[dict[str, str] | None]:
+    """Bairro canonico por posicao de `order`; None para duplicatas de normalized_name."""
+    seen: set[str] = set()
+    result: list[dict[str, str] | None] = []
+    for source_name in order:
+        normalized_source = normalize_bairro(source_name)
+        name = CANONICAL_NAMES.get(normalized_source, source_name)
+        normalized = normalize_bairro(name)
+        if normalized in seen:
+            print(f"[WARN] Bairro duplicado apos normalizacao, ignorado: {source_name}", flush=True)
+            result.append(None)
+            continue
+        seen.add(normalized)
+        result.append(
+            {
+                "id": FIXED_BAIRRO_IDS.get(normalized_source) or deterministic_bairro_id(city, state, normalized),
+                "source_name": source_name,
+                "name": name,
+                "normalized_name": normalized,
+            }
+        )
+    return result
+
+
+def has_route(distance: int, duration: int) -> bool:
+    return distance != NULL_U32 and duration != NULL_U32 and distance > 0 and duration > 0
+
+
+MatrixArrays = tuple[list[str], Sequence[int], Sequence[int]]
+
+
+@contextlib.contextmanager
+def open_matrix(path: Path | str) -> Iterator[MatrixArrays]:
+    """(order, distance_m, duration_s); RBMX via mmap, JSON carregado em arrays."""
+    matrix_path = Path(path)
+    if matrix_path.suffix.lower() == ".bin":
+        with BinaryBairroMatrix(matrix_path) as matrix:
+            yield matrix.order, matrix.distance_m, matrix.duration_s
+        return
+    yield load_matrix_arrays(matrix_path)
+
+
+def diff_cells(
+    order: list[str],
+    distance_m: Sequence[int],
+    duration_s: Sequence[int],
+    previous: MatrixArrays | None,
+    summary: dict[str, int],
+) -> Iterator[tuple[int, int, int, int]]:
+    """Celulas (i, j, distancia, duracao) com rota que mudaram desde `previous`."""
+    n = len(order)
+    prev_positions: dict[str, int] = {}
+    prev_n = 0
+    prev_distance: Sequence[int] = array("I")
+    prev_duration: Sequence[int] = array("I")
+    if previous is not None:
+        prev_order, prev_distance, prev_duration = previous
+        prev_positions = {name: k for k, name in enumerate(prev_order)}
+        prev_n = len(prev_order)
+    for i, origin in enumerate(order):
+        pi = prev_positions.get(origin)
+        for j, destination in enumerate(order):
+            if i == j:
+                continue
+            cell = i * n + j
+            distance = distance_m[cell]
+            duration = duration_s[cell]
+            pj = prev_positions.get(destination)
+            prev_cell = pi * prev_n + pj if pi is not None and pj is not None else None
+            if not has_route(distance, duration):
+                if prev_cell is not None and has_route(prev_distance[prev_cell], prev_duration[prev_cell]):
+                    summary["dropped"] += 1
+                else:
+                    summary["no_route"] += 1
+                continue
+            if prev_cell is None or not has_route(prev_distance[prev_cell], prev_duration[prev_cell]):
+                summary["new"] += 1
+            elif prev_distance[prev_cell] != distance or prev_duration[prev_cell] != duration:
+                summary["changed"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            yield i, j, distance, duration
+
+
+class CsvCopyWriter:
+    """Stream CSV com cabecalho, para `\\copy ... WITH (FORMAT csv, HEADER true)`."""
+
+    copy_options = "FORMAT csv, HEADER true"
+
+    def __init__(self, path: Path, columns: tuple[tuple[str, str], ...]) -> None:
+        self._fh = path.open("w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._fh, lineterminator="\n")
+        self._writer.writerow(name for name, _type in columns)
+
+    def write_row(self, values: tuple[Any, ...]) -> None:
+        self._writer.writerow(values)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class BinaryCopyWriter:
+    """Stream no formato COPY BINARY do PostgreSQL (sem parse de texto no servidor)."""
+
+    copy_options = "FORMAT binary"
+
+    def __init__(self, path: Path, columns: tuple[tuple[str, str], ...]) -> None:
+        self._fh = path.open("wb")
+        self._types = [pg_type for _name, pg_type in columns]
+        self._fh.write(PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0))
+
+    def _encode(self, pg_type: str, value: Any) -> bytes:
+        if pg_type == "int4":
+            return struct.pack(">i", int(value))
+        if pg_type == "jsonb":
+            return b"\x01" + str(value).encode("utf-8")
+        if pg_type == "uuid":
+            return bytes.fromhex(str(value).replace("-", ""))
+        return str(value).encode("utf-8")
+
+    def write_row(self, values: tuple[Any, ...]) -> None:
+        parts = [struct.pack(">h", len(values))]
+        for pg_type, value in zip(self._types, values):
+            if value is None:
+                parts.append(struct.pack(">i", -1))
+                continue
+            payload = self._encode(pg_type, value)
+            parts.append(struct.pack(">i", len(payload)))
+            parts.append(payload)
+        self._fh.write(b"".join(parts))
+
+    def close(self) -> None:
+        self._fh.write(struct.pack(">h", -1))
+        self._fh.close()
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def render_load_sql(city: str, state: str, bairros_path: Path, matrix_path: Path, copy_options: str) -> str:
+    def stage_columns(columns: tuple[tuple[str, str], ...]) -> str:
+        return ",\n  ".join(f"{name} {pg_type}" for name, pg_type in columns)
+
+    city_sql = sql_literal(city)
+    state_sql = sql_literal(state)
+    return f"""\\set ON_ERROR_STOP on
+BEGIN;
+
+CREATE TEMP TABLE stage_locality_bairros (
+  {stage_columns(BAIRRO_COLUMNS)}
+) ON COMMIT DROP;
+
+CREATE TEMP TABLE stage_locality_bairro_matrix (
+  {stage_columns(MATRIX_COLUMNS)}
+) ON COMMIT DROP;
+
+\\copy stage_locality_bairros FROM {sql_literal(str(bairros_path.resolve()))} WITH (FORMAT csv, HEADER true)
+\\copy stage_locality_bairro_matrix FROM {sql_literal(str(matrix_path.resolve()))} WITH ({copy_options})
+
+INSERT INTO locality_bairros (id, city, state, name, normalized_name, is_active)
+SELECT id, {city_sql}, {state_sql}, name, normalized_name, TRUE
+FROM stage_locality_bairros
+ON CONFLICT (city, state, normalized_name) DO UPDATE SET
+  name = EXCLUDED.name,
+  is_active = TRUE,
+  updated_at = NOW()
+WHERE locality_bairros.name IS DISTINCT FROM EXCLUDED.name
+   OR NOT locality_bairros.is_active;
+
+DELETE FROM locality_bairro_matrix m
+USING locality_bairros b
+WHERE b.city = {city_sql} AND b.state = {state_sql}
+  AND b.id IN (m.origin_bairro_id, m.destination_bairro_id)
+  AND NOT EXISTS (SELECT 1 FROM stage_locality_bairros s WHERE s.normalized_name = b.normalized_name);
+
+UPDATE locality_bairros b SET
+  is_active = FALSE,
+  updated_at = NOW()
+WHERE b.city = {city_sql} AND b.state = {state_sql} AND b.is_active
+  AND NOT EXISTS (SELECT 1 FROM stage_locality_bairros s WHERE s.normalized_name = b.normalized_name);
+
+INSERT INTO locality_bairro_matrix (
+  origin_bairro_id,
+  destination_bairro_id,
+  distance_m,
+  duration_s,
+  source_provider,
+  source_metadata
+)
+SELECT o.id, d.id, s.distance_m, s.duration_s, s.source_provider, s.source_metadata
+FROM stage_locality_bairro_matrix s
+JOIN locality_bairros o
+  ON o.city = {city_sql} AND o.state = {state_sql} AND o.normalized_name = s.origin_normalized
+JOIN locality_bairros d
+  ON d.city = {city_sql} AND d.state = {state_sql} AND d.normalized_name = s.destination_normalized
+ON CONFLICT (origin_bairro_id, destination_bairro_id) DO UPDATE SET
+  distance_m = EXCLUDED.distance_m,
+  duration_s = EXCLUDED.duration_s,
+  source_provider = EXCLUDED.source_provider,
+  source_metadata = EXCLUDED.source_metadata,
+  updated_at = NOW()
+WHERE (locality_bairro_matrix.distance_m, locality_bairro_matrix.duration_s)
+  IS DISTINCT FROM (EXCLUDED.distance_m, EXCLUDED.duration_s);
+
+COMMIT;
+"""
+
+
+def export_pg(
+    matrix_path: Path,
+    output_dir: Path,
+    previous: MatrixArrays | None = None,
+    copy_format: str = "csv",
+    source: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Export da matriz em `matrix_path` (JSON ou RBMX).
+
+    `source` (city, state, generated_at, source_file) e obrigatorio para o
+    RBMX; com ele o JSON nao e parseado.
+    """
+    if source is None:
+        if matrix_path.suffix.lower() == ".bin":
+            raise ValueError("RBMX sem city/generated_at: informe `source` (--city/--state) ou use a matriz JSON.")
+        payload = json.loads(matrix_path.read_text(encoding="utf-8"))
+        source = {
+            "city": payload["city"]["name"],
+            "state": payload["city"]["state"],
+            "generated_at": payload.get("generated_at"),
+            "source_file": str(matrix_path),
+        }
+        del payload
+    with open_matrix(matrix_path) as (order, distance_m, duration_s):
+        return _export_cells(order, distance_m, duration_s, output_dir, previous, copy_format, matrix_path, source)
+
+
+def _export_cells(
+    order: list[str],
+    distance_m: Sequence[int],
+    duration_s: Sequence[int],
+    output_dir: Path,
+    previous: MatrixArrays | None,
+    copy_format: str,
+    matrix_path: Path,
+    source: dict[str, Any],
+) -> dict[str, Any]:
+    city = source["city"]
+    state = source["state"]
+    bairros = canonical_bairros(order, city, state)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    bairros_path = output_dir / "bairros.csv"
+    bairros_writer = CsvCopyWriter(bairros_path, BAIRRO_COLUMNS)
+    for bairro in bairros:
+        if bairro is not None:
+            bairros_writer.write_row((bairro["id"], bairro["name"], bairro["normalized_name"]))
+    bairros_writer.close()
+
+    if copy_format == "binary":
+        matrix_out = output_dir / "matrix.copy"
+        matrix_writer: CsvCopyWriter | BinaryCopyWriter = BinaryCopyWriter(matrix_out, MATRIX_COLUMNS)
+    else:
+        matrix_out = output_dir / "matrix.csv"
+        matrix_writer = CsvCopyWriter(matrix_out, MATRIX_COLUMNS)
+
+    summary = {"new": 0, "changed": 0, "unchanged": 0, "dropped": 0, "no_route": 0}
+    metadata_base = {
+        "source_file": source.get("source_file", str(matrix_path)),
+        "source_generated_at": source.get("generated_at"),
+        "source_city": city,
+        "source_state": state,
+    }
+    for i, j, distance, duration in diff_cells(order, distance_m, duration_s, previous, summary):
+        origin = bairros[i]
+        destination = bairros[j]
+        if origin is None or destination is None:
+            continue
+        metadata = {
+            **metadata_base,
+            "source_origin_name": origin["source_name"],
+            "source_destination_name": destination["source_name"],
+            "metric_source": "matrix",
+        }
+        matrix_writer.write_row(
+            (
+                origin["normalized_name"],
+                destination["normalized_name"],
+                distance,
+                duration,
+                SOURCE_PROVIDER,
+                json.dumps(metadata, ensure_ascii=False, separators=(",", ":")),
+            )
+        )
+    matrix_writer.close()
+
+    load_sql = output_dir / "load.sql"
+    load_sql.write_text(
+        render_load_sql(city, state, bairros_path, matrix_out, matrix_writer.copy_options),
+        encoding="utf-8",
+    )
+    current = {b["normalized_name"] for b in bairros if b is not None}
+    removed = (
+        sorted({normalize_bairro(CANONICAL_NAMES.get(normalize_bairro(name), name)) for name in previous[0]} - current)
+        if previous is not None
+        else []
+    )
+    result = {
+        "matrix": str(matrix_path),
+        "previous": previous is not None,
+        "format": copy_format,
+        "bairros": len(current),
+        "removed_bairros": removed,
+        "upsert_cells": summary["new"] + summary["changed"],
+        **summary,
+    }
+    (output_dir / "export_summary.json").write_text(json.dumps(result, indent=2), encoding="utf-8")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Exporta a matriz de bairros para COPY no PostgreSQL.")
+    parser.add_argument("input", help="Matriz JSON (ou .bin) gerada pelo generate_imperatriz_bairro_matrix.py.")
+    parser.add_argument("--previous", help="Matriz anterior (JSON ou .bin) para exportar so o diff.")
+    parser.add_argument("--output-dir", default="Docs/data/pg_export", help="(default: Docs/data/pg_export)")
+    parser.add_argument("--format", choices=["csv", "binary"], default="csv", help="Formato do COPY da matriz.")
+    parser.add_argument("--city", help="Cidade da matriz, obrigatoria com entrada .bin.")
+    parser.add_argument("--state", help="UF da matriz, obrigatoria com entrada .bin.")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    source = None
+    if in_path.suffix.lower() == ".bin":
+        if not (args.city and args.state):
+            parser.error("Entrada .bin exige --city e --state.")
+        source = {"city": args.city, "state": args.state, "generated_at": None, "source_file": str(in_path)}
+    with contextlib.ExitStack() as stack:
+        previous = stack.enter_context(open_matrix(args.previous)) if args.previous else None
+        result = export_pg(in_path, Path(args.output_dir), previous, args.format, source)
+    print(
+        f"[DONE] Export PG: {result['upsert_cells']} celulas para upsert "
+        f"({result['new']} novas, {result['changed']} alteradas, {result['unchanged']} iguais, "
+        f"{len(result['removed_bairros'])} bairros removidos) em {args.output_dir}",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Validacao geometrica das celulas da matriz de bairros.
+
+Compara cada rota com a distancia haversine entre os centroides ja presentes
+em `bairros` e sinaliza:
+  - ratio: rota/haversine fora de [min_ratio, max_ratio] (geocode ruim ou
+    rota absurda);
+  - asymmetry: (i,j) e (j,i) divergem alem da tolerancia relativa;
+  - triangle: existe k com d(i,k) + d(k,j) bem menor que d(i,j).
+
+Pares com centroides muito proximos (< min_haversine_m) ficam fora do ratio,
+onde a divisao nao tem significado.
+
+O triangulo nao testa todos os k (seria O(n^3)): usa os `triangle_neighbors`
+bairros mais proximos de i (por rota, saindo de i) e de j (chegando em j),
+onde um atalho aparece na pratica. Com a linha de cada k inteira, a soma e o
+minimo sao feitos elemento a elemento (map) sobre a linha/coluna, O(n^2 * k).
+`triangle_neighbors` = 0 desliga o triangulo.
+
+Uso (auditar uma matriz existente):
+  python Docs/scripts/bairro_matrix_sanity.py Docs/data/imperatriz_bairros_matriz.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import math
+import operator
+from collections import Counter
+from itertools import repeat
+from pathlib import Path
+from typing import Any
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_THRESHOLDS = {
+    "max_ratio": 3.0,
+    "min_ratio": 0.9,
+    "asymmetry": 0.5,
+    "triangle": 0.25,
+    "min_haversine_m": 300.0,
+    "min_abs_diff_m": 500.0,
+    "triangle_neighbors": 16,
+}
+REASONS = ("ratio", "asymmetry", "triangle")
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_matrix(bairros: list[dict[str, Any]]) -> list[list[float | None]]:
+    # Trigonometria por bairro calculada uma vez; o par so combina os termos.
+    coords = [
+        (math.radians(b["lat"]), math.radians(b["lon"])) if isinstance(b.get("lat"), float) else None
+        for b in bairros
+    ]
+    cos_lat = [math.cos(c[0]) if c else 0.0 for c in coords]
+    result: list[list[float | None]] = []
+    for i, ci in enumerate(coords):
+        if ci is None:
+            result.append([None] * len(bairros))
+            continue
+        row: list[float | None] = []
+        for j, cj in enumerate(coords):
+            if cj is None:
+                row.append(None)
+                continue
+            a = math.sin((cj[0] - ci[0]) / 2) ** 2 + cos_lat[i] * cos_lat[j] * math.sin((cj[1] - ci[1]) / 2) ** 2
+            row.append(2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a))))
+        result.append(row)
+    return result
+
+
+def nearest_intermediates(rows: list[list[float]], k: int) -> list[list[int]]:
+    """Para cada i, os `k` indices x != i com menor rows[i][x] finito."""
+    inf = math.inf
+    return [
+        heapq.nsmallest(k, (x for x, v in enumerate(row) if v != inf and x != i), key=row.__getitem__)
+        for i, row in enumerate(rows)
+    ]
+
+
+def _shifted_min(base: list[float], vectors: list[list[float]], near: list[int]) -> list[float]:
+    """Elemento a elemento: min sobre x em `near` de base[x] + vectors[x][.] (uma chamada de min por elemento)."""
+    n = len(base)
+    shifted = [map(operator.add, repeat(base[x], n), vectors[x]) for x in near]
+    return list(shifted[0]) if len(shifted) == 1 else list(map(min, *shifted))
+
+
+def triangle_cells(
+    rows: list[list[float]],
+    cols: list[list[float]],
+    t: dict[str, float],
+    cells: set[tuple[int, int]] | None = None,
+) -> set[tuple[int, int]]:
+    """Celulas (i, j) com atalho por um dos vizinhos mais proximos de i ou de j."""
+    k = int(t["triangle_neighbors"])
+    if k <= 0:
+        return set()
+    near_out = nearest_intermediates(rows, k)
+    near_in = nearest_intermediates(cols, k)
+
+    min_diff = t["min_abs_diff_m"]
+    factor = 1 + t["triangle"]
+    inf = math.inf
+    found: set[tuple[int, int]] = set()
+    if cells is not None:
+        for i, j in cells:
+            d = rows[i][j]
+            via = [rows[i][x] + rows[x][j] for x in near_out[i]] + [rows[i][x] + cols[j][x] for x in near_in[j]]
+            if d != inf and via and d - min(via) >= min_diff and d > min(via) * factor:
+                found.add((i, j))
+        return found
+
+    # Saindo de i: d(i,x) + d(x,j) para todo j de uma vez (linha de x deslocada de d(i,x)).
+    for i, near in enumerate(near_out):
+        if near:
+            best = _shifted_min(rows[i], rows, near)
+            found.update(
+                (i, j)
+                for j, (d, b) in enumerate(zip(rows[i], best))
+                if d != inf and d - b >= min_diff and d > b * factor
+            )
+    # Chegando em j: d(i,x) + d(x,j) para todo i de uma vez (coluna de x deslocada de d(x,j)).
+    for j, near in enumerate(near_in):
+        if near:
+            best = _shifted_min(cols[j], cols, near)
+            found.update(
+                (i, j)
+                for i, (d, b) in enumerate(zip(cols[j], best))
+                if d != inf and d - b >= min_diff and d > b * factor
+            )
+    return found
+
+
+def check_cells(
+    distance_m: list[list[int | None]],
+    geodesic_m: list[list[float | None]],
+    thresholds: dict[str, float] | None = None,
+    cells: set[tuple[int, int]] | None = None,
+) -> dict[tuple[int, int], list[str]]:
+    """Celulas sinalizadas -> motivos. `cells` restringe a checagem (re-validacao)."""
+    t = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    n = len(distance_m)
+    inf = math.inf
+    rows = [[inf if v is None else float(v) for v in row] for row in distance_m]
+    cols = [list(col) for col in zip(*rows)]
+    triangles = triangle_cells(rows, cols, t, cells)
+    flagged: dict[tuple[int, int], list[str]] = {}
+
+    targets = cells if cells is not None else ((i, j) for i in range(n) for j in range(n) if i != j)
+    for i, j in targets:
+        d = rows[i][j]
+        if d == inf or d <= 0:
+            continue
+        reasons: list[str] = []
+        geo = geodesic_m[i][j]
+        if geo is not None and geo >= t["min_haversine_m"]:
+            ratio = d / geo
+            if ratio > t["max_ratio"] or ratio < t["min_ratio"]:
+                reasons.append("ratio")
+        mirror = rows[j][i]
+        if mirror != inf and abs(d - mirror) >= t["min_abs_diff_m"]:
+            if abs(d - mirror) / max(d, mirror) > t["asymmetry"]:
+                reasons.append("asymmetry")
+        if (i, j) in triangles:
+            reasons.append("triangle")
+        if reasons:
+            flagged[(i, j)] = reasons
+    return flagged
+
+
+def summarize_findings(
+    order: list[str],
+    flagged: dict[tuple[int, int], list[str]],
+    limit: int = 10,
+) -> dict[str, Any]:
+    by_reason: Counter[str] = Counter(reason for reasons in flagged.values() for reason in reasons)
+    by_bairro: Counter[str] = Counter()
+    for i, j in flagged:
+        by_bairro[order[i]] += 1
+        by_bairro[order[j]] += 1
+    return {
+        "flagged_cells": len(flagged),
+        "by_reason": {reason: by_reason.get(reason, 0) for reason in REASONS},
+        "suspect_bairros": [{"name": name, "cells": count} for name, count in by_bairro.most_common(limit)],
+        "sample": [
+            {"origin": order[i], "destination": order[j], "reasons": reasons}
+            for (i, j), reasons in sorted(flagged.items())[:limit]
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Audita a matriz de bairros contra limites haversine.")
+    parser.add_argument("input", help="Matriz JSON gerada pelo generate_imperatriz_bairro_matrix.py.")
+    for key, value in DEFAULT_THRESHOLDS.items():
+        parser.add_argument(
+            f"--{key.replace('_', '-')}", type=type(value), default=value, help=f"(default: {value})"
+        )
+    args = parser.parse_args()
+
+    payload = json.loads(Path(args.input).read_text(encoding="utf-8"))
+    thresholds = {key: getattr(args, key) for key in DEFAULT_THRESHOLDS}
+    flagged = check_cells(payload["matrix"]["distance_m"], haversine_matrix(payload["bairros"]), thresholds)
+    print(json.dumps(summarize_findings(payload["matrix"]["order"], flagged), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
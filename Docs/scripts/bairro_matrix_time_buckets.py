@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Camadas de duracao por faixa horaria (pico, fora de pico, madrugada).
+
+O OSRM devolve um unico `duration_s` em fluxo livre. Cada faixa do perfil
+(`Docs/config/bairro-time-profiles.json`) aplica um fator de velocidade sobre
+essa base (duracao = base / fator), com fatores proprios por corredor de
+bairros (vale o menor fator entre os corredores da origem e do destino).
+
+As camadas vao no mesmo RBMX da matriz, como secoes extras:
+  - secao "tb_meta": JSON com timezone, faixas (horas locais [inicio, fim))
+    e a ordem das camadas
+  - secao "tb_dur": L*n*n uint32, uma camada n*n por faixa na ordem de
+    "tb_meta", com NULL_U32 onde a base nao tem rota
+
+Uso:
+  python Docs/scripts/bairro_matrix_time_buckets.py Docs/data/imperatriz_bairros_matriz.json
+  python Docs/scripts/bairro_matrix_time_buckets.py Docs/data/imperatriz_bairros_matriz.bin \\
+      --origin Centro --destination Bacuri --at 2026-10-16T18:30:00-03:00
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from bairro_matrix_bin import (
+    NULL_U32,
+    BinaryBairroMatrix,
+    SectionFile,
+    load_matrix_arrays,
+    pack_u32_array,
+    write_sections,
+)
+from bairro_name_index import BairroNameIndex
+
+DEFAULT_TIME_PROFILES = "Docs/config/bairro-time-profiles.json"
+META_SECTION = "tb_meta"
+LAYER_SECTION = "tb_dur"
+TIME_BUCKET_SECTIONS = (META_SECTION, LAYER_SECTION)
+
+
+def _normalize(value: str) -> str:
+    text = unicodedata.normalize("NFKD", value.strip())
+    return " ".join("".join(ch for ch in text if not unicodedata.combining(ch)).lower().split())
+
+
+def resolve_profiles_path(path: Path | str) -> Path:
+    """O caminho informado; o default, fora da raiz do repo, e resolvido a partir deste arquivo."""
+    candidate = Path(path)
+    if str(path) == DEFAULT_TIME_PROFILES and not candidate.exists():
+        return Path(__file__).resolve().parents[2] / DEFAULT_TIME_PROFILES
+    return candidate
+
+
+def load_time_profiles(path: Path | str) -> dict[str, Any]:
+    profiles = json.loads(resolve_profiles_path(path).read_text(encoding="utf-8"))
+    names = [bucket["name"] for bucket in profiles.get("buckets", [])]
+    if not names:
+        raise ValueError(f"Perfil sem faixas horarias: {path}")
+    if len(set(names)) != len(names):
+        raise ValueError(f"Faixas horarias repetidas em {path}: {names}")
+    if profiles.get("default_bucket", names[-1]) not in names:
+        raise ValueError(f"default_bucket fora das faixas: {profiles['default_bucket']}")
+    for bucket in profiles["buckets"]:
+        if float(bucket.get("speed_factor", 1.0)) <= 0:
+            raise ValueError(f"speed_factor deve ser > 0 na faixa {bucket['name']}")
+    for corridor in profiles.get("corridors", []):
+        label = corridor.get("name", corridor.get("bairros"))
+        for name, factor in corridor.get("speed_factors", {}).items():
+            if name not in names:
+                raise ValueError(f"Corredor {label}: faixa desconhecida em speed_factors: {name}")
+            if float(factor) <= 0:
+                raise ValueError(f"Corredor {label}: speed_factor deve ser > 0 na faixa {name}")
+    return profiles
+
+
+def profile_timezone(meta: dict[str, Any]) -> dt.tzinfo:
+    # Sem base tz do sistema (containers minimos), cai no offset fixo do perfil.
+    try:
+        return ZoneInfo(meta.get("timezone", "America/Fortaleza"))
+    except ZoneInfoNotFoundError:
+        return dt.timezone(dt.timedelta(hours=float(meta.get("utc_offset_hours", -3))))
+
+
+def cell_factors(order: list[str], profiles: dict[str, Any], bucket: dict[str, Any]) -> list[list[float]]:
+    """Fator de velocidade de cada par (linha = origem) para uma faixa."""
+    base = float(bucket.get("speed_factor", 1.0))
+    positions = {_normalize(name): i for i, name in enumerate(order)}
+    node_factor: list[float | None] = [None] * len(order)
+    for corridor in profiles.get("corridors", []):
+        factor = corridor.get("speed_factors", {}).get(bucket["name"])
+        if factor is None:
+            continue
+        for name in corridor.get("bairros", []):
+            i = positions.get(_normalize(name))
+            if i is not None:
+                current = node_factor[i]
+                node_factor[i] = float(factor) if current is None else min(current, float(factor))
+
+    rows: list[list[float]] = []
+    for fi in node_factor:
+        row = []
+        for fj in node_factor:
+            corridor_factors = [f for f in (fi, fj) if f is not None]
+            row.append(min(corridor_factors) if corridor_factors else base)
+        rows.append(row)
+    return rows
+
+
+def build_duration_layers(
+    order: list[str],
+    duration_s: array,
+    profiles: dict[str, Any],
+) -> dict[str, array]:
+    """Uma camada n*n (uint32, ordem de linha) por faixa do perfil."""
+    layers: dict[str, array] = {}
+    for bucket in profiles["buckets"]:
+        factors = cell_factors(order, profiles, bucket)
+        flat = [f for row in factors for f in row]
+        layers[bucket["name"]] = array(
+            "I",
+            (NULL_U32 if base == NULL_U32 else int(round(base / factor)) for base, factor in zip(duration_s, flat)),
+        )
+    return layers
+
+
+def layer_sections(order: list[str], duration_s: array, profiles: dict[str, Any]) -> dict[str, bytes]:
+    layers = build_duration_layers(order, duration_s, profiles)
+    meta = {
+        "version": profiles.get("version"),
+        "timezone": profiles.get("timezone", "America/Fortaleza"),
+        "utc_offset_hours": profiles.get("utc_offset_hours", -3),
+        "default_bucket": profiles.get("default_bucket", profiles["buckets"][-1]["name"]),
+        "buckets": [
+            {key: bucket[key] for key in ("name", "hours", "weekdays", "speed_factor") if key in bucket}
+            for bucket in profiles["buckets"]
+        ],
+        "layers": list(layers),
+    }
+    packed = array("I")
+    for layer in layers.values():
+        packed.extend(layer)
+    return {
+        META_SECTION: json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+        LAYER_SECTION: pack_u32_array(packed),
+    }
+
+
+def bucket_for(meta: dict[str, Any], when: dt.datetime, tz: dt.tzinfo | None = None) -> str:
+    """Primeira faixa cujas horas (e dias, se houver) contem `when` no horario local.
+
+    `when` sem tzinfo e tratado como horario local da cidade.
+    """
+    tz = tz or profile_timezone(meta)
+    local = when.replace(tzinfo=tz) if when.tzinfo is None else when.astimezone(tz)
+    hour = local.hour + local.minute / 60
+    for bucket in meta["buckets"]:
+        hours = bucket.get("hours")
+        if not hours:
+            continue
+        weekdays = bucket.get("weekdays")
+        if weekdays is not None and local.weekday() not in weekdays:
+            continue
+        for start, end in hours:
+            inside = start <= hour < end if start <= end else (hour >= start or hour < end)
+            if inside:
+                return bucket["name"]
+    return meta["default_bucket"]
+
+
+class TimeBucketMatrix(BinaryBairroMatrix):
+    """RBMX com camadas por faixa horaria; sem camadas, responde a base."""
+
+    def __init__(self, path: Path | str) -> None:
+        super().__init__(path)
+        self.meta: dict[str, Any] | None = None
+        self.layers: dict[str, Any] = {}
+        if META_SECTION in self.sections:
+            self.meta = json.loads(bytes(self.section(META_SECTION)).decode("utf-8"))
+            self._tz = profile_timezone(self.meta)
+            packed = self.u32_section(LAYER_SECTION)
+            size = self.n * self.n
+            for k, name in enumerate(self.meta["layers"]):
+                layer = packed[k * size : (k + 1) * size]
+                if isinstance(layer, memoryview):
+                    # Fatias de memoryview tambem precisam ser liberadas no close().
+                    self._exports.append(layer)
+                self.layers[name] = layer
+
+    def bucket_at(self, when: dt.datetime | str) -> str | None:
+        if self.meta is None:
+            return None
+        if isinstance(when, str):
+            when = dt.datetime.fromisoformat(when.replace("Z", "+00:00"))
+        return bucket_for(self.meta, when, self._tz)
+
+    def duration_layer(self, when: dt.datetime | str | None = None) -> Any:
+        """Camada de duracao da faixa de `when` (ou a base em fluxo livre)."""
+        bucket = self.bucket_at(when) if when is not None else None
+        return self.layers[bucket] if bucket is not None else self.duration_s
+
+    def lookup_at(self, origin: int, destination: int, when: dt.datetime | str) -> tuple[int, int] | None:
+        cell = origin * self.n + destination
+        distance = self.distance_m[cell]
+        duration = self.duration_layer(when)[cell]
+        if distance == NULL_U32 or duration == NULL_U32:
+            return None
+        return distance, duration
+
+    def __enter__(self) -> TimeBucketMatrix:
+        return self
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera ou consulta camadas de duracao por faixa horaria.")
+    parser.add_argument("input", help="Matriz JSON/.bin (gera o .bin com camadas) ou .bin com camadas (consulta).")
+    parser.add_argument(
+        "--profiles",
+        default=DEFAULT_TIME_PROFILES,
+        help=f"Perfis de faixa horaria (default: {DEFAULT_TIME_PROFILES}).",
+    )
+    parser.add_argument("--output", help="RBMX de saida (default: mesmo nome com .bin).")
+    parser.add_argument("--origin", help="Bairro de origem (consulta).")
+    parser.add_argument("--destination", help="Bairro de destino (consulta).")
+    parser.add_argument("--at", help="Horario ISO da consulta (default: agora).")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    if args.origin or args.destination:
+        with TimeBucketMatrix(in_path) as matrix:
+            names = BairroNameIndex.from_order(matrix.order)
+            oi = names.resolve(args.origin or "")
+            di = names.resolve(args.destination or "")
+            if oi is None or di is None:
+                parser.error("Bairro fora da matriz.")
+            when = args.at or dt.datetime.now(dt.timezone.utc).isoformat()
+            result = matrix.lookup_at(oi, di, when)
+            print(
+                json.dumps(
+                    {
+                        "at": when,
+                        "bucket": matrix.bucket_at(when),
+                        "distance_m": result[0] if result else None,
+                        "duration_s": result[1] if result else None,
+                        "free_flow_duration_s": (matrix.lookup(oi, di) or (None, None))[1],
+                    },
+                    ensure_ascii=False,
+                ),
+                flush=True,
+            )
+        return
+
+    order, distance_m, duration_s = load_matrix_arrays(in_path)
+    profiles = load_time_profiles(args.profiles)
+    out_path = Path(args.output) if args.output else in_path.with_suffix(".bin")
+    sections: dict[str, bytes] = {}
+    if in_path.suffix.lower() == ".bin":
+        # Preserva as demais secoes extras (ex.: listas de vizinhos).
+        with SectionFile(in_path) as source:
+            sections = {
+                name: bytes(source.section(name)) for name in source.sections if name not in TIME_BUCKET_SECTIONS
+            }
+    if not sections:
+        sections = {
+            "order": "\n".join(order).encode("utf-8"),
+            "dist_m": pack_u32_array(distance_m),
+            "dur_s": pack_u32_array(duration_s),
+        }
+    sections.update(layer_sections(order, duration_s, profiles))
+    write_sections(out_path, len(order), sections)
+    print(f"[DONE] {len(profiles['buckets'])} camadas de duracao salvas em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
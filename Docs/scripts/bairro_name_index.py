@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Indice de resolucao de nomes de bairro para indices da matriz.
+
+Mapeia nomes normalizados (sem acento, minusculos, abreviacoes expandidas),
+aliases do seed do backend (ex.: "São José" -> "Parque São José"), aliases
+automaticos (sem prefixo "Vila", "Jardim", ... quando unicos) e slugs/nomes
+do RuaCEP para o indice do bairro em `matrix.order`. Nomes que nao batem
+exatamente caem num ranking por trigramas (coeficiente de Dice); o mesmo
+ranking, com piso `RUACEP_MIN_SCORE`, liga ao bairro da matriz as grafias do
+RuaCEP que diferem dela.
+
+O indice e gerado junto da matriz (`*.names.json`) e carregado uma vez;
+`resolve` faz um lookup em dict no caminho exato.
+
+Uso:
+  python Docs/scripts/bairro_name_index.py Docs/data/imperatriz_bairros_matriz.json
+  python Docs/scripts/bairro_name_index.py Docs/data/imperatriz_bairros_matriz.json --query "vila lobao"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+INDEX_VERSION = 1
+MIN_FUZZY_SCORE = 0.6
+RUACEP_MIN_SCORE = 0.75
+
+ABBREVIATIONS = {
+    "jd": "jardim",
+    "jdm": "jardim",
+    "pq": "parque",
+    "pque": "parque",
+    "res": "residencial",
+    "resid": "residencial",
+    "vl": "vila",
+    "cj": "conjunto",
+    "conj": "conjunto",
+    "st": "setor",
+    "2": "ii",
+    "3": "iii",
+    "4": "iv",
+    "5": "v",
+}
+# Espelha ALIAS_CANONICAL_NAME de Packages/Backend/prisma/seeds/020_locality.seed.ts:
+# nome da matriz -> nome que o banco guarda para o bairro.
+SEED_CANONICAL_NAMES = {"parque sao jose": "São José"}
+ALIAS_PREFIXES = ("bairro", "vila", "jardim", "parque", "residencial", "conjunto", "setor")
+NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+@lru_cache(maxsize=4096)
+def normalize_key(value: str) -> str:
+    text = unicodedata.normalize("NFKD", value.strip().lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    tokens = NON_WORD_RE.sub(" ", text).split()
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def trigrams(key: str) -> list[str]:
+    padded = f"  {key} "
+    return sorted({padded[i : i + 3] for i in range(len(padded) - 2)})
+
+
+def alias_keys(key: str) -> list[str]:
+    aliases: list[str] = []
+    tokens = key.split()
+    while len(tokens) > 1 and tokens[0] in ALIAS_PREFIXES:
+        tokens = tokens[1:]
+        aliases.append(" ".join(tokens))
+    return aliases
+
+
+def build_name_index(
+    order: list[str],
+    ruacep_index: dict[str, dict[str, str]] | None = None,
+) -> dict[str, Any]:
+    keys: dict[str, int] = {}
+    for idx, name in enumerate(order):
+        keys[normalize_key(name)] = idx
+    # Nome canonico do seed (020_locality.seed.ts), o que o banco guarda para o bairro.
+    for idx, name in enumerate(order):
+        canonical = SEED_CANONICAL_NAMES.get(normalize_key(name))
+        if canonical:
+            keys.setdefault(normalize_key(canonical), idx)
+
+    # Aliases ambiguos (ex.: "verona" para varios "Residencial Verona ...")
+    # ficam de fora para nao resolver para o bairro errado.
+    alias_owners: dict[str, set[int]] = {}
+    for idx, name in enumerate(order):
+        for alias in alias_keys(normalize_key(name)):
+            alias_owners.setdefault(alias, set()).add(idx)
+    for alias, owners in alias_owners.items():
+        if len(owners) == 1 and alias not in keys:
+            keys[alias] = next(iter(owners))
+
+    if ruacep_index:
+        # Contra os nomes da matriz e aliases, antes de qualquer nome do RuaCEP entrar.
+        matcher = BairroNameIndex(_index_payload(order, keys), min_score=RUACEP_MIN_SCORE)
+        for ruacep_key, entry in ruacep_index.items():
+            names = [ruacep_key, entry.get("bairro_name", ""), entry.get("slug", "").replace("-", " ")]
+            matches = [match for match in map(matcher.resolve_with_score, names) if match is not None]
+            if not matches:
+                continue
+            idx = max(matches, key=lambda match: match[1])[0]
+            for extra in names:
+                extra_key = normalize_key(extra)
+                if extra_key:
+                    keys.setdefault(extra_key, idx)
+
+    return _index_payload(order, keys)
+
+
+def _index_payload(order: list[str], keys: dict[str, int]) -> dict[str, Any]:
+    entries = sorted(keys.items())
+    postings: dict[str, list[int]] = {}
+    for pos, (key, _idx) in enumerate(entries):
+        for gram in trigrams(key):
+            postings.setdefault(gram, []).append(pos)
+
+    return {
+        "version": INDEX_VERSION,
+        "order": order,
+        "entries": [[key, idx] for key, idx in entries],
+        "trigrams": postings,
+    }
+
+
+def write_name_index(path: Path, index: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+
+class BairroNameIndex:
+    """Resolve nomes livres de bairro para o indice da matriz."""
+
+    def __init__(self, index: dict[str, Any], min_score: float = MIN_FUZZY_SCORE) -> None:
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versao de indice de nomes nao suportada: {index.get('version')}")
+        self.order: list[str] = index["order"]
+        self.entries: list[tuple[str, int]] = [(key, int(idx)) for key, idx in index["entries"]]
+        self.keys = dict(self.entries)
+        self.entry_sizes = [len(trigrams(key)) for key, _idx in self.entries]
+        self.postings: dict[str, list[int]] = index["trigrams"]
+        self.min_score = min_score
+        # Variantes de grafia se repetem muito entre cotacoes.
+        self.resolve_with_score = lru_cache(maxsize=4096)(self._resolve_with_score)
+
+    @classmethod
+    def load(cls, path: Path | str, min_score: float = MIN_FUZZY_SCORE) -> BairroNameIndex:
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")), min_score=min_score)
+
+    @classmethod
+    def from_order(cls, order: list[str], min_score: float = MIN_FUZZY_SCORE) -> BairroNameIndex:
+        return cls(build_name_index(order), min_score=min_score)
+
+    def _resolve_with_score(self, name: str) -> tuple[int, float, str] | None:
+        key = normalize_key(name)
+        if not key:
+            return None
+        idx = self.keys.get(key)
+        if idx is not None:
+            return idx, 1.0, "exact"
+
+        grams = trigrams(key)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best: tuple[float, int] | None = None
+        for pos, count in shared.items():
+            score = 2.0 * count / (len(grams) + self.entry_sizes[pos])
+            # Empate resolvido pela menor posicao para manter o resultado deterministico.
+            if best is None or score > best[0] or (score == best[0] and pos < best[1]):
+                best = (score, pos)
+        if best is None or best[0] < self.min_score:
+            return None
+        return self.entries[best[1]][1], round(best[0], 4), "fuzzy"
+
+    def resolve(self, name: str) -> int | None:
+        match = self.resolve_with_score(name)
+        return match[0] if match else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera/consulta o indice de nomes de bairros.")
+    parser.add_argument("input", help="Matriz JSON gerada pelo generate_imperatriz_bairro_matrix.py.")
+    parser.add_argument("--output", help="Indice de saida (default: <matriz>.names.json).")
+    parser.add_argument("--query", action="append", default=[], help="Nome a resolver (repetivel).")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    payload = json.loads(in_path.read_text(encoding="utf-8"))
+    index = build_name_index(payload["matrix"]["order"])
+
+    if args.query:
+        resolver = BairroNameIndex(index)
+        for query in args.query:
+            match = resolver.resolve_with_score(query)
+            if match is None:
+                print(f"{query}: nao resolvido", flush=True)
+            else:
+                idx, score, method = match
+                print(f"{query}: {resolver.order[idx]} (#{idx}, {method}, {score})", flush=True)
+        return
+
+    out_path = Path(args.output) if args.output else in_path.with_suffix(".names.json")
+    write_name_index(out_path, index)
+    print(f"[DONE] Indice de nomes salvo em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
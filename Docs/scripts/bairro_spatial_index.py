@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Indice espacial lat/lon/CEP -> bairro da matriz.
+
+Pontos de referencia de cada bairro (centroide geocodificado + pontos de
+logradouro do modo --points-per-bairro) vao para uma KD-tree 2D em metros
+(projecao equiretangular em torno do centro da cidade); o bairro de um
+lat/lon e o do ponto mais proximo, em O(log n).
+
+CEPs vem dos contextos do RuaCEP. CEP exato resolve direto; CEP desconhecido
+cai no vizinho mais proximo (bisect na lista ordenada) com o mesmo prefixo de
+5 digitos. CEPs que aparecem em mais de um bairro (CEP geral da cidade) ficam
+de fora.
+
+Uso:
+  python Docs/scripts/bairro_spatial_index.py Docs/data/imperatriz_bairros_matriz.json --lat -5.52 --lon -47.47
+  python Docs/scripts/bairro_spatial_index.py Docs/data/imperatriz_bairros_matriz.spatial.json --cep 65900-440
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import math
+import re
+from pathlib import Path
+from typing import Any
+
+INDEX_VERSION = 1
+EARTH_RADIUS_M = 6371008.8
+CEP_RE = re.compile(r"^(\d{5})-?(\d{3})$")
+
+
+def normalize_cep(value: str) -> str | None:
+    match = CEP_RE.match(value.strip())
+    return f"{match.group(1)}-{match.group(2)}" if match else None
+
+
+def build_spatial_index(
+    order: list[str],
+    bairros: list[dict[str, Any]],
+    ceps_by_bairro: dict[str, list[str]] | None = None,
+) -> dict[str, Any]:
+    """Monta o indice serializavel a partir dos bairros geocodificados."""
+    positions = {name: i for i, name in enumerate(order)}
+    points: list[list[float | int]] = []
+    for bairro in bairros:
+        idx = positions.get(bairro["name"])
+        if idx is None or not isinstance(bairro.get("lat"), float):
+            continue
+        points.append([bairro["lat"], bairro["lon"], idx])
+        for point in bairro.get("points", []):
+            points.append([float(point["lat"]), float(point["lon"]), idx])
+
+    owners: dict[str, set[int]] = {}
+    for name, ceps in (ceps_by_bairro or {}).items():
+        idx = positions.get(name)
+        if idx is None:
+            continue
+        for raw in ceps:
+            cep = normalize_cep(raw)
+            if cep:
+                owners.setdefault(cep, set()).add(idx)
+
+    return {
+        "version": INDEX_VERSION,
+        "order": order,
+        "points": points,
+        "ceps": {cep: next(iter(idxs)) for cep, idxs in sorted(owners.items()) if len(idxs) == 1},
+        "ambiguous_ceps": sorted(cep for cep, idxs in owners.items() if len(idxs) > 1),
+    }
+
+
+def write_spatial_index(path: Path, index: dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(index, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+
+class KDTree:
+    """KD-tree 2D estatica (indices dos filhos em listas paralelas)."""
+
+    def __init__(self, xy: list[tuple[float, float]]) -> None:
+        self.xy = xy
+        self.point: list[int] = []
+        self.left: list[int] = []
+        self.right: list[int] = []
+        self.root = self._build(list(range(len(xy))), 0)
+
+    def _build(self, ids: list[int], depth: int) -> int:
+        if not ids:
+            return -1
+        axis = depth % 2
+        ids.sort(key=lambda i: self.xy[i][axis])
+        mid = len(ids) // 2
+        node = len(self.point)
+        self.point.append(ids[mid])
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build(ids[:mid], depth + 1)
+        self.right[node] = self._build(ids[mid + 1 :], depth + 1)
+        return node
+
+    def nearest(self, x: float, y: float) -> tuple[int, float]:
+        """(indice do ponto mais proximo, distancia ao quadrado)."""
+        best_id, best_d2 = -1, math.inf
+        # (no, profundidade, distancia minima ao quadrado da regiao do no)
+        stack = [(self.root, 0, 0.0)]
+        while stack:
+            node, depth, bound_d2 = stack.pop()
+            if node < 0 or bound_d2 >= best_d2:
+                continue
+            pid = self.point[node]
+            px, py = self.xy[pid]
+            d2 = (px - x) ** 2 + (py - y) ** 2
+            if d2 < best_d2:
+                best_id, best_d2 = pid, d2
+            delta = (x - px) if depth % 2 == 0 else (y - py)
+            near, far = (self.left[node], self.right[node]) if delta < 0 else (self.right[node], self.left[node])
+            # O lado distante leva a distancia ao plano de corte; no pop so e visitado se ainda puder ganhar.
+            stack.append((far, depth + 1, delta * delta))
+            stack.append((near, depth + 1, bound_d2))
+        return best_id, best_d2
+
+
+class BairroSpatialIndex:
+    """Resolve lat/lon ou CEP para o indice do bairro na matriz."""
+
+    def __init__(self, index: dict[str, Any]) -> None:
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versao de indice espacial nao suportada: {index.get('version')}")
+        self.order: list[str] = index["order"]
+        points = index["points"]
+        self.owner = [int(p[2]) for p in points]
+        lat0 = sum(p[0] for p in points) / len(points) if points else 0.0
+        lon0 = sum(p[1] for p in points) / len(points) if points else 0.0
+        self._lat0 = math.radians(lat0)
+        self._lon0 = math.radians(lon0)
+        self._cos_lat0 = math.cos(self._lat0)
+        self.tree = KDTree([self._project(p[0], p[1]) for p in points])
+        self.ceps: dict[str, int] = index.get("ceps", {})
+        self.ambiguous_ceps = set(index.get("ambiguous_ceps", []))
+        self._sorted_ceps = sorted(self.ceps)
+
+    @classmethod
+    def load(cls, path: Path | str) -> BairroSpatialIndex:
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def _project(self, lat: float, lon: float) -> tuple[float, float]:
+        return (
+            EARTH_RADIUS_M * (math.radians(lon) - self._lon0) * self._cos_lat0,
+            EARTH_RADIUS_M * (math.radians(lat) - self._lat0),
+        )
+
+    def nearest(self, lat: float, lon: float) -> tuple[int, float] | None:
+        """(indice do bairro, distancia em metros ao ponto de referencia)."""
+        pid, d2 = self.tree.nearest(*self._project(lat, lon))
+        if pid < 0:
+            return None
+        return self.owner[pid], math.sqrt(d2)
+
+    def bairro_for_point(self, lat: float, lon: float, max_distance_m: float | None = None) -> int | None:
+        match = self.nearest(lat, lon)
+        if match is None or (max_distance_m is not None and match[1] > max_distance_m):
+            return None
+        return match[0]
+
+    def bairro_for_cep(self, cep: str) -> int | None:
+        key = normalize_cep(cep)
+        if key is None or key in self.ambiguous_ceps:
+            return None
+        idx = self.ceps.get(key)
+        if idx is not None:
+            return idx
+        # Vizinhos na ordem numerica costumam ser do mesmo bairro; exige o mesmo prefixo.
+        pos = bisect.bisect_left(self._sorted_ceps, key)
+        value = int(key.replace("-", ""))
+        candidates = [c for c in self._sorted_ceps[max(0, pos - 1) : pos + 1] if c[:5] == key[:5]]
+        if not candidates:
+            return None
+        closest = min(candidates, key=lambda c: abs(int(c.replace("-", "")) - value))
+        return self.ceps[closest]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera/consulta o indice espacial (lat/lon/CEP -> bairro).")
+    parser.add_argument("input", help="Matriz JSON (gera/consulta) ou indice .spatial.json (consulta).")
+    parser.add_argument("--output", help="Indice de saida (default: <matriz>.spatial.json).")
+    parser.add_argument("--lat", type=float)
+    parser.add_argument("--lon", type=float)
+    parser.add_argument("--cep")
+    args = parser.parse_args()
+
+    in_path = Path(args.input)
+    payload = json.loads(in_path.read_text(encoding="utf-8"))
+    if "matrix" in payload:
+        index = build_spatial_index(payload["matrix"]["order"], payload["bairros"])
+    else:
+        index = payload
+
+    if args.cep or (args.lat is not None and args.lon is not None):
+        resolver = BairroSpatialIndex(index)
+        if args.cep:
+            idx = resolver.bairro_for_cep(args.cep)
+            print(f"{args.cep}: {resolver.order[idx] if idx is not None else 'nao resolvido'}", flush=True)
+        if args.lat is not None and args.lon is not None:
+            match = resolver.nearest(args.lat, args.lon)
+            if match is None:
+                print(f"{args.lat},{args.lon}: nao resolvido", flush=True)
+            else:
+                print(f"{args.lat},{args.lon}: {resolver.order[match[0]]} ({match[1]:.0f} m)", flush=True)
+        return
+
+    out_path = Path(args.output) if args.output else in_path.with_suffix(".spatial.json")
+    write_spatial_index(out_path, index)
+    print(f"[DONE] Indice espacial salvo em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Micro-benchmark do scoring de candidatos de geocoding.
+
+Compara, sobre os mesmos candidatos:
+  - baseline: normalizacao sem memo e `score_*_result` refazendo a
+    normalizacao do alvo, do endereco e de cada componente a cada chamada
+    (comportamento anterior);
+  - atual: `normalize_text` memoizado, registros pre-normalizados
+    (`*_candidate_record`) e `score_*_record` com o alvo normalizado uma vez.
+
+Candidatos vem das fixtures HTTP gravadas (--http-fixtures, respostas do
+Google/Nominatim) e, para completar, dos resultados do cache de geocode
+(display_name/tipos viram linhas no formato de cada provider). Cada bairro
+pontua todos os candidatos `--variants` vezes, como acontece com as variantes
+de consulta. Os scores dos dois caminhos precisam ser identicos.
+
+Uso:
+  python Docs/scripts/bench_geocode_scoring.py
+  python Docs/scripts/bench_geocode_scoring.py --http-fixtures Docs/data/http_fixtures --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import generate_imperatriz_bairro_matrix as gen
+
+DEFAULT_CACHE_JSON = "Docs/data/imperatriz_bairros_geocode_cache.json"
+DEFAULT_BAIRROS = "Docs/data/bairro.md"
+
+
+def rows_from_cache(
+    payload: dict[str, Any],
+    city: dict[str, Any],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Converte entradas do cache em linhas Google/Nominatim equivalentes."""
+    google_rows: list[dict[str, Any]] = []
+    nominatim_rows: list[dict[str, Any]] = []
+    city_key, state_key = gen.city_match_keys(city)
+    for entry in payload.values():
+        if not isinstance(entry, dict) or entry.get("status") != "ok" or not entry.get("display_name"):
+            continue
+        parts = [part.strip() for part in entry["display_name"].split(",") if part.strip()]
+        components = []
+        for k, part in enumerate(parts):
+            key = gen.normalize_key(part)
+            if key == city_key:
+                types = ["locality", "political"]
+            elif key == state_key:
+                types = ["administrative_area_level_1", "political"]
+            elif k == 0:
+                types = ["neighborhood", "political"]
+            else:
+                types = ["political"]
+            components.append({"long_name": part, "short_name": part, "types": types})
+        google_rows.append(
+            {
+                "formatted_address": entry["display_name"],
+                "types": entry.get("google_types") or [entry.get("nominatim_type") or "political"],
+                "address_components": components,
+                "geometry": {
+                    "location": {"lat": entry["lat"], "lng": entry["lon"]},
+                    "location_type": "APPROXIMATE",
+                },
+            }
+        )
+        nominatim_rows.append(
+            {
+                "display_name": entry["display_name"],
+                "type": entry.get("nominatim_type"),
+                "class": entry.get("nominatim_class"),
+                "address": {"city": city["name"]},
+                "lat": str(entry["lat"]),
+                "lon": str(entry["lon"]),
+            }
+        )
+    return google_rows, nominatim_rows
+
+
+def rows_from_fixtures(fixtures_dir: Path) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    google_rows: list[dict[str, Any]] = []
+    nominatim_rows: list[dict[str, Any]] = []
+    for path in sorted(fixtures_dir.glob("*/*.json")):
+        fixture = json.loads(path.read_text(encoding="utf-8"))
+        try:
+            body = json.loads(fixture.get("body", ""))
+        except ValueError:
+            continue
+        if isinstance(body, dict) and isinstance(body.get("results"), list):
+            google_rows.extend(row for row in body["results"] if isinstance(row, dict))
+        elif isinstance(body, list):
+            nominatim_rows.extend(row for row in body if isinstance(row, dict) and "display_name" in row)
+    return google_rows, nominatim_rows
+
+
+def timed(fn: Callable[[], list[int]], repeat: int) -> tuple[float, list[int]]:
+    best = float("inf")
+    scores: list[int] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        scores = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, scores
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark do scoring de candidatos de geocoding.")
+    parser.add_argument("--cache-json", default=DEFAULT_CACHE_JSON, help=f"(default: {DEFAULT_CACHE_JSON})")
+    parser.add_argument("--http-fixtures", default="", help="Diretorio de fixtures gravadas com --http-mode record.")
+    parser.add_argument("--input", default=DEFAULT_BAIRROS, help=f"Lista de bairros (default: {DEFAULT_BAIRROS}).")
+    parser.add_argument("--variants", type=int, default=8, help="Variantes de consulta por bairro (default: 8).")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticoes; vale a melhor (default: 3).")
+    parser.add_argument("--json", action="store_true", help="Saida em JSON.")
+    args = parser.parse_args()
+
+    city = gen.city_profile(dict(gen.DEFAULT_CITY))
+    google_rows, nominatim_rows = rows_from_cache(
+        json.loads(Path(args.cache_json).read_text(encoding="utf-8")), city
+    )
+    if args.http_fixtures:
+        fixture_google, fixture_nominatim = rows_from_fixtures(Path(args.http_fixtures))
+        google_rows.extend(fixture_google)
+        nominatim_rows.extend(fixture_nominatim)
+    targets = [b["name"] for b in gen.parse_bairros(Path(args.input))]
+
+    memo_normalize_key = gen.normalize_key
+    raw_normalize_text = gen.normalize_text.__wrapped__
+
+    def baseline(score_result: Callable[..., int], rows: list[dict[str, Any]]) -> Callable[[], list[int]]:
+        def run() -> list[int]:
+            # Sem memo: cada chamada normaliza tudo de novo.
+            gen.normalize_key = lambda value: raw_normalize_text(value).lower()
+            try:
+                return [
+                    score_result(target, row, city)
+                    for target in targets
+                    for _ in range(args.variants)
+                    for row in rows
+                ]
+            finally:
+                gen.normalize_key = memo_normalize_key
+
+        return run
+
+    def current(
+        build_record: Callable[[dict[str, Any]], dict[str, Any]],
+        score_record: Callable[..., int],
+        rows: list[dict[str, Any]],
+    ) -> Callable[[], list[int]]:
+        def run() -> list[int]:
+            gen.normalize_text.cache_clear()
+            gen.normalize_key.cache_clear()
+            city_keys = gen.city_match_keys(city)
+            records = [build_record(row) for row in rows]
+            scores = []
+            for target in targets:
+                target_key = gen.normalize_key(target)
+                for _ in range(args.variants):
+                    scores.extend(score_record(target_key, record, city_keys) for record in records)
+            return scores
+
+        return run
+
+    report: dict[str, Any] = {
+        "targets": len(targets),
+        "variants": args.variants,
+        "candidates": {"google": len(google_rows), "nominatim": len(nominatim_rows)},
+    }
+    for provider, rows, score_result, build_record, score_record in (
+        ("google", google_rows, gen.score_google_result, gen.google_candidate_record, gen.score_google_record),
+        (
+            "nominatim",
+            nominatim_rows,
+            gen.score_nominatim_result,
+            gen.nominatim_candidate_record,
+            gen.score_nominatim_record,
+        ),
+    ):
+        base_s, base_scores = timed(baseline(score_result, rows), args.repeat)
+        new_s, new_scores = timed(current(build_record, score_record, rows), args.repeat)
+        if base_scores != new_scores:
+            raise SystemExit(f"Scores divergentes no provider {provider}.")
+        report[provider] = {
+            "scored": len(new_scores),
+            "baseline_s": round(base_s, 4),
+            "current_s": round(new_s, 4),
+            "speedup": round(base_s / new_s, 1) if new_s else None,
+        }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2), flush=True)
+        return
+    for provider in ("google", "nominatim"):
+        stats = report[provider]
+        print(
+            f"[BENCH] {provider}: {stats['scored']} scores, baseline {stats['baseline_s']}s, "
+            f"atual {stats['current_s']}s ({stats['speedup']}x)",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
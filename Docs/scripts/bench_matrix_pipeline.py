@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Benchmark do pipeline da matriz de bairros em 123, 1k e 3k zonas.
+
+Zonas sinteticas partem dos bairros geocodificados da matriz versionada
+(`Docs/data/imperatriz_bairros_matriz.json`): ate 123 usa os reais; acima
+disso, cada zona extra e um bairro real deslocado ate --jitter-m metros
+(semente fixa, resultado reprodutivel).
+
+Nenhuma etapa usa rede:
+  - geocode: candidatos gravados (cache de geocode + --http-fixtures) passam
+    pelo scoring de registros do gerador, um alvo por zona;
+  - OSRM: `http_get_json` do gerador responde em processo com o mesmo modelo
+    do `local_routing_server.py` (haversine x desvio); o tempo do provider e
+    descontado, `build_matrix` mede so a montagem dos blocos.
+
+Etapas: parse_bairros, score_google, score_nominatim, build_matrix,
+sanity_check, json_write, bin_write, bin_load, quote_engine, quote_lookup,
+neighbor_build, neighbor_within. O modelo do replay nao tem rota absurda, entao
+o sanity_check multiplica por 4 a distancia de ~1 celula por origem antes de
+checar: a reconsulta passa pelo mesmo replay e o tempo dela e descontado.
+Cada tamanho roda em um subprocesso proprio, para o pico de RSS (ru_maxrss)
+ser so dele.
+
+Saida: JSON com `schema`, commit, ambiente e `results` (uma linha por
+zonas x etapa: items, wall_s, items_per_s, peak_rss_kb). `--compare` compara
+com um resultado anterior e sai com codigo 1 se alguma etapa ficou mais lenta
+que a tolerancia.
+
+Uso:
+  python Docs/scripts/bench_matrix_pipeline.py --output /tmp/bench.json
+  python Docs/scripts/bench_matrix_pipeline.py --zones 123,1000 --compare /tmp/bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import generate_imperatriz_bairro_matrix as gen
+from bairro_matrix_bin import load_matrix_arrays, pack_u32_array, write_matrix_bin, write_sections
+from bairro_matrix_neighbors import NeighborMatrix, neighbor_sections
+from bench_geocode_scoring import rows_from_cache, rows_from_fixtures
+from freight_quote import DEFAULT_POLICY, FreightQuoteEngine, load_policy
+from local_routing_server import table_response
+
+SCHEMA_VERSION = 1
+DEFAULT_ZONES = "123,1000,3000"
+DEFAULT_MATRIX_JSON = "Docs/data/imperatriz_bairros_matriz.json"
+DEFAULT_CACHE_JSON = "Docs/data/imperatriz_bairros_geocode_cache.json"
+EARTH_RADIUS_M = 6371008.8
+# Etapas abaixo disso variam mais por ruido do que por codigo; nao contam como regressao.
+MIN_REGRESSION_S = 0.01
+
+
+def synthetic_zones(base: list[dict[str, Any]], count: int, jitter_m: float, seed: int) -> list[dict[str, Any]]:
+    """`count` zonas: as reais primeiro, depois copias deslocadas dos bairros reais."""
+    zones = [
+        {"index": k + 1, "name": b["name"], "lat": b["lat"], "lon": b["lon"]}
+        for k, b in enumerate(base[:count])
+    ]
+    rng = random.Random(seed)
+    while len(zones) < count:
+        origin = base[len(zones) % len(base)]
+        bearing = rng.uniform(0, 2 * math.pi)
+        distance = rng.uniform(0, jitter_m)
+        dlat = distance * math.cos(bearing) / EARTH_RADIUS_M
+        dlon = distance * math.sin(bearing) / (EARTH_RADIUS_M * math.cos(math.radians(origin["lat"])))
+        zones.append(
+            {
+                "index": len(zones) + 1,
+                "name": f"{origin['name']} {len(zones) // len(base)}",
+                "lat": origin["lat"] + math.degrees(dlat),
+                "lon": origin["lon"] + math.degrees(dlon),
+            }
+        )
+    return zones
+
+
+class ReplayOsrm:
+    """Substitui `gen.http_get_json` para o OSRM table, sem rede."""
+
+    def __init__(self, detour_factor: float, speed_kmh: float) -> None:
+        self.detour_factor = detour_factor
+        self.speed_kmh = speed_kmh
+        self.provider_s = 0.0
+        self.calls = 0
+
+    def __call__(self, url: str, params: dict[str, Any], timeout: int = 60) -> Any:
+        started = time.perf_counter()
+        coords_path = url.rsplit("/", 1)[1]
+        payload = table_response(
+            coords_path,
+            {"sources": [params["sources"]], "destinations": [params["destinations"]]},
+            self.detour_factor,
+            self.speed_kmh,
+        )
+        self.provider_s += time.perf_counter() - started
+        self.calls += 1
+        return payload
+
+
+def peak_rss_kb() -> int:
+    # Linux reporta ru_maxrss em KB; macOS em bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_size(args: argparse.Namespace, count: int) -> list[dict[str, Any]]:
+    matrix_payload = json.loads(Path(args.matrix_json).read_text(encoding="utf-8"))
+    base = [b for b in matrix_payload["bairros"] if isinstance(b.get("lat"), float)]
+    zones = synthetic_zones(base, count, args.jitter_m, args.seed)
+    city = gen.city_profile(dict(gen.DEFAULT_CITY))
+    google_rows, nominatim_rows = rows_from_cache(
+        json.loads(Path(args.cache_json).read_text(encoding="utf-8")), city
+    )
+    if args.http_fixtures:
+        fixture_google, fixture_nominatim = rows_from_fixtures(Path(args.http_fixtures))
+        google_rows.extend(fixture_google)
+        nominatim_rows.extend(fixture_nominatim)
+    results: list[dict[str, Any]] = []
+
+    def measure(stage: str, items: int, fn: Callable[[], Any], repeat: int = 1) -> Any:
+        best = math.inf
+        value = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            value = fn()
+            best = min(best, time.perf_counter() - started)
+        results.append(
+            {
+                "zones": count,
+                "stage": stage,
+                "items": items,
+                "wall_s": round(best, 4),
+                "items_per_s": round(items / best, 1) if best > 0 else None,
+                "peak_rss_kb": peak_rss_kb(),
+            }
+        )
+        return value
+
+    with tempfile.TemporaryDirectory(prefix="bench_matrix_") as tmp:
+        tmp_dir = Path(tmp)
+        md_path = tmp_dir / "bairros.md"
+        md_path.write_text(
+            "# Zonas sinteticas\n\n" + "".join(f"{z['index']}. {z['name']}\n" for z in zones),
+            encoding="utf-8",
+        )
+        measure("parse_bairros", count, lambda: gen.parse_bairros(md_path), repeat=args.repeat)
+
+        city_keys = gen.city_match_keys(city)
+        for provider, rows, build_record, score_record in (
+            ("google", google_rows, gen.google_candidate_record, gen.score_google_record),
+            ("nominatim", nominatim_rows, gen.nominatim_candidate_record, gen.score_nominatim_record),
+        ):
+
+            def score_all() -> int:
+                records = [build_record(row) for row in rows]
+                total = 0
+                for zone in zones:
+                    target = gen.normalize_key(zone["name"])
+                    total += max((score_record(target, record, city_keys) for record in records), default=0)
+                return total
+
+            measure(f"score_{provider}", count * len(rows), score_all)
+
+        replay = ReplayOsrm(args.detour_factor, args.speed_kmh)
+        original_http_get_json = gen.http_get_json
+        gen.http_get_json = replay
+        try:
+            for stage in ("build_matrix", "sanity_check"):
+                if stage == "sanity_check":
+                    rng = random.Random(args.seed)
+                    for _ in range(count):
+                        i, j = rng.randrange(count), rng.randrange(count)
+                        if i != j and distance_m[i][j] is not None:
+                            distance_m[i][j] *= 4
+                replay.provider_s = 0.0
+                replay.calls = 0
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if stage == "build_matrix":
+                        distance_m, duration_s, _resolved = gen.build_matrix(zones, args.block_size)
+                    else:
+                        sanity = gen.sanity_check_matrix(zones, distance_m, duration_s, {})
+                wall = time.perf_counter() - started - replay.provider_s
+                results.append(
+                    {
+                        "zones": count,
+                        "stage": stage,
+                        "items": count * count,
+                        "wall_s": round(wall, 4),
+                        "items_per_s": round(count * count / wall, 1) if wall > 0 else None,
+                        "peak_rss_kb": peak_rss_kb(),
+                        "blocks": replay.calls,
+                        "provider_s": round(replay.provider_s, 4),
+                    }
+                )
+        finally:
+            gen.http_get_json = original_http_get_json
+        results[-1]["flagged_cells"] = sanity["initial_flagged_cells"]
+        results[-1]["fixed_by_requery"] = sanity["fixed_by_requery"]
+
+        order = [z["name"] for z in zones]
+        json_path = tmp_dir / "matriz.json"
+        bin_path = tmp_dir / "matriz.bin"
+
+        def write_json() -> None:
+            result = {
+                "bairros": zones,
+                "matrix": {
+                    "units": {"distance": "meters", "duration": "seconds"},
+                    "order": order,
+                    "distance_m": distance_m,
+                    "duration_s": duration_s,
+                },
+            }
+            json_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        measure("json_write", count * count, write_json)
+        measure("bin_write", count * count, lambda: write_matrix_bin(bin_path, order, distance_m, duration_s))
+        results[-1]["bytes"] = bin_path.stat().st_size
+        results[-2]["bytes"] = json_path.stat().st_size
+        del distance_m, duration_s
+        _order, dist_arr, dur_arr = measure("bin_load", count * count, lambda: load_matrix_arrays(bin_path))
+
+        rules = load_policy(args.policy)["business_rules"]
+        engine = measure(
+            "quote_engine", count * count, lambda: FreightQuoteEngine(order, dist_arr, dur_arr, rules)
+        )
+        rng = random.Random(args.seed)
+        origins = [rng.randrange(count) for _ in range(args.quotes)]
+        destinations = [rng.randrange(count) for _ in range(args.quotes)]
+        measure(
+            "quote_lookup",
+            args.quotes,
+            lambda: engine.quote_batch(origins, destinations),
+            repeat=args.repeat,
+        )
+
+        sections = measure("neighbor_build", count * count, lambda: neighbor_sections(count, dist_arr, dur_arr))
+        nb_path = tmp_dir / "vizinhos.bin"
+        write_sections(
+            nb_path,
+            count,
+            {
+                "order": "\n".join(order).encode("utf-8"),
+                "dist_m": pack_u32_array(dist_arr),
+                "dur_s": pack_u32_array(dur_arr),
+                **sections,
+            },
+        )
+        del sections
+        with NeighborMatrix(nb_path) as neighbors:
+            limits = [rng.randrange(60, 900) for _ in range(args.quotes)]
+            measure(
+                "neighbor_within",
+                args.quotes,
+                lambda: sum(len(neighbors.within_indices(o, limit)) for o, limit in zip(origins, limits)),
+                repeat=args.repeat,
+            )
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current: dict[str, Any], previous: dict[str, Any], tolerance: float) -> list[str]:
+    """Etapas com wall_s acima de (1 + tolerance) x o resultado anterior."""
+    before = {(row["zones"], row["stage"]): row for row in previous.get("results", [])}
+    regressions = []
+    for row in current["results"]:
+        old = before.get((row["zones"], row["stage"]))
+        if not old or not old["wall_s"]:
+            continue
+        ratio = row["wall_s"] / old["wall_s"]
+        line = f"{row['zones']:>6} {row['stage']:<16} {old['wall_s']:>9.4f}s -> {row['wall_s']:>9.4f}s ({ratio:.2f}x)"
+        print(line, file=sys.stderr, flush=True)
+        if ratio > 1 + tolerance and row["wall_s"] - old["wall_s"] >= MIN_REGRESSION_S:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline da matriz de bairros.")
+    parser.add_argument(
+        "--zones",
+        default=DEFAULT_ZONES,
+        help=f"Tamanhos, separados por virgula (default: {DEFAULT_ZONES}).",
+    )
+    parser.add_argument("--matrix-json", default=DEFAULT_MATRIX_JSON, help=f"(default: {DEFAULT_MATRIX_JSON})")
+    parser.add_argument("--cache-json", default=DEFAULT_CACHE_JSON, help=f"(default: {DEFAULT_CACHE_JSON})")
+    parser.add_argument("--http-fixtures", default="", help="Fixtures gravadas com --http-mode record (geocode).")
+    parser.add_argument("--policy", default=DEFAULT_POLICY, help=f"(default: {DEFAULT_POLICY})")
+    parser.add_argument("--block-size", type=int, default=45, help="Bloco do OSRM table (default: 45).")
+    parser.add_argument("--detour-factor", type=float, default=1.3, help="(default: 1.3)")
+    parser.add_argument("--speed-kmh", type=float, default=30.0, help="(default: 30)")
+    parser.add_argument("--jitter-m", type=float, default=1500.0, help="Deslocamento das zonas extras (default: 1500).")
+    parser.add_argument("--seed", type=int, default=7, help="(default: 7)")
+    parser.add_argument("--quotes", type=int, default=200000, help="Cotacoes por tamanho (default: 200000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticoes das etapas curtas (default: 3).")
+    parser.add_argument("--output", help="Salva o JSON do resultado (default: stdout).")
+    parser.add_argument("--compare", help="Resultado anterior para comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Folga de regressao (default: 0.25).")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_size(args, args.single)), flush=True)
+        return
+
+    results: list[dict[str, Any]] = []
+    for count in [int(value) for value in args.zones.split(",") if value.strip()]:
+        print(f"[BENCH] {count} zonas...", file=sys.stderr, flush=True)
+        out = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--single", str(count)],
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            raise SystemExit(f"Benchmark com {count} zonas falhou:\n{out.stderr}")
+        results.extend(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "block_size": args.block_size,
+            "quotes": args.quotes,
+            "seed": args.seed,
+            "jitter_m": args.jitter_m,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+        print(f"[DONE] Benchmark salvo em: {args.output}", file=sys.stderr, flush=True)
+    else:
+        print(payload, flush=True)
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(report, previous, args.tolerance)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} etapa(s) acima da tolerancia de {args.tolerance:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Resolver de chuva por faixa de 10 minutos (dominio `climate` da politica).
+
+Toda cotacao precisa de `is_raining`, mas o clima muda na escala da faixa
+(`{time_bucket_10min}` no `key_template`), nao da cotacao:
+  - uma chamada upstream por faixa: misses concorrentes da mesma faixa sao
+    coalescidos (single-flight) e o resultado fica no cache SWR;
+  - perto do fim da faixa (`--prefetch-lead-s`) a proxima e resolvida em
+    background, entao a virada de faixa nao cai em miss;
+  - `rain_detection.field_candidates` (ex.: "hourly[0].rain.1h") sao
+    compilados uma vez em acessores; o primeiro valor numerico encontrado
+    vale (>= `is_raining_if_mm_per_h_gte` e chuva);
+  - openweather -> met_no nos timeouts da politica; se os dois falham vale
+    `on_all_fail.default` (climate_default_no_rain), guardado para a faixa.
+
+Chaves: OPENWEATHER_API_KEY (openweather); met.no exige apenas User-Agent.
+Coordenada da cidade: centro dos bairros geocodificados da matriz local.
+
+Uso:
+  python Docs/scripts/climate_resolver.py
+  python Docs/scripts/climate_resolver.py --bench-buckets 6 --quotes-per-wave 200 \\
+      --stub openweather=300:0.2 --stub met_no=150
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+from bairro_matrix_time_buckets import profile_timezone
+from freight_quote import DEFAULT_POLICY, load_policy
+from policy_resolver import OrderedFailoverResolver, Provider, ProviderError, authorized
+
+DOMAIN = "climate"
+CLIMATE_USER_AGENT = "Roodi-Climate/1.0 (contato: local-script)"
+PROVIDER_KEY_ENV = {"openweather": "OPENWEATHER_API_KEY"}
+BUCKET_FIELD_RE = re.compile(r"\{(time_bucket_(\d+)min)\}")
+PATH_TOKEN_RE = re.compile(r"\[(\d+)\]|([^.\[\]]+)")
+DEFAULT_PREFETCH_LEAD_S = 60.0
+
+Fetcher = Callable[[dict[str, Any]], Any]
+
+
+def compile_field_path(path: str) -> Callable[[Any], Any]:
+    """"hourly[0].rain.1h" -> funcao doc -> valor (None se o caminho nao existir)."""
+    steps: list[int | str] = []
+    consumed = 0
+    for match in PATH_TOKEN_RE.finditer(path):
+        index, key = match.groups()
+        steps.append(int(index) if index is not None else key)
+        consumed += len(match.group(0))
+    if not steps or consumed + path.count(".") != len(path):
+        raise ValueError(f"field_candidate invalido: {path!r}")
+
+    def get(doc: Any) -> Any:
+        current = doc
+        for step in steps:
+            try:
+                current = current[step]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return current
+
+    return get
+
+
+def rain_detector(spec: dict[str, Any]) -> Callable[[Any], dict[str, Any]]:
+    rule = spec.get("rain_detection", {})
+    accessors = [compile_field_path(path) for path in rule.get("field_candidates", [])]
+    threshold = float(rule.get("is_raining_if_mm_per_h_gte", 0.1))
+
+    def detect(doc: Any) -> dict[str, Any]:
+        if not isinstance(doc, dict):
+            raise ProviderError("resposta de clima invalida")
+        for get in accessors:
+            value = get(doc)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return {"is_raining": value >= threshold, "rain_mm_per_h": float(value), "confidence": "high"}
+        # OpenWeather omite o bloco `rain` quando nao chove.
+        return {"is_raining": False, "rain_mm_per_h": 0.0, "confidence": "medium"}
+
+    return detect
+
+
+def http_get_json(url: str, params: dict[str, Any], headers: dict[str, str], timeout_s: float) -> Any:
+    sep = "&" if "?" in url else "?"
+    request = urllib.request.Request(
+        f"{url}{sep}{urllib.parse.urlencode(params)}",
+        headers={"Accept": "application/json", **headers},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_s) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as exc:
+        raise ProviderError(f"HTTP {exc.code}") from exc
+    except (urllib.error.URLError, TimeoutError, ValueError) as exc:
+        raise ProviderError(str(exc)) from exc
+
+
+def openweather_fetcher(spec: dict[str, Any], api_key: str) -> Fetcher:
+    url, headers = authorized(spec, api_key)
+    timeout_s = float(spec.get("timeout_ms", 1200)) / 1000
+
+    def fetch(request: dict[str, Any]) -> Any:
+        params = {
+            "lat": request["lat"],
+            "lon": request["lon"],
+            "exclude": "minutely,daily,alerts",
+            "units": "metric",
+        }
+        return http_get_json(url, params, headers, timeout_s)
+
+    return fetch
+
+
+def met_no_fetcher(spec: dict[str, Any], user_agent: str = CLIMATE_USER_AGENT) -> Fetcher:
+    url, headers = authorized(spec, user_agent)
+    timeout_s = float(spec.get("timeout_ms", 1200)) / 1000
+
+    def fetch(request: dict[str, Any]) -> Any:
+        params = {"lat": round(request["lat"], 4), "lon": round(request["lon"], 4)}
+        payload = http_get_json(url, params, headers, timeout_s)
+        # Os field_candidates do met_no partem de `properties`.
+        return payload.get("properties", payload) if isinstance(payload, dict) else payload
+
+    return fetch
+
+
+def build_fetchers(domain: dict[str, Any], api_keys: dict[str, str] | None = None) -> dict[str, Fetcher]:
+    keys = {provider_id: os.getenv(env, "") for provider_id, env in PROVIDER_KEY_ENV.items()}
+    keys.update(api_keys or {})
+    fetchers: dict[str, Fetcher] = {}
+    for spec in domain.get("providers", []):
+        if spec["id"] == "openweather" and keys.get("openweather"):
+            fetchers[spec["id"]] = openweather_fetcher(spec, keys["openweather"])
+        elif spec["id"] == "met_no":
+            fetchers[spec["id"]] = met_no_fetcher(spec)
+    return fetchers
+
+
+def city_center(policy: dict[str, Any]) -> tuple[float, float]:
+    """Media das coordenadas dos bairros da matriz local do dominio distance_time."""
+    local = next(
+        spec for spec in policy["domains"]["distance_time"]["providers"] if spec.get("kind") == "local_file"
+    )
+    payload = json.loads(Path(local["source_file"]).read_text(encoding="utf-8"))
+    points = [(b["lat"], b["lon"]) for b in payload.get("bairros", []) if isinstance(b.get("lat"), (int, float))]
+    if not points:
+        raise ValueError(f"Matriz sem bairros geocodificados: {local['source_file']}")
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+class ClimateStub:
+    """Fetcher local para testes, no formato do provider; conta chamadas por faixa."""
+
+    def __init__(
+        self,
+        provider_id: str,
+        latency_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        rain_rate: float = 0.3,
+        seed: int = 0,
+    ) -> None:
+        self.provider_id = provider_id
+        self.latency_s = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.rain_rate = rain_rate
+        self.calls: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, request: dict[str, Any]) -> Any:
+        with self._lock:
+            self.calls[request["bucket"]] += 1
+            fail = self._rng.random() < self.failure_rate
+            mm = round(self._rng.uniform(0.2, 8.0), 1) if self._rng.random() < self.rain_rate else 0.0
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if fail:
+            raise ProviderError("falha simulada")
+        if self.provider_id == "met_no":
+            return {"timeseries": [{"data": {"next_1_hours": {"details": {"precipitation_amount": mm}}}}]}
+        return {"current": {"rain": {"1h": mm}} if mm else {}}
+
+
+class ClimateResolver:
+    """`is_raining` da cidade na faixa de 10 minutos de uma cotacao."""
+
+    def __init__(
+        self,
+        policy: dict[str, Any],
+        fetchers: dict[str, Fetcher] | None = None,
+        api_keys: dict[str, str] | None = None,
+        lat: float | None = None,
+        lon: float | None = None,
+        prefetch_lead_s: float = DEFAULT_PREFETCH_LEAD_S,
+        clock: Callable[[], float] = time.time,
+        workers: int = 4,
+    ) -> None:
+        domain = policy["domains"][DOMAIN]
+        context = policy.get("context", {})
+        self.city = context.get("city", "")
+        self.tz = profile_timezone({"timezone": context.get("timezone", "America/Fortaleza")})
+        self.key_template = domain.get("cache", {}).get("key_template", DOMAIN + ":{city}:{time_bucket_10min}")
+        match = BUCKET_FIELD_RE.search(self.key_template)
+        self.bucket_field = match.group(1) if match else "time_bucket_10min"
+        self.bucket_s = int(match.group(2)) * 60 if match else 600
+        if lat is None or lon is None:
+            lat, lon = city_center(policy)
+        self.lat, self.lon = lat, lon
+        self.prefetch_lead_s = prefetch_lead_s
+        self.clock = clock
+
+        # Cada fetcher devolve o documento bruto; a deteccao de chuva da politica vem depois.
+        detectors = {spec["id"]: rain_detector(spec) for spec in domain.get("providers", [])}
+        merged = {**build_fetchers(domain, api_keys), **(fetchers or {})}
+        providers: dict[str, Provider] = {
+            provider_id: (lambda request, fetch=fetch, detect=detectors[provider_id]: detect(fetch(request)))
+            for provider_id, fetch in merged.items()
+            if provider_id in detectors
+        }
+        # Cache no mesmo relogio das faixas (epoch), para testes com relogio virtual. O default de
+        # on_all_fail vale a faixa inteira: reagendar a cada leitura faria varias chamadas por faixa
+        # justo durante uma queda dos providers.
+        self.resolver = OrderedFailoverResolver(domain, providers, workers=workers, clock=clock, retry_default=False)
+        # A chave ja carrega a faixa: a entrada vale ate o fim dela, mesmo se buscada no prefetch
+        # (`prefetch_lead_s` antes do inicio); revalidar dentro da mesma faixa seria chamada extra.
+        cache = self.resolver.cache
+        cache.ttl_s = max(cache.ttl_s, self.bucket_s + prefetch_lead_s)
+
+    @classmethod
+    def from_files(cls, policy_path: Path | str = DEFAULT_POLICY, **kwargs: Any) -> ClimateResolver:
+        return cls(load_policy(policy_path), **kwargs)
+
+    def bucket_of(self, epoch: float) -> tuple[int, str]:
+        start = int(epoch // self.bucket_s) * self.bucket_s
+        return start, dt.datetime.fromtimestamp(start, self.tz).strftime("%Y-%m-%dT%H:%M")
+
+    def _key_and_request(self, start: int, label: str) -> tuple[str, dict[str, Any]]:
+        key = self.key_template.format_map({"city": self.city, self.bucket_field: label})
+        return key, {"lat": self.lat, "lon": self.lon, "bucket": label, "bucket_start": start}
+
+    def resolve(self, at: dt.datetime | None = None) -> dict[str, Any]:
+        started = time.perf_counter()
+        now = self.clock() if at is None else at.timestamp()
+        start, label = self.bucket_of(now)
+        result = self.resolver.resolve(*self._key_and_request(start, label))
+        if at is None and start + self.bucket_s - now <= self.prefetch_lead_s:
+            self.resolver.prefetch(*self._key_and_request(*self.bucket_of(start + self.bucket_s)))
+        return {
+            "is_raining": bool(result["is_raining"]),
+            "source": result["provider"],
+            "confidence": result.get("confidence", "low"),
+            "rain_mm_per_h": result.get("rain_mm_per_h"),
+            "bucket": label,
+            "cache": result["cache"],
+            "fallback_used": result["fallback_used"],
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def close(self) -> None:
+        self.resolver.close()
+
+
+def parse_stub(raw: str) -> tuple[str, float, float]:
+    """"id=latencia_ms[:taxa_de_falha]"."""
+    provider_id, _, spec = raw.partition("=")
+    latency, _, failure = spec.partition(":")
+    return provider_id, float(latency or 0), float(failure or 0)
+
+
+def run_bench(policy: dict[str, Any], args: argparse.Namespace) -> dict[str, Any]:
+    """Relogio virtual: `--bench-buckets` faixas, ondas de cotacoes concorrentes em pontos de cada faixa."""
+    stubs = {
+        provider_id: ClimateStub(provider_id, latency_ms, failure_rate, seed=args.seed + k)
+        for k, (provider_id, latency_ms, failure_rate) in enumerate(parse_stub(raw) for raw in args.stub)
+    }
+    virtual_now = [float(int(time.time() // 600) * 600)]
+    resolver = ClimateResolver(
+        policy,
+        fetchers=stubs,
+        lat=args.lat,
+        lon=args.lon,
+        prefetch_lead_s=args.prefetch_lead_s,
+        clock=lambda: virtual_now[0],
+    )
+    latencies: list[float] = []
+    caches: Counter[str] = Counter()
+    sources: Counter[str] = Counter()
+    # Inicio, meio, dentro da janela de prefetch e ultimo instante da faixa.
+    offsets = (1.0, resolver.bucket_s / 2, resolver.bucket_s - args.prefetch_lead_s / 2, resolver.bucket_s - 1.0)
+    base = virtual_now[0]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.threads)) as pool:
+            for bucket in range(args.bench_buckets):
+                for offset in offsets:
+                    virtual_now[0] = base + bucket * resolver.bucket_s + offset
+                    for result in pool.map(lambda _i: resolver.resolve(), range(args.quotes_per_wave)):
+                        latencies.append(result["latency_ms"])
+                        caches[result["cache"]] += 1
+                        sources[result["source"]] += 1
+                    # Da tempo ao prefetch em background antes da proxima onda.
+                    time.sleep(args.wave_gap_ms / 1000)
+    finally:
+        resolver.close()
+    latencies.sort()
+    calls_per_bucket: Counter[str] = Counter()
+    for stub in stubs.values():
+        calls_per_bucket.update(stub.calls)
+    return {
+        "buckets": args.bench_buckets,
+        "quotes": len(latencies),
+        "latency_ms": {
+            "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+            "p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "cache": dict(caches),
+        "sources": dict(sources),
+        "upstream_calls": {provider_id: sum(stub.calls.values()) for provider_id, stub in stubs.items()},
+        # Inclui retries (`max_retries`) de chamadas que falharam.
+        "max_upstream_calls_per_bucket": max(calls_per_bucket.values(), default=0),
+        "buckets_resolved": len(calls_per_bucket),
+        "stats": dict(sorted(resolver.resolver.stats.items())),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resolve is_raining da cidade pela politica de frete.")
+    parser.add_argument("--policy", default=DEFAULT_POLICY, help=f"(default: {DEFAULT_POLICY})")
+    parser.add_argument("--at", help="Horario ISO (default: agora).")
+    parser.add_argument("--lat", type=float, help="Latitude (default: centro dos bairros da matriz).")
+    parser.add_argument("--lon", type=float, help="Longitude (default: centro dos bairros da matriz).")
+    parser.add_argument(
+        "--prefetch-lead-s",
+        type=float,
+        default=DEFAULT_PREFETCH_LEAD_S,
+        help=f"Antecedencia do prefetch da proxima faixa (default: {DEFAULT_PREFETCH_LEAD_S:.0f}).",
+    )
+    parser.add_argument("--bench-buckets", type=int, default=0, help="Simula N faixas com relogio virtual e stubs.")
+    parser.add_argument(
+        "--quotes-per-wave", type=int, default=100, help="Cotacoes concorrentes por onda (default: 100)."
+    )
+    parser.add_argument("--threads", type=int, default=32, help="Threads do bench (default: 32).")
+    parser.add_argument("--wave-gap-ms", type=float, default=500.0, help="Pausa entre ondas do bench (default: 500).")
+    parser.add_argument(
+        "--stub",
+        action="append",
+        default=[],
+        help="Provider simulado no bench: id=latencia_ms[:taxa_de_falha] (repetivel).",
+    )
+    parser.add_argument("--seed", type=int, default=7, help="(default: 7)")
+    args = parser.parse_args()
+
+    policy = load_policy(args.policy)
+    if args.bench_buckets > 0:
+        if not args.stub:
+            parser.error("--bench-buckets exige ao menos um --stub.")
+        print(json.dumps(run_bench(policy, args), ensure_ascii=False, indent=2), flush=True)
+        return
+
+    resolver = ClimateResolver(policy, lat=args.lat, lon=args.lon, prefetch_lead_s=args.prefetch_lead_s)
+    if resolver.resolver.skipped:
+        print(f"[INFO] Sem implementacao/credencial: {resolver.resolver.skipped}", flush=True)
+    try:
+        at = dt.datetime.fromisoformat(args.at.replace("Z", "+00:00")) if args.at else None
+        print(json.dumps(resolver.resolve(at), ensure_ascii=False), flush=True)
+    finally:
+        resolver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""Resolver de distancia/tempo entre bairros (dominio `distance_time` da politica).
+
+Cadeia da politica (`Docs/config/freight-fallback-policy.json`):
+  1. local_bairro_matrix: matriz gerada (`source_file`), lookup O(1) no array;
+  2. tomtom_matrix / openrouteservice_matrix: APIs de matriz 1x1 com as
+     coordenadas geocodificadas do proprio artefato (chaves em
+     TOMTOM_API_KEY / OPENROUTESERVICE_API_KEY; sem chave o provider fica
+     fora da cadeia).
+
+Cache, coalescencia de misses e circuit breakers vem de
+`policy_resolver.OrderedFailoverResolver`. A chave segue `key_template` com
+os nomes canonicos da matriz (grafias diferentes caem na mesma entrada).
+
+Uso:
+  python Docs/scripts/distance_time_resolver.py --origin Centro --destination Bacuri
+  # providers externos simulados: 5% dos pares sem rota local, TomTom lento
+  python Docs/scripts/distance_time_resolver.py --bench 20000 --local-miss-rate 0.05 \\
+      --stub tomtom_matrix=3000 --stub openrouteservice_matrix=80
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from bairro_matrix_bin import NULL_U32
+from bairro_name_index import BairroNameIndex
+from freight_quote import DEFAULT_POLICY, load_policy
+from policy_resolver import (
+    DEFAULT_MAX_ENTRIES,
+    OrderedFailoverResolver,
+    Provider,
+    ProviderError,
+    ResolveError,
+    authorized,
+)
+
+DOMAIN = "distance_time"
+PROVIDER_KEY_ENV = {
+    "tomtom_matrix": "TOMTOM_API_KEY",
+    "openrouteservice_matrix": "OPENROUTESERVICE_API_KEY",
+}
+
+
+class MatrixSource:
+    """Matriz gerada + coordenadas + indice de nomes (`.names.json` ao lado, se existir)."""
+
+    def __init__(self, path: Path | str) -> None:
+        matrix_path = Path(path)
+        payload = json.loads(matrix_path.read_text(encoding="utf-8"))
+        matrix = payload["matrix"]
+        self.order: list[str] = list(matrix["order"])
+        self.n = len(self.order)
+        self.distance_m = array("I", (NULL_U32 if v is None else int(v) for row in matrix["distance_m"] for v in row))
+        self.duration_s = array("I", (NULL_U32 if v is None else int(v) for row in matrix["duration_s"] for v in row))
+        by_name = {b["name"]: b for b in payload.get("bairros", [])}
+        self.coords: list[tuple[float, float] | None] = [
+            (float(by_name[name]["lat"]), float(by_name[name]["lon"]))
+            if isinstance(by_name.get(name, {}).get("lat"), (int, float))
+            else None
+            for name in self.order
+        ]
+        names_path = matrix_path.with_suffix(".names.json")
+        self.names = BairroNameIndex.load(names_path) if names_path.exists() else BairroNameIndex.from_order(self.order)
+
+    def coords_of(self, idx: int) -> tuple[float, float]:
+        coords = self.coords[idx]
+        if coords is None:
+            raise ProviderError(f"Bairro sem coordenadas no artefato: {self.order[idx]}")
+        return coords
+
+
+def local_matrix_provider(source: MatrixSource) -> Provider:
+    distance_m = source.distance_m
+    duration_s = source.duration_s
+    n = source.n
+
+    def fetch(request: dict[str, Any]) -> dict[str, Any]:
+        cell = request["origin_index"] * n + request["destination_index"]
+        distance, duration = distance_m[cell], duration_s[cell]
+        if distance == NULL_U32 or duration == NULL_U32:
+            raise ProviderError("par sem rota na matriz local")
+        return {"distance_m": distance, "duration_s": duration}
+
+    return fetch
+
+
+def http_post_json(url: str, body: Any, headers: dict[str, str], timeout_s: float) -> Any:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", "Accept": "application/json", **headers},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_s) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as exc:
+        raise ProviderError(f"HTTP {exc.code}") from exc
+    except (urllib.error.URLError, TimeoutError, ValueError) as exc:
+        raise ProviderError(str(exc)) from exc
+
+
+def tomtom_matrix_provider(spec: dict[str, Any], source: MatrixSource, api_key: str) -> Provider:
+    url, headers = authorized(spec, api_key)
+    timeout_s = float(spec.get("timeout_ms", 1500)) / 1000
+
+    def fetch(request: dict[str, Any]) -> dict[str, Any]:
+        o_lat, o_lon = source.coords_of(request["origin_index"])
+        d_lat, d_lon = source.coords_of(request["destination_index"])
+        payload = http_post_json(
+            url,
+            {
+                "origins": [{"point": {"latitude": o_lat, "longitude": o_lon}}],
+                "destinations": [{"point": {"latitude": d_lat, "longitude": d_lon}}],
+            },
+            headers,
+            timeout_s,
+        )
+        try:
+            summary = payload["data"][0]["routeSummary"]
+            return {"distance_m": int(summary["lengthInMeters"]), "duration_s": int(summary["travelTimeInSeconds"])}
+        except (KeyError, IndexError, TypeError, ValueError) as exc:
+            raise ProviderError("resposta TomTom sem routeSummary") from exc
+
+    return fetch
+
+
+def openrouteservice_matrix_provider(spec: dict[str, Any], source: MatrixSource, api_key: str) -> Provider:
+    url, headers = authorized(spec, api_key)
+    timeout_s = float(spec.get("timeout_ms", 1800)) / 1000
+
+    def fetch(request: dict[str, Any]) -> dict[str, Any]:
+        o_lat, o_lon = source.coords_of(request["origin_index"])
+        d_lat, d_lon = source.coords_of(request["destination_index"])
+        payload = http_post_json(
+            url,
+            {
+                "locations": [[o_lon, o_lat], [d_lon, d_lat]],
+                "sources": [0],
+                "destinations": [1],
+                "metrics": ["distance", "duration"],
+            },
+            headers,
+            timeout_s,
+        )
+        try:
+            distance = payload["distances"][0][0]
+            duration = payload["durations"][0][0]
+        except (KeyError, IndexError, TypeError) as exc:
+            raise ProviderError("resposta OpenRouteService sem distances/durations") from exc
+        if distance is None or duration is None:
+            raise ProviderError("OpenRouteService sem rota para o par")
+        return {"distance_m": int(round(distance)), "duration_s": int(round(duration))}
+
+    return fetch
+
+
+class StubProvider:
+    """Provider local para testes: latencia fixa, taxa de falha e valores da matriz x `factor`."""
+
+    def __init__(
+        self,
+        source: MatrixSource,
+        latency_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        factor: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        self.source = source
+        self.latency_s = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.factor = factor
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, request: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.failure_rate
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if fail:
+            raise ProviderError("falha simulada")
+        cell = request["origin_index"] * self.source.n + request["destination_index"]
+        distance, duration = self.source.distance_m[cell], self.source.duration_s[cell]
+        if distance == NULL_U32 or duration == NULL_U32:
+            raise ProviderError("stub sem rota para o par")
+        return {"distance_m": int(distance * self.factor), "duration_s": int(duration * self.factor)}
+
+
+def build_providers(
+    domain: dict[str, Any],
+    source: MatrixSource,
+    api_keys: dict[str, str] | None = None,
+) -> dict[str, Provider]:
+    """Providers reais da politica; os HTTP so entram com chave configurada."""
+    keys = {provider_id: os.getenv(env, "") for provider_id, env in PROVIDER_KEY_ENV.items()}
+    keys.update(api_keys or {})
+    factories = {
+        "tomtom_matrix": tomtom_matrix_provider,
+        "openrouteservice_matrix": openrouteservice_matrix_provider,
+    }
+    providers: dict[str, Provider] = {}
+    for spec in domain.get("providers", []):
+        if spec.get("kind") == "local_file":
+            providers[spec["id"]] = local_matrix_provider(source)
+        elif spec["id"] in factories and keys.get(spec["id"]):
+            providers[spec["id"]] = factories[spec["id"]](spec, source, keys[spec["id"]])
+    return providers
+
+
+class DistanceTimeResolver:
+    """Resolve (origem, destino) por nome livre de bairro para distancia e duracao."""
+
+    def __init__(
+        self,
+        policy: dict[str, Any],
+        providers: dict[str, Provider] | None = None,
+        api_keys: dict[str, str] | None = None,
+        source: MatrixSource | None = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        workers: int = 16,
+    ) -> None:
+        domain = policy["domains"][DOMAIN]
+        if source is None:
+            local = next((spec for spec in domain.get("providers", []) if spec.get("kind") == "local_file"), None)
+            if local is None:
+                raise ValueError("Politica sem provider local_file para o dominio distance_time.")
+            source = MatrixSource(local["source_file"])
+        self.source = source
+        self.city = policy.get("context", {}).get("city", "")
+        self.key_template = domain.get("cache", {}).get(
+            "key_template", DOMAIN + ":{city}:{origin_bairro}:{destination_bairro}"
+        )
+        # `providers` substitui os da politica por id (stubs de teste, clientes proprios).
+        self.resolver = OrderedFailoverResolver(
+            domain,
+            {**build_providers(domain, source, api_keys), **(providers or {})},
+            max_entries=max_entries,
+            workers=workers,
+        )
+
+    @classmethod
+    def from_files(cls, policy_path: Path | str = DEFAULT_POLICY, **kwargs: Any) -> DistanceTimeResolver:
+        return cls(load_policy(policy_path), **kwargs)
+
+    def resolve(self, origin: str, destination: str) -> dict[str, Any]:
+        started = time.perf_counter()
+        oi = self.source.names.resolve(origin)
+        di = self.source.names.resolve(destination)
+        if oi is None or di is None:
+            missing = origin if oi is None else destination
+            raise ResolveError("INVALID_INPUT", f"Bairro fora da matriz: {missing}")
+        origin_name, destination_name = self.source.order[oi], self.source.order[di]
+        key = self.key_template.format(city=self.city, origin_bairro=origin_name, destination_bairro=destination_name)
+        result = self.resolver.resolve(
+            key,
+            {
+                "origin": origin_name,
+                "destination": destination_name,
+                "origin_index": oi,
+                "destination_index": di,
+            },
+        )
+        return {
+            "origin_bairro": origin_name,
+            "destination_bairro": destination_name,
+            **result,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def close(self) -> None:
+        self.resolver.close()
+
+
+def parse_stub(raw: str) -> tuple[str, float, float]:
+    """"id=latencia_ms[:taxa_de_falha]"."""
+    provider_id, _, spec = raw.partition("=")
+    latency, _, failure = spec.partition(":")
+    return provider_id, float(latency or 0), float(failure or 0)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resolve distancia/tempo entre bairros pela politica de frete.")
+    parser.add_argument("--policy", default=DEFAULT_POLICY, help=f"(default: {DEFAULT_POLICY})")
+    parser.add_argument("--origin")
+    parser.add_argument("--destination")
+    parser.add_argument("--bench", type=int, default=0, help="Resolve N pares aleatorios e mede a latencia.")
+    parser.add_argument("--threads", type=int, default=8, help="Threads do --bench (default: 8).")
+    parser.add_argument(
+        "--stub",
+        action="append",
+        default=[],
+        help="Substitui um provider por stub local: id=latencia_ms[:taxa_de_falha] (repetivel).",
+    )
+    parser.add_argument(
+        "--local-miss-rate",
+        type=float,
+        default=0.0,
+        help="Fracao dos pares sem rota na matriz local, para exercitar o failover (default: 0).",
+    )
+    parser.add_argument("--seed", type=int, default=7, help="(default: 7)")
+    args = parser.parse_args()
+    if not (args.origin and args.destination) and args.bench <= 0:
+        parser.error("Informe --origin/--destination ou --bench.")
+
+    policy = load_policy(args.policy)
+    providers: dict[str, Provider] = {}
+    source: MatrixSource | None = None
+    if args.stub or args.local_miss_rate > 0:
+        local = next(spec for spec in policy["domains"][DOMAIN]["providers"] if spec.get("kind") == "local_file")
+        source = MatrixSource(local["source_file"])
+        for k, raw in enumerate(args.stub):
+            provider_id, latency_ms, failure_rate = parse_stub(raw)
+            providers[provider_id] = StubProvider(source, latency_ms, failure_rate, seed=args.seed + k)
+        if args.local_miss_rate > 0:
+            local_fetch = local_matrix_provider(source)
+            # Mesmo par, mesma decisao: simula buracos fixos na matriz.
+            holes = {
+                cell for cell in range(source.n * source.n) if random.Random(cell).random() < args.local_miss_rate
+            }
+
+            def partial_local(request: dict[str, Any]) -> dict[str, Any]:
+                if request["origin_index"] * source.n + request["destination_index"] in holes:
+                    raise ProviderError("par sem rota na matriz local")
+                return local_fetch(request)
+
+            providers[local["id"]] = partial_local
+    resolver = DistanceTimeResolver(policy, providers=providers, source=source)
+    chain = resolver.resolver
+    print(f"[INFO] Providers: {[spec['id'] for spec in chain.specs]}", flush=True)
+    if chain.skipped:
+        print(f"[INFO] Sem implementacao/credencial: {chain.skipped}", flush=True)
+
+    try:
+        if args.origin and args.destination:
+            print(json.dumps(resolver.resolve(args.origin, args.destination), ensure_ascii=False), flush=True)
+        if args.bench > 0:
+            rng = random.Random(args.seed)
+            order = resolver.source.order
+            pairs = [(rng.choice(order), rng.choice(order)) for _ in range(args.bench)]
+            latencies: list[float] = []
+            errors: dict[str, int] = {}
+            lock = threading.Lock()
+
+            def run(pair: tuple[str, str]) -> None:
+                started = time.perf_counter()
+                try:
+                    resolver.resolve(*pair)
+                    code = None
+                except ResolveError as exc:
+                    code = exc.code
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if code:
+                        errors[code] = errors.get(code, 0) + 1
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, args.threads)) as pool:
+                list(pool.map(run, pairs))
+            wall = time.perf_counter() - started
+            latencies.sort()
+            print(
+                json.dumps(
+                    {
+                        "requests": len(pairs),
+                        "wall_s": round(wall, 3),
+                        "latency_ms": {
+                            "p50": round(percentile(latencies, 0.50), 3),
+                            "p95": round(percentile(latencies, 0.95), 3),
+                            "p99": round(percentile(latencies, 0.99), 3),
+                            "max": round(latencies[-1], 3) if latencies else 0.0,
+                        },
+                        "errors": errors,
+                        "stats": dict(sorted(chain.stats.items())),
+                        "breakers": chain.breaker_states(),
+                        "cache_entries": len(chain.cache),
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                flush=True,
+            )
+    finally:
+        resolver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Tabela de precos pre-calculada por versao de regra de preco.
+
+Materializa o espaco inteiro de cotacoes de uma versao (`pricing_rule_versions`
+ou a politica JSON): para cada par da matriz, cada urgencia e cada uma das 16
+combinacoes de flags (domingo/feriado/chuva/pico) grava o total final em
+centavos. Uma cotacao vira um unico acesso por indice:
+
+  indice = ((origem * n + destino) * U + urgencia) * 16 + flags
+
+Arquivo (mesmo container de secoes do RBMX, magic "RBPT"):
+  - secao "order": nomes dos bairros em UTF-8 separados por "\\n"
+  - secao "meta": JSON com version_code, urgencias, hash da matriz; a
+    ultima urgencia e UNKNOWN_URGENCY (""), adicional 0, usada para
+    urgencias sem regra como no motor e no quote.service do backend
+  - secao "price": uint16 em centavos; PRICE_NO_ROUTE (sem rota local,
+    segue para provider externo) e PRICE_OUT_OF_COVERAGE (rejeitar)
+
+Uso:
+  python Docs/scripts/freight_price_table.py
+  python Docs/scripts/freight_price_table.py --rule-version pricing_rule_version.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Callable
+
+from bairro_matrix_bin import SectionFile, load_matrix_arrays, write_sections
+from freight_quote import (
+    DEFAULT_MATRIX,
+    DEFAULT_POLICY,
+    FLAG_COMBINATIONS,
+    ZONE_NO_ROUTE,
+    ZONE_OUT_OF_COVERAGE,
+    FreightQuoteEngine,
+    load_policy,
+)
+
+PRICE_MAGIC = b"RBPT"
+PRICE_NO_ROUTE = 0xFFFF
+PRICE_OUT_OF_COVERAGE = 0xFFFE
+MAX_PRICE_CENTS = 0xFFFD
+UNKNOWN_URGENCY = ""
+DEFAULT_TABLE_DIR = "Docs/data/price_tables"
+
+
+def business_rules_from_rule_version(row: dict[str, Any]) -> dict[str, Any]:
+    """Converte um export de `pricing_rule_versions` (com relacoes) para `business_rules`."""
+    return {
+        "urgency_addon_brl": {
+            rule["urgency"]: float(rule["addon_brl"]) for rule in row.get("pricing_urgency_rules", [])
+        },
+        "distance_zones_brl": [
+            {
+                "zone": int(rule["zone"]),
+                "min_km": float(rule["min_km"]),
+                "max_km": float(rule["max_km"]),
+                "value": float(rule["base_value_brl"]),
+            }
+            for rule in row.get("pricing_zone_rules", [])
+        ],
+        "conditional_addons_brl": {
+            rule["condition_key"]: float(rule["addon_brl"]) for rule in row.get("pricing_conditional_rules", [])
+        },
+        "pricing_formula": {
+            "minimum_charge_brl": float(row["minimum_charge_brl"]),
+            "max_distance_policy": {"when_distance_km_gt": float(row["max_distance_km"])},
+        },
+    }
+
+
+def load_rule_version(path: Path | str, version_code: str | None = None) -> dict[str, Any]:
+    """Le um export JSON (linha unica ou lista) e escolhe a versao pedida ou a ativa."""
+    payload = json.loads(Path(path).read_text(encoding="utf-8"))
+    rows = payload if isinstance(payload, list) else [payload]
+    for row in rows:
+        if version_code is not None and row.get("version_code") == version_code:
+            return row
+        if version_code is None and (len(rows) == 1 or row.get("is_active")):
+            return row
+    raise ValueError(f"Versao de regra de preco nao encontrada: {version_code or 'ativa'}")
+
+
+def matrix_fingerprint(distance_m: array, duration_s: array) -> str:
+    digest = hashlib.sha256()
+    digest.update(distance_m.tobytes())
+    digest.update(duration_s.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def build_price_table(engine: FreightQuoteEngine) -> tuple[list[str], array]:
+    """Retorna (urgencias, precos) com o layout descrito no modulo."""
+    rules = engine.rules
+    urgencies = [*rules.urgency_cents, UNKNOWN_URGENCY]
+    stride = len(urgencies) * FLAG_COMBINATIONS
+
+    # Bloco de precos por zona: todas as (urgencia, flags) de um par ficam contiguas.
+    blocks: dict[int, array] = {
+        ZONE_NO_ROUTE: array("H", [PRICE_NO_ROUTE] * stride),
+        ZONE_OUT_OF_COVERAGE: array("H", [PRICE_OUT_OF_COVERAGE] * stride),
+    }
+    for zone, base in rules.zone_base_cents.items():
+        values = [
+            max(base + rules.urgency_cents.get(urgency, 0) + rules.addon_cents_by_mask[mask], rules.minimum_cents)
+            for urgency in urgencies
+            for mask in range(FLAG_COMBINATIONS)
+        ]
+        if max(values) > MAX_PRICE_CENTS:
+            raise ValueError(f"Preco da zona {zone} excede o limite de uint16 ({MAX_PRICE_CENTS} centavos).")
+        blocks[zone] = array("H", values)
+
+    prices = array("H", bytes(2 * len(engine.zone_index) * stride))
+    for cell, zone in enumerate(engine.zone_index):
+        start = cell * stride
+        prices[start : start + stride] = blocks[zone]
+    return urgencies, prices
+
+
+def write_price_table(
+    path: Path,
+    engine: FreightQuoteEngine,
+    version_code: str,
+    matrix_hash: str,
+) -> dict[str, Any]:
+    urgencies, prices = build_price_table(engine)
+    meta = {
+        "version_code": version_code,
+        "urgencies": urgencies,
+        "flag_combinations": FLAG_COMBINATIONS,
+        "matrix_sha256": matrix_hash,
+    }
+    if prices.itemsize != 2:
+        raise RuntimeError("array('H') sem 16 bits nesta plataforma.")
+    if sys.byteorder == "big":
+        prices.byteswap()
+    write_sections(
+        path,
+        engine.n,
+        {
+            "order": "\n".join(engine.order).encode("utf-8"),
+            "meta": json.dumps(meta, ensure_ascii=False).encode("utf-8"),
+            "price": prices.tobytes(),
+        },
+        magic=PRICE_MAGIC,
+    )
+    return meta
+
+
+class PriceTable(SectionFile):
+    """Leitor mmap da tabela de precos; uma cotacao = um acesso por indice."""
+
+    def __init__(self, path: Path | str) -> None:
+        super().__init__(path, magic=PRICE_MAGIC)
+        self.meta: dict[str, Any] = json.loads(bytes(self.section("meta")).decode("utf-8"))
+        self.version_code: str = self.meta["version_code"]
+        self.urgencies: list[str] = self.meta["urgencies"]
+        self.urgency_slot = {urgency: k for k, urgency in enumerate(self.urgencies)}
+        # Tabelas gravadas antes do slot de urgencia sem regra nao o tem.
+        self.unknown_slot = self.urgency_slot.get(UNKNOWN_URGENCY)
+        self.flag_combinations = int(self.meta["flag_combinations"])
+        self.stride = len(self.urgencies) * self.flag_combinations
+        self.price = self.typed_section("price", "H")
+
+    def index(self, origin: int, destination: int, urgency: str, flags: int = 0) -> int:
+        slot = self.urgency_slot.get(urgency, self.unknown_slot)
+        if slot is None:
+            raise KeyError(f"Urgencia sem regra na tabela {self.version_code}: {urgency}")
+        return (origin * self.n + destination) * self.stride + slot * self.flag_combinations + flags
+
+    def quote_cents(self, origin: int, destination: int, urgency: str = "padrao", flags: int = 0) -> int:
+        """Total em centavos, ou PRICE_NO_ROUTE / PRICE_OUT_OF_COVERAGE."""
+        return self.price[self.index(origin, destination, urgency, flags)]
+
+    def __enter__(self) -> PriceTable:
+        return self
+
+
+class ActivePriceTable:
+    """Mantem carregada a tabela da versao ativa e troca quando ela muda.
+
+    `activate(version_code)` e barato quando a versao nao mudou; quando muda,
+    carrega `<dir>/<version_code>.price.bin`, troca a referencia e notifica os
+    assinantes. Tabelas aposentadas nunca sao fechadas aqui: `activate()` le
+    `self.table` sem lock, entao um leitor pode estar no meio de uma cotacao
+    com qualquer tabela antiga. A ultima referencia a cair (do leitor ou
+    daqui) libera o mmap pelo GC.
+    """
+
+    def __init__(self, table_dir: Path | str = DEFAULT_TABLE_DIR) -> None:
+        self.table_dir = Path(table_dir)
+        self.table: PriceTable | None = None
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[str | None, str | None], None]] = []
+
+    def path_for(self, version_code: str) -> Path:
+        return self.table_dir / f"{version_code}.price.bin"
+
+    def subscribe(self, listener: Callable[[str | None, str | None], None]) -> None:
+        self._listeners.append(listener)
+
+    def _swap(self, table: PriceTable | None) -> None:
+        previous = self.table
+        self.table = table
+        old_code = previous.version_code if previous else None
+        new_code = table.version_code if table else None
+        for listener in self._listeners:
+            listener(old_code, new_code)
+
+    def activate(self, version_code: str) -> PriceTable:
+        current = self.table
+        if current is not None and current.version_code == version_code:
+            return current
+        with self._lock:
+            if self.table is None or self.table.version_code != version_code:
+                self._swap(PriceTable(self.path_for(version_code)))
+            return self.table  # type: ignore[return-value]
+
+    def invalidate(self) -> None:
+        """Descarta a tabela atual (ex.: nova versao publicada com mesmo codigo)."""
+        with self._lock:
+            if self.table is not None:
+                self._swap(None)
+
+    def close(self) -> None:
+        """Fecha a tabela ativa; so no desligamento, sem cotacoes em andamento."""
+        with self._lock:
+            if self.table is not None:
+                self.table.close()
+            self.table = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera a tabela de precos pre-calculada de uma versao de regra.")
+    parser.add_argument("--matrix", default=DEFAULT_MATRIX, help="Matriz JSON ou .bin (RBMX).")
+    parser.add_argument("--policy", default=DEFAULT_POLICY, help="Politica de frete (JSON).")
+    parser.add_argument(
+        "--rule-version",
+        help="Export JSON de pricing_rule_versions com relacoes (substitui business_rules da politica).",
+    )
+    parser.add_argument("--version-code", help="version_code a usar do export (default: a ativa).")
+    parser.add_argument(
+        "--output-dir",
+        default=DEFAULT_TABLE_DIR,
+        help=f"Diretorio das tabelas <version_code>.price.bin (default: {DEFAULT_TABLE_DIR}).",
+    )
+    args = parser.parse_args()
+
+    order, distance_m, duration_s = load_matrix_arrays(args.matrix)
+    if args.rule_version:
+        row = load_rule_version(args.rule_version, args.version_code)
+        business_rules = business_rules_from_rule_version(row)
+        version_code = row["version_code"]
+    else:
+        policy = load_policy(args.policy)
+        business_rules = policy["business_rules"]
+        version_code = args.version_code or f"policy-{policy.get('version', 'unknown')}"
+
+    engine = FreightQuoteEngine(order, distance_m, duration_s, business_rules)
+    out_path = Path(args.output_dir) / f"{version_code}.price.bin"
+    meta = write_price_table(out_path, engine, version_code, matrix_fingerprint(distance_m, duration_s))
+    cells = engine.n * engine.n * len(meta["urgencies"]) * FLAG_COMBINATIONS
+    print(f"[DONE] Tabela de precos {version_code} ({cells} precos) salva em: {out_path}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Motor de cotacao em lote sobre a matriz de bairros + politica de frete.
+
+Carrega a matriz (JSON ou RBMX) e `business_rules` da politica
+(`Docs/config/freight-fallback-policy.json`), pre-calcula a zona de cada par
+uma unica vez e precifica lotes de (origem, destino, urgencia, flags) com
+indexacao em arrays, sem recalcular zona/adicionais por cotacao.
+
+Regras espelham o quote.service do backend:
+  - zona = primeira faixa com min_km <= distancia_km <= max_km
+    (distancia entre faixas ou acima de max_distance e OUT_OF_COVERAGE);
+  - par sem rota local ou com distancia/duracao <= 0 nao e precificado
+    aqui (o backend segue para os providers externos);
+  - total = max(base_zona + urgencia + adicionais, minimo), em centavos.
+
+Uso:
+  python Docs/scripts/freight_quote.py --simulate
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Sequence
+
+from bairro_matrix_bin import NULL_U32, load_matrix_arrays
+from bairro_name_index import BairroNameIndex
+
+DEFAULT_MATRIX = "Docs/data/imperatriz_bairros_matriz.json"
+DEFAULT_POLICY = "Docs/config/freight-fallback-policy.json"
+
+FLAG_SUNDAY = 1
+FLAG_HOLIDAY = 2
+FLAG_RAIN = 4
+FLAG_PEAK = 8
+FLAG_KEYS = (
+    (FLAG_SUNDAY, "sunday"),
+    (FLAG_HOLIDAY, "holiday"),
+    (FLAG_RAIN, "rain"),
+    (FLAG_PEAK, "peak"),
+)
+FLAG_COMBINATIONS = 16
+
+# Valores de zone_index que nao sao zonas da politica.
+ZONE_NO_ROUTE = -1
+ZONE_OUT_OF_COVERAGE = 0
+NOT_PRICED = -1
+
+
+def to_cents(value: float) -> int:
+    return int(round(float(value) * 100))
+
+
+def flags_mask(
+    is_sunday: bool = False,
+    is_holiday: bool = False,
+    is_raining: bool = False,
+    is_peak: bool = False,
+) -> int:
+    return (
+        (FLAG_SUNDAY if is_sunday else 0)
+        | (FLAG_HOLIDAY if is_holiday else 0)
+        | (FLAG_RAIN if is_raining else 0)
+        | (FLAG_PEAK if is_peak else 0)
+    )
+
+
+def load_policy(path: Path | str) -> dict[str, Any]:
+    policy_path = Path(path)
+    if policy_path.suffix.lower() not in {".json"}:
+        raise ValueError("Use a versao JSON da politica (freight-fallback-policy.json).")
+    return json.loads(policy_path.read_text(encoding="utf-8"))
+
+
+class PricingRules:
+    """`business_rules` da politica convertidos para centavos e metros."""
+
+    def __init__(self, business_rules: dict[str, Any]) -> None:
+        zones = sorted(business_rules["distance_zones_brl"], key=lambda z: float(z["min_km"]))
+        formula = business_rules["pricing_formula"]
+        # Inteiros em metros: m/1000 >= min_km equivale a m >= min_km*1000.
+        self.zone_numbers = [int(z["zone"]) for z in zones]
+        self.zone_min_m = [int(round(float(z["min_km"]) * 1000)) for z in zones]
+        self.zone_max_m = [int(round(float(z["max_km"]) * 1000)) for z in zones]
+        self.zone_base_cents = {int(z["zone"]): to_cents(z["value"]) for z in zones}
+        self.max_distance_m = int(
+            round(float(formula.get("max_distance_policy", {}).get("when_distance_km_gt", 1e9)) * 1000)
+        )
+        self.minimum_cents = to_cents(formula.get("minimum_charge_brl", 0))
+        self.urgency_cents = {
+            urgency: to_cents(value) for urgency, value in business_rules["urgency_addon_brl"].items()
+        }
+        addons = business_rules["conditional_addons_brl"]
+        self.addon_cents_by_mask = [
+            sum(to_cents(addons.get(key, 0)) for flag, key in FLAG_KEYS if mask & flag)
+            for mask in range(FLAG_COMBINATIONS)
+        ]
+
+    def zone_for_distance(self, distance_m: int) -> int:
+        if distance_m > self.max_distance_m:
+            return ZONE_OUT_OF_COVERAGE
+        for zone, min_m, max_m in zip(self.zone_numbers, self.zone_min_m, self.zone_max_m):
+            if min_m <= distance_m <= max_m:
+                return zone
+        return ZONE_OUT_OF_COVERAGE
+
+
+class FreightQuoteEngine:
+    """Precificacao em lote sobre a matriz N x N de uma cidade."""
+
+    def __init__(
+        self,
+        order: list[str],
+        distance_m: array,
+        duration_s: array,
+        business_rules: dict[str, Any],
+    ) -> None:
+        self.order = order
+        self.n = len(order)
+        self.distance_m = distance_m
+        self.duration_s = duration_s
+        self.rules = PricingRules(business_rules)
+        self.zone_index = self._bin_zones()
+        # Preco base por zona em tabela indexada (zona 0 = fora de cobertura).
+        max_zone = max(self.rules.zone_numbers, default=0)
+        self.base_cents_by_zone = array("l", [NOT_PRICED] * (max_zone + 1))
+        for zone, cents in self.rules.zone_base_cents.items():
+            self.base_cents_by_zone[zone] = cents
+
+    @classmethod
+    def from_files(
+        cls,
+        matrix_path: Path | str = DEFAULT_MATRIX,
+        policy_path: Path | str = DEFAULT_POLICY,
+    ) -> FreightQuoteEngine:
+        order, distance_m, duration_s = load_matrix_arrays(matrix_path)
+        return cls(order, distance_m, duration_s, load_policy(policy_path)["business_rules"])
+
+    def _bin_zones(self) -> array:
+        # Muitas distancias se repetem entre pares; memoiza a zona por valor.
+        zone_of: dict[int, int] = {}
+        zone_index = array("b", bytes(len(self.distance_m)))
+        for cell, (distance, duration) in enumerate(zip(self.distance_m, self.duration_s)):
+            if distance == NULL_U32 or duration == NULL_U32 or distance <= 0 or duration <= 0:
+                zone_index[cell] = ZONE_NO_ROUTE
+                continue
+            zone = zone_of.get(distance)
+            if zone is None:
+                zone = zone_of[distance] = self.rules.zone_for_distance(distance)
+            zone_index[cell] = zone
+        return zone_index
+
+    def quote_batch(
+        self,
+        origins: Sequence[int],
+        destinations: Sequence[int],
+        urgencies: Sequence[str] | str = "padrao",
+        flags: Sequence[int] | int = 0,
+    ) -> dict[str, array]:
+        """Precifica um lote; retorna colunas alinhadas com a entrada.
+
+        `total_cents` = NOT_PRICED quando `zone` for ZONE_NO_ROUTE (resolver
+        por provider externo) ou ZONE_OUT_OF_COVERAGE (rejeitar cotacao).
+        """
+        size = len(origins)
+        if len(destinations) != size:
+            raise ValueError("origins e destinations precisam ter o mesmo tamanho.")
+        urgency_seq = [urgencies] * size if isinstance(urgencies, str) else urgencies
+        flag_seq = [flags] * size if isinstance(flags, int) else flags
+
+        n = self.n
+        cells = [o * n + d for o, d in zip(origins, destinations)]
+        zones = array("b", (self.zone_index[c] for c in cells))
+        # Urgencia sem regra soma 0, como no backend (quote.service.ts).
+        urgency_cents = self.rules.urgency_cents.get
+        addon_by_mask = self.rules.addon_cents_by_mask
+        base_by_zone = self.base_cents_by_zone
+        minimum = self.rules.minimum_cents
+        totals = array(
+            "l",
+            (
+                max(base_by_zone[z] + urgency_cents(u, 0) + addon_by_mask[m], minimum) if z > 0 else NOT_PRICED
+                for z, u, m in zip(zones, urgency_seq, flag_seq)
+            ),
+        )
+        return {
+            "zone": zones,
+            "distance_m": array("I", (self.distance_m[c] for c in cells)),
+            "duration_s": array("I", (self.duration_s[c] for c in cells)),
+            "total_cents": totals,
+        }
+
+    def price_all_pairs(self, urgency: str = "padrao", flags: int = 0) -> array:
+        """Preco (centavos) de todos os N*N pares para uma urgencia/flags."""
+        add = self.rules.urgency_cents.get(urgency, 0) + self.rules.addon_cents_by_mask[flags]
+        minimum = self.rules.minimum_cents
+        price_by_zone = [
+            NOT_PRICED if cents == NOT_PRICED else max(cents + add, minimum) for cents in self.base_cents_by_zone
+        ]
+        return array("l", (price_by_zone[z] if z > 0 else NOT_PRICED for z in self.zone_index))
+
+
+def summarize(engine: FreightQuoteEngine, urgency: str, flags: int) -> dict[str, Any]:
+    prices = engine.price_all_pairs(urgency, flags)
+    priced = [p for p in prices if p != NOT_PRICED]
+    zone_counts = Counter(engine.zone_index)
+    return {
+        "urgency": urgency,
+        "flags": flags,
+        "pairs": len(prices),
+        "priced_pairs": len(priced),
+        "no_route_pairs": zone_counts.get(ZONE_NO_ROUTE, 0),
+        "out_of_coverage_pairs": zone_counts.get(ZONE_OUT_OF_COVERAGE, 0),
+        "avg_brl": round(sum(priced) / len(priced) / 100, 2) if priced else None,
+        "min_brl": min(priced) / 100 if priced else None,
+        "max_brl": max(priced) / 100 if priced else None,
+        "zones": {str(z): c for z, c in sorted(zone_counts.items()) if z > 0},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cotacao de frete em lote sobre a matriz de bairros.")
+    parser.add_argument("--matrix", default=DEFAULT_MATRIX, help="Matriz JSON ou .bin (RBMX).")
+    parser.add_argument("--policy", default=DEFAULT_POLICY, help="Politica de frete (JSON).")
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Precifica todos os pares para cada urgencia e imprime o resumo em JSON.",
+    )
+    parser.add_argument("--origin", help="Bairro de origem (cotacao unica).")
+    parser.add_argument("--destination", help="Bairro de destino (cotacao unica).")
+    parser.add_argument("--urgency", default="padrao")
+    parser.add_argument("--flags", type=int, default=0, help="Bitmask: 1=domingo 2=feriado 4=chuva 8=pico.")
+    args = parser.parse_args()
+
+    engine = FreightQuoteEngine.from_files(args.matrix, args.policy)
+    if args.simulate:
+        report = [summarize(engine, urgency, args.flags) for urgency in engine.rules.urgency_cents]
+        print(json.dumps(report, ensure_ascii=False, indent=2), flush=True)
+        return
+
+    if not args.origin or not args.destination:
+        parser.error("Informe --origin e --destination, ou use --simulate.")
+    names = BairroNameIndex.from_order(engine.order)
+    origin = names.resolve(args.origin)
+    destination = names.resolve(args.destination)
+    for raw, idx in ((args.origin, origin), (args.destination, destination)):
+        if idx is None:
+            parser.error(f"Bairro fora da matriz: {raw}")
+    quote = engine.quote_batch(
+        [origin],
+        [destination],
+        args.urgency,
+        args.flags,
+    )
+    total = quote["total_cents"][0]
+    print(
+        json.dumps(
+            {
+                "zone": quote["zone"][0],
+                "distance_m": quote["distance_m"][0],
+                "duration_s": quote["duration_s"][0],
+                "total_brl": None if total == NOT_PRICED else total / 100,
+            },
+            ensure_ascii=False,
+        ),
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
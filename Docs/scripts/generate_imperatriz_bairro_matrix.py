@@ -3,9 +3,12 @@
 
 Entrada:
   - bairro.md (lista numerada de bairros)
+  - ou --manifest com varias cidades (arquivo de bairros, bounds e saida por
+    cidade), processadas com pools e rate limiters compartilhados
 
 Saida:
   - Docs/data/imperatriz_bairros_matriz.json
+  - no modo --manifest, a saida de cada cidade e um indice das cidades
 
 Dependencias:
   - Python 3 (somente stdlib)
@@ -16,27 +19,79 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import gzip
+import hashlib
+import http.client
+import io
 import json
+import math
 import os
 import re
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
 import time
 import unicodedata
+import urllib.error
 import urllib.parse
-import urllib.request
+import zlib
+from array import array
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
+
+from bairro_matrix_bin import NULL_U32, MatrixBinStreamWriter, convert_json, write_matrix_bin
+from bairro_matrix_neighbors import neighbor_sections, parse_neighbor_limit
+from bairro_matrix_pg_export import export_pg, open_matrix
+from bairro_matrix_sanity import DEFAULT_THRESHOLDS, check_cells, haversine_m, haversine_matrix, summarize_findings
+from bairro_matrix_time_buckets import DEFAULT_TIME_PROFILES, layer_sections, load_time_profiles, resolve_profiles_path
+from bairro_name_index import build_name_index, write_name_index
+from bairro_spatial_index import build_spatial_index, write_spatial_index
+from run_report import RunReport
 
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 OSRM_TABLE_URL = "https://router.project-osrm.org/table/v1/driving"
+RUACEP_BASE_URL = "https://www.ruacep.com.br/ma/imperatriz"
 USER_AGENT = "Roodi-BairroMatrix/1.0 (contato: local-script)"
+SANITY_NUDGE_M = 150.0
+
+DEFAULT_CITY = {
+    "name": "Imperatriz",
+    "state": "MA",
+    "state_name": "Maranhao",
+    "country": "BR",
+    "google_bounds": "-5.66,-47.64|-5.40,-47.30",
+}
+BR_STATE_NAMES = {
+    "AC": "Acre", "AL": "Alagoas", "AP": "Amapa", "AM": "Amazonas", "BA": "Bahia",
+    "CE": "Ceara", "DF": "Distrito Federal", "ES": "Espirito Santo", "GO": "Goias",
+    "MA": "Maranhao", "MT": "Mato Grosso", "MS": "Mato Grosso do Sul", "MG": "Minas Gerais",
+    "PA": "Para", "PB": "Paraiba", "PR": "Parana", "PE": "Pernambuco", "PI": "Piaui",
+    "RJ": "Rio de Janeiro", "RN": "Rio Grande do Norte", "RS": "Rio Grande do Sul",
+    "RO": "Rondonia", "RR": "Roraima", "SC": "Santa Catarina", "SP": "Sao Paulo",
+    "SE": "Sergipe", "TO": "Tocantins",
+}
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Gera matriz OD de bairros (Imperatriz-MA) em JSON.",
     )
+    parser.add_argument(
+        "--manifest",
+        default="",
+        help=(
+            "JSON com varias cidades ({\"cities\": [...], \"index_output\": ...}); cada cidade "
+            "traz name, state, bairros_file, output e opcionalmente google_bounds, "
+            "ruacep_base_url, city_query, pg_export_dir, pg_previous. Substitui --input/--output."
+        ),
+    )
     parser.add_argument(
         "--input",
         default="bairro.md",
@@ -47,16 +102,83 @@ def parse_args() -> argparse.Namespace:
         default="Docs/data/imperatriz_bairros_matriz.json",
         help="Arquivo JSON de saida.",
     )
+    parser.add_argument(
+        "--binary-output",
+        default="",
+        help=(
+            "Arquivo binario compacto (RBMX, memory-mappable) escrito junto do "
+            "JSON (default: --output com extensao .bin)."
+        ),
+    )
+    parser.add_argument(
+        "--name-index-output",
+        default="",
+        help=(
+            "Indice de resolucao de nomes de bairro para a matriz "
+            "(default: --output com extensao .names.json)."
+        ),
+    )
     parser.add_argument(
         "--cache",
+        default="Docs/data/imperatriz_bairros_geocode_cache.sqlite3",
+        help="Cache SQLite de geocoding, gravado a cada resultado (crash-safe).",
+    )
+    parser.add_argument(
+        "--cache-seed",
         default="Docs/data/imperatriz_bairros_geocode_cache.json",
-        help="Cache JSON de geocoding para acelerar reexecucoes.",
+        help="Cache JSON legado importado quando o cache SQLite esta vazio.",
+    )
+    parser.add_argument(
+        "--export-json-cache",
+        action="store_true",
+        help="Regrava --cache-seed a partir do cache SQLite ao fim do geocoding.",
+    )
+    parser.add_argument(
+        "--not-found-ttl-days",
+        type=float,
+        default=30.0,
+        help="Validade de entradas not_found no cache (default: 30; 0 = sem expirar).",
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=0.0,
+        help="Remove do cache entradas mais antigas que N dias antes de rodar (default: 0 = manter).",
+    )
+    parser.add_argument(
+        "--refresh-not-found",
+        action="store_true",
+        help="Remove todas as entradas not_found do cache antes de rodar.",
     )
     parser.add_argument(
         "--geocode-delay",
         type=float,
         default=1.0,
-        help="Delay em segundos entre chamadas de geocoding (default: 1.0).",
+        help=(
+            "Intervalo minimo em segundos entre chamadas ao Nominatim "
+            "(default: 1.0, politica de uso de 1 req/s)."
+        ),
+    )
+    parser.add_argument(
+        "--google-qps",
+        type=float,
+        default=10.0,
+        help="Limite de requisicoes por segundo ao Google Geocoding (default: 10).",
+    )
+    parser.add_argument(
+        "--geocode-workers",
+        type=int,
+        default=8,
+        help="Bairros geocodificados em paralelo (default: 8; 1 = sequencial).",
+    )
+    parser.add_argument(
+        "--geocode-query-workers",
+        type=int,
+        default=4,
+        help=(
+            "Variantes de consulta de um bairro enviadas ao mesmo tempo, sob o rate limiter "
+            "do provider (default: 4; 1 = uma por vez)."
+        ),
     )
     parser.add_argument(
         "--block-size",
@@ -64,6 +186,49 @@ def parse_args() -> argparse.Namespace:
         default=45,
         help="Tamanho do bloco para chamadas da matriz OSRM (default: 45).",
     )
+    parser.add_argument(
+        "--osrm-workers",
+        type=int,
+        default=4,
+        help="Limite global de blocos OSRM em paralelo (default: 4).",
+    )
+    parser.add_argument(
+        "--osrm-qps",
+        type=float,
+        default=0.0,
+        help="Limite de requisicoes por segundo ao OSRM (default: 0 = sem limite).",
+    )
+    parser.add_argument(
+        "--osrm-symmetric",
+        choices=["off", "skip", "check"],
+        default="off",
+        help=(
+            "Reuso do bloco (A,B) para (B,A): off busca todos, skip transpoe "
+            "sem consultar, check confere uma amostra antes de transpor (default: off)."
+        ),
+    )
+    parser.add_argument(
+        "--osrm-symmetric-tolerance",
+        type=float,
+        default=0.1,
+        help="Divergencia relativa aceita no modo check (default: 0.1).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Grava a matriz em disco por faixa de origens conforme os blocos OSRM "
+            "concluem (memoria O(block_size*N)); metrics vai ao fim do JSON."
+        ),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Reaproveita a matriz de --output e consulta no OSRM apenas "
+            "bairros novos ou com coordenadas alteradas."
+        ),
+    )
     parser.add_argument(
         "--provider",
         choices=["google", "nominatim"],
@@ -86,15 +251,217 @@ def parse_args() -> argparse.Namespace:
         default=7,
         help="Quantidade de paginas de bairros para indexar no RuaCEP (default: 7).",
     )
+    parser.add_argument(
+        "--ruacep-workers",
+        type=int,
+        default=4,
+        help="Paginas do RuaCEP baixadas em paralelo (default: 4).",
+    )
+    parser.add_argument(
+        "--ruacep-qps",
+        type=float,
+        default=2.0,
+        help="Limite de requisicoes por segundo ao RuaCEP (default: 2).",
+    )
+    parser.add_argument(
+        "--ruacep-max-age-days",
+        type=float,
+        default=7.0,
+        help=(
+            "Idade maxima das paginas RuaCEP em cache antes de revalidar com "
+            "ETag/Last-Modified (default: 7)."
+        ),
+    )
+    parser.add_argument(
+        "--points-per-bairro",
+        type=int,
+        default=0,
+        help=(
+            "Geocodifica ate N logradouros do RuaCEP por bairro e usa a mediana das rotas "
+            "entre os pontos de cada par (so provider google; ignorado em --stream; default: 0 = desligado)."
+        ),
+    )
+    parser.add_argument(
+        "--points-max-distance-m",
+        type=float,
+        default=4000.0,
+        help="Distancia maxima de um ponto de logradouro ao centroide do bairro (default: 4000).",
+    )
+    parser.add_argument(
+        "--osrm-url",
+        default=OSRM_TABLE_URL,
+        help="Endpoint OSRM table (ex.: local_routing_server.py para rodar offline).",
+    )
+    parser.add_argument("--nominatim-url", default=NOMINATIM_URL, help="Endpoint de busca do Nominatim.")
+    parser.add_argument("--google-geocode-url", default=GOOGLE_GEOCODE_URL, help="Endpoint do Google Geocoding.")
+    parser.add_argument("--ruacep-base-url", default=RUACEP_BASE_URL, help="Base das paginas do RuaCEP.")
+    parser.add_argument(
+        "--http-mode",
+        choices=["live", "record", "replay"],
+        default="live",
+        help=(
+            "live consulta os providers; record grava as respostas em --http-fixtures; "
+            "replay responde so das fixtures, sem rede (default: live)."
+        ),
+    )
+    parser.add_argument(
+        "--http-fixtures",
+        default="Docs/data/http_fixtures",
+        help="Diretorio de fixtures HTTP para record/replay.",
+    )
+    parser.add_argument(
+        "--sanity-check",
+        action="store_true",
+        help=(
+            "Valida as celulas contra limites haversine (ratio, assimetria, "
+            "desigualdade triangular) e reconsulta as sinalizadas com os pontos deslocados "
+            "(opcional: a reconsulta pode trocar celulas da matriz; ignorado em --stream)."
+        ),
+    )
+    parser.add_argument(
+        "--sanity-action",
+        choices=["flag", "drop"],
+        default="flag",
+        help="flag so registra em metrics; drop anula celulas que seguem sinalizadas apos a reconsulta.",
+    )
+    for key in ("max_ratio", "min_ratio", "asymmetry", "triangle", "triangle_neighbors"):
+        parser.add_argument(
+            f"--sanity-{key.replace('_', '-')}",
+            type=type(DEFAULT_THRESHOLDS[key]),
+            default=DEFAULT_THRESHOLDS[key],
+            help=f"Limite {key} do sanity check (default: {DEFAULT_THRESHOLDS[key]}).",
+        )
+    parser.add_argument(
+        "--pg-export-dir",
+        default="",
+        help=(
+            "Gera CSV/COPY + load.sql para locality_bairro_matrix neste diretorio, "
+            "so com as celulas alteradas desde a matriz anterior. Com --manifest, cada cidade "
+            "sem a chave pg_export_dir usa <dir>/<slug da cidade>."
+        ),
+    )
+    parser.add_argument(
+        "--pg-export-format",
+        choices=["csv", "binary"],
+        default="csv",
+        help="Formato do COPY da matriz no export PG (default: csv).",
+    )
+    parser.add_argument(
+        "--pg-previous",
+        default="",
+        help=(
+            "Matriz anterior para o diff do export PG (default: a saida atual antes de sobrescrever). "
+            "Com --manifest so vale para uma cidade; as demais usam a chave pg_previous."
+        ),
+    )
+    parser.add_argument(
+        "--time-profiles",
+        default=DEFAULT_TIME_PROFILES,
+        help=(
+            "Perfis de faixa horaria para as camadas de duracao (pico/fora de pico/madrugada) "
+            f"gravadas no .bin; 'off' desliga; ignorado em --stream (default: {DEFAULT_TIME_PROFILES})."
+        ),
+    )
+    parser.add_argument(
+        "--neighbors",
+        default="all",
+        help=(
+            "Listas de vizinhos por origem (ordenadas por duracao e por distancia) gravadas no .bin "
+            "para consultas de k mais proximos/raio: 'all', K por origem ou 'off'; ignorado em --stream "
+            "(default: all)."
+        ),
+    )
+    parser.add_argument(
+        "--osrm-journal",
+        default="",
+        help=(
+            "Journal (JSON lines) com cada bloco OSRM concluido, gravado assim que o bloco chega. "
+            "Default: <output>.osrm-journal.jsonl; 'off' desliga. Removido quando a cidade termina."
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Retoma do --osrm-journal de uma execucao interrompida: blocos ja gravados nao sao "
+            "consultados de novo; so os que faltam ou falharam vao ao OSRM."
+        ),
+    )
+    parser.add_argument(
+        "--run-report",
+        default="",
+        help=(
+            "Relatorio de execucao em JSON lines (spans por etapa, contadores e latencias por provider). "
+            "Default: <output>.run.jsonl (ou <index_output>.run.jsonl com --manifest); 'off' desliga."
+        ),
+    )
     return parser.parse_args()
 
 
+# Padroes usados no caminho quente (parse de paginas, normalizacao, scoring).
+WHITESPACE_RE = re.compile(r"\s+")
+BAIRRO_LINE_RE = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$")
+SLUG_SEPARATOR_RE = re.compile(r"[^a-z0-9]+")
+RUACEP_STREET_RE = re.compile(r'card-header[^>]*>\s*<a [^>]*><strong>([^<]+)</strong>', re.IGNORECASE)
+RUACEP_CEP_RE = re.compile(r"CEP:\s*(\d{5}-\d{3})")
+NORMALIZE_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_text(value: str) -> str:
+    # Memoizado: nomes de bairro, enderecos e componentes se repetem entre
+    # variantes de consulta e candidatos.
     text = value.strip()
     text = unicodedata.normalize("NFKD", text)
     text = "".join(ch for ch in text if not unicodedata.combining(ch))
     text = text.replace("ü", "u").replace("Ü", "U")
-    return re.sub(r"\s+", " ", text).strip()
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_key(value: str) -> str:
+    """`normalize_text` em minusculas: chave de comparacao de nomes/enderecos."""
+    return normalize_text(value).lower()
+
+
+class TokenBucket:
+    """Rate limiter token bucket compartilhado entre threads."""
+
+    def __init__(self, rate: float, capacity: float | None = None, name: str = "") -> None:
+        self.rate = rate
+        self.name = name
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        waited_s = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+            waited_s += wait_s
+        if waited_s and self.name:
+            REPORT.count(self.name, "throttled")
+            REPORT.count(self.name, "throttle_s", waited_s)
+
+
+def build_rate_limiters(geocode_delay: float, google_qps: float) -> dict[str, TokenBucket]:
+    nominatim_rate = 1.0 / geocode_delay if geocode_delay > 0 else 0.0
+    return {
+        "google": TokenBucket(google_qps, name="google"),
+        # Nominatim exige no maximo 1 req/s: sem rajada inicial.
+        "nominatim": TokenBucket(nominatim_rate, capacity=1.0, name="nominatim"),
+    }
 
 
 def parse_bairros(md_path: Path) -> list[dict[str, Any]]:
@@ -102,10 +469,8 @@ def parse_bairros(md_path: Path) -> list[dict[str, Any]]:
         raise FileNotFoundError(f"Arquivo nao encontrado: {md_path}")
 
     bairros: list[dict[str, Any]] = []
-    pattern = re.compile(r"^\s*(\d+)\.\s+(.+?)\s*$")
-
     for line in md_path.read_text(encoding="utf-8").splitlines():
-        match = pattern.match(line)
+        match = BAIRRO_LINE_RE.match(line)
         if not match:
             continue
         idx = int(match.group(1))
@@ -119,34 +484,281 @@ def parse_bairros(md_path: Path) -> list[dict[str, Any]]:
     return bairros
 
 
+class PooledHttpClient:
+    """Cliente HTTP com conexoes keep-alive reaproveitadas por host.
+
+    Aceita gzip/deflate, segue redirects e acumula contadores por host
+    (requisicoes, reuso de conexao, bytes e tempo).
+    """
+
+    REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+    STALE_CONNECTION_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        ConnectionResetError,
+        BrokenPipeError,
+    )
+
+    def __init__(self, max_idle_per_host: int = 16) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: dict[tuple[str, str], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.stats: dict[str, Counter[str]] = {}
+
+    def _acquire(self, key: tuple[str, str], timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, netloc = key
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return conn_cls(netloc, timeout=timeout), False
+
+    def _release(self, key: tuple[str, str], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _record(self, host: str, **counters: float) -> None:
+        with self._lock:
+            stats = self.stats.setdefault(host, Counter())
+            for name, value in counters.items():
+                stats[name] += value
+
+    def _send(
+        self,
+        key: tuple[str, str],
+        path: str,
+        headers: dict[str, str],
+        timeout: float,
+    ) -> tuple[int, str, http.client.HTTPMessage, bytes]:
+        for attempt in range(2):
+            conn, reused = self._acquire(key, timeout)
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except self.STALE_CONNECTION_ERRORS:
+                conn.close()
+                # Conexao ociosa fechada pelo servidor: tenta uma nova.
+                if reused and attempt == 0:
+                    continue
+                self._record(key[1], errors=1)
+                raise
+            except Exception:
+                conn.close()
+                self._record(key[1], errors=1)
+                raise
+
+            elapsed = time.perf_counter() - started
+            REPORT.observe(key[1], elapsed * 1000)
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            self._record(
+                key[1],
+                requests=1,
+                reused=int(reused),
+                connections=int(not reused),
+                bytes_wire=len(raw),
+                seconds=elapsed,
+            )
+            return resp.status, resp.reason, resp.msg, raw
+        raise RuntimeError("unreachable")
+
+    @staticmethod
+    def _decode(raw: bytes, encoding: str | None) -> bytes:
+        encoding = (encoding or "").strip().lower()
+        if encoding == "gzip":
+            return gzip.decompress(raw)
+        if encoding == "deflate":
+            try:
+                return zlib.decompress(raw)
+            except zlib.error:
+                return zlib.decompress(raw, -zlib.MAX_WBITS)
+        return raw
+
+    def get(
+        self,
+        url: str,
+        headers: dict[str, str],
+        timeout: float = 60,
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        request_headers = {"Accept-Encoding": "gzip, deflate", **headers}
+        for _ in range(5):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path = f"{path}?{parts.query}"
+            key = (parts.scheme, parts.netloc)
+            status, reason, msg, raw = self._send(key, path, request_headers, timeout)
+            location = msg.get("Location")
+            if status in self.REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            body = self._decode(raw, msg.get("Content-Encoding"))
+            self._record(parts.netloc, bytes_body=len(body))
+            if status >= 400:
+                raise urllib.error.HTTPError(url, status, reason, msg, io.BytesIO(body))
+            return status, msg, body
+        raise RuntimeError(f"Redirects demais: {url}")
+
+    def log_stats(self) -> None:
+        for host, stats in sorted(self.stats.items()):
+            requests = int(stats["requests"])
+            avg_ms = (stats["seconds"] / requests * 1000) if requests else 0.0
+            print(
+                f"[HTTP] {host}: {requests} req, {int(stats['reused'])} reuso, "
+                f"{int(stats['connections'])} conexoes, {int(stats['errors'])} erros, "
+                f"{int(stats['bytes_wire'])}B rede/{int(stats['bytes_body'])}B corpo, "
+                f"{avg_ms:.0f}ms medio",
+                flush=True,
+            )
+
+
+class FixtureHttpClient:
+    """Transporte record/replay sobre o PooledHttpClient.
+
+    `record` grava cada resposta em `fixtures_dir` (um JSON por URL, chave
+    sem parametros de credencial); `replay` serve somente das fixtures, sem
+    rede, e falha em URL nao gravada.
+    """
+
+    SECRET_PARAMS = {"key", "apikey", "appid", "api_key"}
+    KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+    def __init__(self, inner: PooledHttpClient, fixtures_dir: Path, mode: str) -> None:
+        self.inner = inner
+        self.fixtures_dir = fixtures_dir
+        self.mode = mode
+        self.stats = inner.stats
+        self._lock = threading.Lock()
+        fixtures_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def redact(cls, url: str) -> str:
+        parts = urllib.parse.urlsplit(url)
+        params = [
+            (k, v)
+            for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+            if k.lower() not in cls.SECRET_PARAMS
+        ]
+        return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(params)))
+
+    def fixture_path(self, url: str) -> Path:
+        digest = hashlib.sha256(self.redact(url).encode("utf-8")).hexdigest()
+        return self.fixtures_dir / f"{digest[:2]}" / f"{digest}.json"
+
+    def get(
+        self,
+        url: str,
+        headers: dict[str, str],
+        timeout: float = 60,
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        path = self.fixture_path(url)
+        host = urllib.parse.urlsplit(url).netloc
+        if self.mode == "replay":
+            if not path.exists():
+                raise RuntimeError(f"Sem fixture para {self.redact(url)}")
+            fixture = json.loads(path.read_text(encoding="utf-8"))
+            msg = http.client.HTTPMessage()
+            for name, value in fixture.get("headers", {}).items():
+                msg[name] = value
+            body = fixture["body"].encode("utf-8")
+            self.inner._record(host, requests=1, replayed=1, bytes_body=len(body))
+            return int(fixture["status"]), msg, body
+
+        status, msg, body = self.inner.get(url, headers=headers, timeout=timeout)
+        fixture = {
+            "url": self.redact(url),
+            "status": status,
+            "headers": {name: msg[name] for name in self.KEPT_HEADERS if msg.get(name)},
+            "body": body.decode("utf-8", errors="replace"),
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(json.dumps(fixture, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+        return status, msg, body
+
+    def log_stats(self) -> None:
+        self.inner.log_stats()
+
+
+HTTP_CLIENT: PooledHttpClient | FixtureHttpClient = PooledHttpClient()
+# Sem --run-report o relatorio so agrega em memoria.
+REPORT = RunReport()
+
+
+def configure_http(args: argparse.Namespace) -> None:
+    global HTTP_CLIENT, NOMINATIM_URL, GOOGLE_GEOCODE_URL, OSRM_TABLE_URL
+    NOMINATIM_URL = args.nominatim_url
+    GOOGLE_GEOCODE_URL = args.google_geocode_url
+    OSRM_TABLE_URL = args.osrm_url
+    if args.http_mode != "live":
+        base = HTTP_CLIENT.inner if isinstance(HTTP_CLIENT, FixtureHttpClient) else HTTP_CLIENT
+        HTTP_CLIENT = FixtureHttpClient(base, Path(args.http_fixtures), args.http_mode)
+
+
 def http_get_json(url: str, params: dict[str, Any], timeout: int = 60) -> Any:
     qs = urllib.parse.urlencode(params, doseq=True)
-    req = urllib.request.Request(
+    _status, _headers, body = HTTP_CLIENT.get(
         f"{url}?{qs}",
         headers={
             "User-Agent": USER_AGENT,
             "Accept": "application/json",
             "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
         },
+        timeout=timeout,
     )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    return json.loads(body.decode("utf-8"))
 
 
 def http_get_text(url: str, timeout: int = 60) -> str:
-    req = urllib.request.Request(
+    _status, _headers, body = HTTP_CLIENT.get(
         url,
         headers={
             "User-Agent": USER_AGENT,
             "Accept": "text/html,application/xhtml+xml",
             "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
         },
+        timeout=timeout,
+    )
+    return body.decode("utf-8", errors="ignore")
+
+
+def city_slug(value: str) -> str:
+    return SLUG_SEPARATOR_RE.sub("-", normalize_key(value)).strip("-")
+
+
+def city_profile(entry: dict[str, Any]) -> dict[str, Any]:
+    """Completa a configuracao de uma cidade com os defaults derivados do nome/UF."""
+    city = {**entry}
+    city.setdefault("country", "BR")
+    city.setdefault("state_name", BR_STATE_NAMES.get(city["state"].upper(), city["state"]))
+    city.setdefault("google_bounds", None)
+    city.setdefault("city_query", f"{city['name']}, {city['state']}, Brasil")
+    city.setdefault(
+        "ruacep_base_url",
+        f"https://www.ruacep.com.br/{city['state'].lower()}/{city_slug(city['name'])}",
     )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", errors="ignore")
+    city["ruacep_base_url"] = city["ruacep_base_url"].rstrip("/")
+    # Imperatriz mantem as chaves antigas do cache; outras cidades usam prefixo.
+    city.setdefault("cache_prefix", "" if city_slug(city["name"]) == "imperatriz" else f"{city_slug(city['name'])}|")
+    return city
 
 
-def build_queries(name: str) -> list[str]:
+def build_queries(name: str, city: dict[str, Any] = DEFAULT_CITY) -> list[str]:
     raw = name.strip()
     alt = normalize_text(raw)
     variants = [raw]
@@ -156,13 +768,13 @@ def build_queries(name: str) -> list[str]:
     queries: list[str] = []
     seen: set[str] = set()
     templates = [
-        "{name}, Imperatriz, MA, Brasil",
-        "Bairro {name}, Imperatriz, MA, Brasil",
-        "{name}, Imperatriz, Maranhao, Brasil",
+        "{name}, {city}, {state}, Brasil",
+        "Bairro {name}, {city}, {state}, Brasil",
+        "{name}, {city}, {state_name}, Brasil",
     ]
     for var in variants:
         for template in templates:
-            query = template.format(name=var)
+            query = template.format(name=var, city=city["name"], state=city["state"], state_name=city["state_name"])
             key = query.lower()
             if key in seen:
                 continue
@@ -171,46 +783,57 @@ def build_queries(name: str) -> list[str]:
     return queries
 
 
-def parse_ruacep_index(pages: int) -> dict[str, dict[str, str]]:
-    index: dict[str, dict[str, str]] = {}
-    pattern = re.compile(
-        r'https://www\.ruacep\.com\.br/ma/imperatriz/([^"/]+)/logradouros/"[^>]*><strong>([^<]+)</strong>',
+def ruacep_index_page_url(page: int, base_url: str = RUACEP_BASE_URL) -> str:
+    if page == 1:
+        return f"{base_url}/bairros/"
+    return f"{base_url}/bairros/{page}/"
+
+
+@lru_cache(maxsize=64)
+def ruacep_index_pattern(base_url: str) -> re.Pattern[str]:
+    # Os links da pagina sao absolutos para ruacep.com.br; so o caminho da cidade importa.
+    city_path = re.escape(urllib.parse.urlsplit(base_url).path.rstrip("/"))
+    return re.compile(
+        r'https://www\.ruacep\.com\.br' + city_path + r'/([^"/]+)/logradouros/"[^>]*><strong>([^<]+)</strong>',
         re.IGNORECASE,
     )
 
-    for page in range(1, pages + 1):
-        if page == 1:
-            url = "https://www.ruacep.com.br/ma/imperatriz/bairros/"
-        else:
-            url = f"https://www.ruacep.com.br/ma/imperatriz/bairros/{page}/"
 
-        try:
-            html = http_get_text(url, timeout=45)
-        except Exception:
-            continue
+def parse_ruacep_index_html(html: str, base_url: str = RUACEP_BASE_URL) -> list[list[str]]:
+    return [[slug, bairro_name] for slug, bairro_name in ruacep_index_pattern(base_url).findall(html)]
+
 
-        for slug, bairro_name in pattern.findall(html):
-            key = normalize_text(bairro_name).lower()
+def merge_ruacep_index(
+    pages_rows: list[list[list[str]]],
+    base_url: str = RUACEP_BASE_URL,
+) -> dict[str, dict[str, str]]:
+    index: dict[str, dict[str, str]] = {}
+    for rows in pages_rows:
+        for slug, bairro_name in rows:
+            key = normalize_key(bairro_name)
             if key not in index:
                 index[key] = {
                     "slug": slug,
-                    "url": f"https://www.ruacep.com.br/ma/imperatriz/{slug}/logradouros/",
+                    "url": f"{base_url}/{slug}/logradouros/",
                     "bairro_name": bairro_name,
                 }
     return index
 
 
-def parse_ruacep_context(logradouros_url: str) -> dict[str, Any]:
-    html = http_get_text(logradouros_url, timeout=45)
+def parse_ruacep_index(pages: int, base_url: str = RUACEP_BASE_URL) -> dict[str, dict[str, str]]:
+    pages_rows: list[list[list[str]]] = []
+    for page in range(1, pages + 1):
+        try:
+            html = http_get_text(ruacep_index_page_url(page, base_url), timeout=45)
+        except Exception:
+            continue
+        pages_rows.append(parse_ruacep_index_html(html, base_url))
+    return merge_ruacep_index(pages_rows, base_url)
 
-    street_pat = re.compile(
-        r'card-header[^>]*>\s*<a [^>]*><strong>([^<]+)</strong>',
-        re.IGNORECASE,
-    )
-    cep_pat = re.compile(r"CEP:\s*(\d{5}-\d{3})")
 
-    streets = [normalize_text(s) for s in street_pat.findall(html)]
-    ceps = cep_pat.findall(html)
+def parse_ruacep_context_html(html: str) -> dict[str, Any]:
+    streets = [normalize_text(s) for s in RUACEP_STREET_RE.findall(html)]
+    ceps = RUACEP_CEP_RE.findall(html)
 
     first_street = streets[0] if streets else None
     first_cep = ceps[0] if ceps else None
@@ -220,9 +843,16 @@ def parse_ruacep_context(logradouros_url: str) -> dict[str, Any]:
         "first_cep": first_cep,
         "street_count": len(streets),
         "cep_count": len(ceps),
+        # Listas completas (sem repeticao) para os pontos por bairro e o indice de CEP.
+        "streets": list(dict.fromkeys(streets)),
+        "ceps": list(dict.fromkeys(ceps)),
     }
 
 
+def parse_ruacep_context(logradouros_url: str) -> dict[str, Any]:
+    return parse_ruacep_context_html(http_get_text(logradouros_url, timeout=45))
+
+
 def format_street_for_query(raw: str | None) -> str | None:
     if not raw:
         return None
@@ -236,16 +866,17 @@ def format_street_for_query(raw: str | None) -> str | None:
 
 def build_queries_with_ruacep(
     bairro_name: str,
-    city_query: str,
+    city: dict[str, Any],
     ruacep_context: dict[str, Any] | None,
 ) -> list[str]:
+    city_query = city["city_query"]
     seen: set[str] = set()
     queries: list[str] = []
 
     def add(query: str | None) -> None:
         if not query:
             return
-        q = re.sub(r"\s+", " ", query).strip()
+        q = WHITESPACE_RE.sub(" ", query).strip()
         if not q:
             return
         k = q.lower()
@@ -269,89 +900,378 @@ def build_queries_with_ruacep(
         add(f"{cep}, {bairro_name}, {city_query}")
         add(f"{cep}, {city_query}")
 
-    for base in build_queries(bairro_name):
+    for base in build_queries(bairro_name, city):
         add(base)
 
     return queries
 
 
-def score_nominatim_result(target_name: str, result: dict[str, Any]) -> int:
-    display = normalize_text(result.get("display_name", "")).lower()
-    target = normalize_text(target_name).lower()
+NOMINATIM_AREA_TYPES = {"suburb", "neighbourhood", "quarter", "residential", "hamlet"}
+GOOGLE_AREA_TYPES = {"neighborhood", "sublocality", "sublocality_level_1"}
+GOOGLE_AREA_COMPONENT_TYPES = {"neighborhood", "political", "sublocality", "sublocality_level_1"}
+GOOGLE_LOCATION_TYPE_BONUS = {"ROOFTOP": 8, "RANGE_INTERPOLATED": 5, "GEOMETRIC_CENTER": 3}
+
+
+def city_match_keys(city: dict[str, Any]) -> tuple[str, str]:
+    return normalize_key(city["name"]), normalize_key(city["state_name"])
+
+
+def nominatim_candidate_record(result: dict[str, Any]) -> dict[str, Any]:
+    """Campos de um resultado Nominatim ja normalizados para o scoring."""
     address = result.get("address", {}) if isinstance(result.get("address"), dict) else {}
+    return {
+        "display": normalize_key(result.get("display_name", "")),
+        "address_city": normalize_key(str(address.get("city", "")) + " " + str(address.get("town", ""))),
+        "kind_bonus": (10 if result.get("type") in NOMINATIM_AREA_TYPES else 0)
+        + (5 if result.get("class") == "place" else 0),
+    }
+
 
-    score = 0
-    if "imperatriz" in display:
+def score_nominatim_record(target: str, record: dict[str, Any], city_keys: tuple[str, str]) -> int:
+    city_key, state_key = city_keys
+    display = record["display"]
+    score = record["kind_bonus"]
+    if city_key in display:
         score += 50
-    if "maranhao" in display or "maranhão" in display:
+    if state_key in display:
         score += 20
-    if "imperatriz" in str(address.get("city", "")).lower() or "imperatriz" in str(address.get("town", "")).lower():
+    if city_key in record["address_city"]:
         score += 20
     if target in display:
         score += 20
-    if result.get("type") in {"suburb", "neighbourhood", "quarter", "residential", "hamlet"}:
-        score += 10
-    if result.get("class") == "place":
-        score += 5
     return score
 
 
-def score_google_result(target_name: str, result: dict[str, Any]) -> int:
-    formatted = normalize_text(result.get("formatted_address", "")).lower()
-    target = normalize_text(target_name).lower()
+def score_nominatim_result(target_name: str, result: dict[str, Any], city: dict[str, Any] = DEFAULT_CITY) -> int:
+    return score_nominatim_record(normalize_key(target_name), nominatim_candidate_record(result), city_match_keys(city))
+
+
+def google_candidate_record(result: dict[str, Any]) -> dict[str, Any]:
+    """Campos de um resultado Google ja normalizados para o scoring."""
     types = result.get("types") if isinstance(result.get("types"), list) else []
     components = result.get("address_components") if isinstance(result.get("address_components"), list) else []
+    locality_names: list[str] = []
+    state_names: list[str] = []
+    area_names: list[str] = []
+    for comp in components:
+        if not isinstance(comp, dict):
+            continue
+        comp_name = normalize_key(comp.get("long_name", ""))
+        comp_types = comp.get("types") if isinstance(comp.get("types"), list) else []
+        if "locality" in comp_types:
+            locality_names.append(comp_name)
+        if "administrative_area_level_1" in comp_types:
+            state_names.append(comp_name)
+        if any(t in GOOGLE_AREA_COMPONENT_TYPES for t in comp_types):
+            area_names.append(comp_name)
+    geometry = result.get("geometry") if isinstance(result.get("geometry"), dict) else {}
+    return {
+        "formatted": normalize_key(result.get("formatted_address", "")),
+        "area_bonus": 10 if any(t in GOOGLE_AREA_TYPES for t in types) else 0,
+        "locality_names": locality_names,
+        "state_names": state_names,
+        "area_names": area_names,
+        "location_bonus": GOOGLE_LOCATION_TYPE_BONUS.get(geometry.get("location_type"), 0),
+    }
+
 
-    score = 0
-    if "imperatriz" in formatted:
+def score_google_record(target: str, record: dict[str, Any], city_keys: tuple[str, str]) -> int:
+    city_key, state_key = city_keys
+    formatted = record["formatted"]
+    score = record["area_bonus"] + record["location_bonus"]
+    if city_key in formatted:
         score += 60
-    if "maranhao" in formatted or "maranhão" in formatted:
+    if state_key in formatted:
         score += 15
     if target and target in formatted:
         score += 25
-    if any(t in {"neighborhood", "sublocality", "sublocality_level_1"} for t in types):
-        score += 10
+    score += 25 * sum(1 for name in record["locality_names"] if city_key in name)
+    score += 10 * sum(1 for name in record["state_names"] if state_key in name)
+    if target:
+        score += 30 * record["area_names"].count(target)
+    return score
 
-    for comp in components:
-        if not isinstance(comp, dict):
-            continue
-        comp_name = normalize_text(comp.get("long_name", "")).lower()
-        comp_types = comp.get("types") if isinstance(comp.get("types"), list) else []
-        if "locality" in comp_types and "imperatriz" in comp_name:
-            score += 25
-        if "administrative_area_level_1" in comp_types and "maranhao" in comp_name:
-            score += 10
-        if target and target == comp_name and any(
-            t in {"neighborhood", "political", "sublocality", "sublocality_level_1"}
-            for t in comp_types
-        ):
-            score += 30
 
-    geometry = result.get("geometry") if isinstance(result.get("geometry"), dict) else {}
-    location_type = geometry.get("location_type")
-    if location_type == "ROOFTOP":
-        score += 8
-    elif location_type == "RANGE_INTERPOLATED":
-        score += 5
-    elif location_type == "GEOMETRIC_CENTER":
-        score += 3
+def score_google_result(target_name: str, result: dict[str, Any], city: dict[str, Any] = DEFAULT_CITY) -> int:
+    return score_google_record(normalize_key(target_name), google_candidate_record(result), city_match_keys(city))
+
+
+class GeocodeCache:
+    """Cache de geocoding em SQLite (WAL), gravado a cada resultado.
+
+    Chaves separadas por provider (google, nominatim, ...). Entradas
+    `not_found` expiram apos `not_found_ttl_s` para serem reconsultadas.
+    """
+
+    def __init__(self, path: Path, not_found_ttl_s: float = 0) -> None:
+        self.path = path
+        self.not_found_ttl_s = not_found_ttl_s
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                provider TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (provider, name)
+            ) WITHOUT ROWID
+            """,
+        )
 
-    return score
+    def get(self, provider: str, name: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, payload, updated_at FROM geocode_cache WHERE provider = ? AND name = ?",
+                (provider, name),
+            ).fetchone()
+        if row is None:
+            return None
+        status, payload, updated_at = row
+        if status == "not_found" and self.not_found_ttl_s > 0 and time.time() - updated_at > self.not_found_ttl_s:
+            return None
+        return json.loads(payload)
+
+    def put(self, provider: str, name: str, value: dict[str, Any], updated_at: float | None = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode_cache (provider, name, status, payload, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    provider,
+                    name,
+                    str(value.get("status", "unknown")),
+                    json.dumps(value, ensure_ascii=False),
+                    time.time() if updated_at is None else updated_at,
+                ),
+            )
+
+    def evict(
+        self,
+        provider: str | None = None,
+        status: str | None = None,
+        older_than_s: float | None = None,
+    ) -> int:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if provider:
+            clauses.append("provider = ?")
+            params.append(provider)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if older_than_s is not None:
+            clauses.append("updated_at < ?")
+            params.append(time.time() - older_than_s)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._db.execute(f"DELETE FROM geocode_cache{where}", params).rowcount
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM geocode_cache LIMIT 1").fetchone() is None
+
+    def import_json(self, json_path: Path) -> int:
+        # Formato legado: {"<provider>::<bairro>": {...}}.
+        legacy = json.loads(json_path.read_text(encoding="utf-8"))
+        if not isinstance(legacy, dict):
+            return 0
+        mtime = json_path.stat().st_mtime
+        count = 0
+        for key, value in legacy.items():
+            provider, sep, name = key.partition("::")
+            if not sep or not isinstance(value, dict):
+                continue
+            self.put(provider, name, value, updated_at=mtime)
+            count += 1
+        return count
+
+    def export_json(self, json_path: Path) -> None:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT provider, name, payload FROM geocode_cache ORDER BY provider DESC, name",
+            ).fetchall()
+        legacy = {f"{provider}::{name}": json.loads(payload) for provider, name, payload in rows}
+        json_path.write_text(json.dumps(legacy, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class PageCache:
+    """Resultado parseado de paginas HTML, com ETag/Last-Modified.
+
+    Usa o mesmo arquivo SQLite do cache de geocoding (tabela propria).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                parsed TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """,
+        )
 
+    def get(self, url: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, parsed, fetched_at FROM page_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, parsed, fetched_at = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "parsed": json.loads(parsed),
+            "fetched_at": fetched_at,
+        }
 
-def google_geocode(query: str, google_api_key: str) -> list[dict[str, Any]]:
-    payload = http_get_json(
-        GOOGLE_GEOCODE_URL,
-        {
-            "address": query,
-            "key": google_api_key,
-            "region": "br",
-            "language": "pt-BR",
-            "bounds": "-5.66,-47.64|-5.40,-47.30",
-            "components": "country:BR|administrative_area:MA|locality:Imperatriz",
-        },
-        timeout=45,
-    )
+    def put(self, url: str, parsed: Any, etag: str | None, last_modified: str | None) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO page_cache (url, etag, last_modified, parsed, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(parsed, ensure_ascii=False), time.time()),
+            )
+
+    def touch(self, url: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE page_cache SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def fetch_cached_page(
+    url: str,
+    parse: Any,
+    page_cache: PageCache,
+    limiter: TokenBucket,
+    max_age_s: float,
+) -> tuple[Any, str]:
+    # Dentro de max_age_s nao ha requisicao; depois disso faz GET
+    # condicional e reaproveita o parse anterior em caso de 304.
+    cached = page_cache.get(url)
+    if cached is not None and time.time() - cached["fetched_at"] < max_age_s:
+        return cached["parsed"], "fresh"
+
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml",
+        "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+    }
+    if cached is not None and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    if cached is not None and cached["last_modified"]:
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    limiter.acquire()
+    status, resp_headers, body = HTTP_CLIENT.get(url, headers=headers, timeout=45)
+    if status == 304 and cached is not None:
+        page_cache.touch(url)
+        return cached["parsed"], "revalidated"
+
+    parsed = parse(body.decode("utf-8", errors="ignore"))
+    page_cache.put(url, parsed, resp_headers.get("ETag"), resp_headers.get("Last-Modified"))
+    return parsed, "fetched"
+
+
+def fetch_ruacep_context(url: str, page_cache: PageCache, limiter: TokenBucket, max_age_s: float) -> dict[str, Any]:
+    """Contexto de logradouros de um bairro pelo cache em disco e token bucket do RuaCEP."""
+    parsed, how = fetch_cached_page(url, parse_ruacep_context_html, page_cache, limiter, max_age_s)
+    REPORT.count("ruacep", how)
+    return parsed
+
+
+def worker_pool(executor: ThreadPoolExecutor | None, workers: int) -> Any:
+    """Pool compartilhado entre cidades (modo --manifest) ou um pool proprio da chamada."""
+    if executor is not None:
+        return nullcontext(executor)
+    return ThreadPoolExecutor(max_workers=max(1, workers))
+
+
+def prefetch_ruacep(
+    pages: int,
+    bairro_names: list[str],
+    page_cache: PageCache,
+    workers: int,
+    limiter: TokenBucket,
+    max_age_s: float,
+    base_url: str = RUACEP_BASE_URL,
+    executor: ThreadPoolExecutor | None = None,
+) -> tuple[dict[str, dict[str, str]], dict[str, dict[str, Any]]]:
+    """Indexa o RuaCEP e busca o contexto dos bairros informados em paralelo.
+
+    Retorna o indice (nome normalizado -> slug/url) e os contextos por slug,
+    no formato esperado por `ruacep_context_cache`.
+    """
+    outcomes: Counter[str] = Counter()
+
+    def fetch(stage: str, url: str, parse: Any) -> Any:
+        with REPORT.span(stage, url=url) as span:
+            try:
+                parsed, how = fetch_cached_page(url, parse, page_cache, limiter, max_age_s)
+            except Exception:  # noqa: BLE001
+                how, parsed = "error", None
+            span["outcome"] = how
+        outcomes[how] += 1
+        REPORT.count("ruacep", how)
+        return parsed
+
+    def parse_index(html: str) -> list[list[str]]:
+        return parse_ruacep_index_html(html, base_url)
+
+    with worker_pool(executor, workers) as pool:
+        pages_rows = list(
+            pool.map(
+                lambda page: fetch("ruacep_index", ruacep_index_page_url(page, base_url), parse_index),
+                range(1, pages + 1),
+            ),
+        )
+        index = merge_ruacep_index([rows for rows in pages_rows if rows is not None], base_url)
+
+        entries = {}
+        for name in bairro_names:
+            entry = index.get(normalize_key(name))
+            if entry is not None:
+                entries[entry["slug"]] = entry["url"]
+        slugs = list(entries)
+        contexts_list = list(
+            pool.map(lambda slug: fetch("ruacep_context", entries[slug], parse_ruacep_context_html), slugs),
+        )
+
+    contexts = {slug: ctx for slug, ctx in zip(slugs, contexts_list) if ctx is not None}
+    print(f"[RUACEP] paginas: {dict(outcomes)}", flush=True)
+    return index, contexts
+
+
+def google_geocode(query: str, google_api_key: str, city: dict[str, Any] = DEFAULT_CITY) -> list[dict[str, Any]]:
+    params = {
+        "address": query,
+        "key": google_api_key,
+        "region": "br",
+        "language": "pt-BR",
+        "components": f"country:{city['country']}|administrative_area:{city['state']}|locality:{city['name']}",
+    }
+    if city.get("google_bounds"):
+        params["bounds"] = city["google_bounds"]
+    payload = http_get_json(GOOGLE_GEOCODE_URL, params, timeout=45)
 
     status = payload.get("status")
     if status == "OK":
@@ -364,73 +1284,181 @@ def google_geocode(query: str, google_api_key: str) -> list[dict[str, Any]]:
     raise RuntimeError(f"Google Geocoding falhou: {error_message}")
 
 
+GOOGLE_SCORE_THRESHOLD = 95
+NOMINATIM_SCORE_THRESHOLD = 80
+
+
+def google_candidate_key(row: dict[str, Any]) -> Any:
+    if row.get("place_id"):
+        return row["place_id"]
+    location = row.get("geometry", {}).get("location", {})
+    return (round(float(location["lat"]), 6), round(float(location["lng"]), 6))
+
+
+def nominatim_candidate_key(row: dict[str, Any]) -> Any:
+    if row.get("osm_id") is not None:
+        return (row.get("osm_type"), row["osm_id"])
+    return (round(float(row["lat"]), 6), round(float(row["lon"]), 6))
+
+
+def evaluate_query_candidates(
+    queries: list[str],
+    fetch: Callable[[str], list[dict[str, Any]]],
+    score: Callable[[dict[str, Any]], int],
+    candidate_key: Callable[[dict[str, Any]], Any],
+    limiter: TokenBucket,
+    threshold: int,
+    provider: str,
+    workers: int = 1,
+    executor: ThreadPoolExecutor | None = None,
+) -> tuple[tuple[int, str, dict[str, Any]] | None, str | None]:
+    """Envia todas as variantes de consulta em paralelo e escolhe o melhor candidato.
+
+    As respostas sao avaliadas na ordem das variantes, assim que o prefixo
+    0..k esta completo: candidatos repetidos (mesmo place_id/osm_id ou mesmas
+    coordenadas) sao pontuados uma vez. Como no laco sequencial, vence o
+    maior score ate ali (empate: o que vem antes), mas a primeira linha que
+    vira melhor no threshold encerra a busca: as linhas seguintes da mesma
+    variante nao sao pontuadas e as variantes seguintes sao canceladas. Com
+    as mesmas respostas, o resultado nao depende da latencia nem da ordem de
+    chegada.
+
+    Retorna ((score, query, linha) | None, ultimo erro).
+    """
+    stop = threading.Event()
+    finished: dict[int, list[dict[str, Any]] | None] = {}
+    errors: dict[int, str] = {}
+    seen: set[Any] = set()
+    best: tuple[int, str, dict[str, Any]] | None = None
+    frontier = 0
+
+    def run(query: str) -> list[dict[str, Any]] | None:
+        # Variante depois de uma que ja atingiu o threshold nao gasta cota.
+        if stop.is_set():
+            return None
+        limiter.acquire()
+        if stop.is_set():
+            return None
+        return fetch(query)
+
+    with worker_pool(executor, workers) as pool:
+        futures = {pool.submit(run, query): k for k, query in enumerate(queries)}
+        for future in as_completed(futures):
+            if future.cancelled() or stop.is_set():
+                continue
+            k = futures[future]
+            try:
+                rows = future.result()
+            except Exception as exc:  # noqa: BLE001
+                REPORT.count(provider, "errors")
+                errors[k] = str(exc)
+                rows = []
+            finished[k] = rows
+
+            while frontier in finished and not stop.is_set():
+                for row in finished.pop(frontier) or []:
+                    if not isinstance(row, dict):
+                        continue
+                    try:
+                        key = candidate_key(row)
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    if key in seen:
+                        REPORT.count(provider, "candidates_deduped")
+                        continue
+                    seen.add(key)
+                    row_score = score(row)
+                    if best is None or row_score > best[0]:
+                        best = (row_score, queries[frontier], row)
+                        if row_score >= threshold:
+                            break
+                if best is not None and best[0] >= threshold:
+                    stop.set()
+                    for other, other_k in futures.items():
+                        if other_k > frontier and other.cancel():
+                            REPORT.count(provider, "queries_cancelled")
+                frontier += 1
+
+    last_error = errors[max(errors)] if errors else None
+    return best, last_error
+
+
 def geocode_bairro_google(
     name: str,
-    cache: dict[str, Any],
-    geocode_delay: float,
+    cache: GeocodeCache,
+    limiter: TokenBucket,
     google_api_key: str,
-    city_query: str,
+    city: dict[str, Any],
     ruacep_index: dict[str, dict[str, str]] | None,
     ruacep_context_cache: dict[str, dict[str, Any]],
+    query_workers: int = 1,
+    query_pool: ThreadPoolExecutor | None = None,
+    ruacep_fetch: Callable[[str], dict[str, Any]] = parse_ruacep_context,
 ) -> dict[str, Any]:
-    cache_key = f"google::{name}"
-    cached = cache.get(cache_key)
+    cache_key = city["cache_prefix"] + name
+    cached = cache.get("google", cache_key)
     if isinstance(cached, dict) and cached.get("status") in {"ok", "not_found"}:
+        REPORT.count("google", "cache_hits")
         return cached
+    REPORT.count("google", "cache_misses")
 
     ruacep_context: dict[str, Any] | None = None
-    normalized_name = normalize_text(name).lower()
+    normalized_name = normalize_key(name)
     if ruacep_index and normalized_name in ruacep_index:
         ctx_key = ruacep_index[normalized_name]["slug"]
         if ctx_key in ruacep_context_cache:
             ruacep_context = ruacep_context_cache[ctx_key]
         else:
             try:
-                ruacep_context = parse_ruacep_context(ruacep_index[normalized_name]["url"])
+                ruacep_context = ruacep_fetch(ruacep_index[normalized_name]["url"])
             except Exception:
                 ruacep_context = {}
             ruacep_context_cache[ctx_key] = ruacep_context
 
+    def fetch(query: str) -> list[dict[str, Any]]:
+        with REPORT.span("geocode_query", provider="google", bairro=name, query=query) as span:
+            rows = google_geocode(query, google_api_key, city)
+            span["results"] = len(rows)
+        # So linhas com coordenadas viram candidatos.
+        return [
+            row
+            for row in rows
+            if isinstance(row, dict)
+            and isinstance(row.get("geometry"), dict)
+            and isinstance(row["geometry"].get("location"), dict)
+            and row["geometry"]["location"].get("lat") is not None
+            and row["geometry"]["location"].get("lng") is not None
+        ]
+
+    # Alvo e cidade normalizados uma vez; cada candidato unico vira um registro pontuado uma vez.
+    target_key = normalize_key(name)
+    city_keys = city_match_keys(city)
+    candidate, last_error = evaluate_query_candidates(
+        build_queries_with_ruacep(name, city=city, ruacep_context=ruacep_context),
+        fetch,
+        lambda row: score_google_record(target_key, google_candidate_record(row), city_keys),
+        google_candidate_key,
+        limiter,
+        GOOGLE_SCORE_THRESHOLD,
+        "google",
+        workers=query_workers,
+        executor=query_pool,
+    )
     best: dict[str, Any] | None = None
-    best_score = -1
-    last_error = None
-    for query in build_queries_with_ruacep(name, city_query=city_query, ruacep_context=ruacep_context):
-        try:
-            rows = google_geocode(query, google_api_key)
-        except Exception as exc:  # noqa: BLE001
-            last_error = str(exc)
-            time.sleep(max(geocode_delay, 0))
-            continue
-
-        for row in rows:
-            if not isinstance(row, dict):
-                continue
-            geometry = row.get("geometry") if isinstance(row.get("geometry"), dict) else {}
-            location = geometry.get("location") if isinstance(geometry.get("location"), dict) else {}
-            lat = location.get("lat")
-            lon = location.get("lng")
-            if lat is None or lon is None:
-                continue
-
-            score = score_google_result(name, row)
-            if score > best_score:
-                best_score = score
-                best = {
-                    "status": "ok",
-                    "lat": float(lat),
-                    "lon": float(lon),
-                    "query": query,
-                    "display_name": row.get("formatted_address", ""),
-                    "google_types": row.get("types"),
-                    "score": score,
-                    "source": "google",
-                    "ruacep_context": ruacep_context,
-                }
-                if score >= 95:
-                    break
-        time.sleep(max(geocode_delay, 0))
-        if best_score >= 95:
-            break
+    if candidate is not None:
+        score, query, row = candidate
+        location = row["geometry"]["location"]
+        best = {
+            "status": "ok",
+            "lat": float(location["lat"]),
+            "lon": float(location["lng"]),
+            "query": query,
+            "display_name": row.get("formatted_address", ""),
+            "google_types": row.get("types"),
+            "score": score,
+            "source": "google",
+            "ruacep_context": ruacep_context,
+        }
 
     if best is None:
         fail = {
@@ -439,45 +1467,49 @@ def geocode_bairro_google(
             "source": "google",
             "ruacep_context": ruacep_context,
         }
-        cache[cache_key] = fail
+        cache.put("google", cache_key, fail)
         return fail
 
-    cache[cache_key] = best
+    cache.put("google", cache_key, best)
     return best
 
 
 def geocode_bairro(
     name: str,
-    cache: dict[str, Any],
-    geocode_delay: float,
+    cache: GeocodeCache,
+    limiters: dict[str, TokenBucket],
     provider: str,
     google_api_key: str,
-    city_query: str,
+    city: dict[str, Any],
     ruacep_index: dict[str, dict[str, str]] | None,
     ruacep_context_cache: dict[str, dict[str, Any]],
+    query_workers: int = 1,
+    query_pool: ThreadPoolExecutor | None = None,
+    ruacep_fetch: Callable[[str], dict[str, Any]] = parse_ruacep_context,
 ) -> dict[str, Any]:
     if provider == "google":
         return geocode_bairro_google(
             name=name,
             cache=cache,
-            geocode_delay=geocode_delay,
+            limiter=limiters["google"],
             google_api_key=google_api_key,
-            city_query=city_query,
+            city=city,
             ruacep_index=ruacep_index,
             ruacep_context_cache=ruacep_context_cache,
+            query_workers=query_workers,
+            query_pool=query_pool,
+            ruacep_fetch=ruacep_fetch,
         )
 
-    cache_key = f"nominatim::{name}"
-    cached = cache.get(cache_key)
+    cache_key = city["cache_prefix"] + name
+    cached = cache.get("nominatim", cache_key)
     if isinstance(cached, dict) and cached.get("status") in {"ok", "not_found"}:
+        REPORT.count("nominatim", "cache_hits")
         return cached
+    REPORT.count("nominatim", "cache_misses")
 
-    best: dict[str, Any] | None = None
-    best_score = -1
-    last_error = None
-
-    for query in build_queries(name):
-        try:
+    def fetch(query: str) -> list[dict[str, Any]]:
+        with REPORT.span("geocode_query", provider="nominatim", bairro=name, query=query) as span:
             rows = http_get_json(
                 NOMINATIM_URL,
                 {
@@ -489,35 +1521,36 @@ def geocode_bairro(
                 },
                 timeout=45,
             )
-        except Exception as exc:  # noqa: BLE001
-            last_error = str(exc)
-            time.sleep(max(geocode_delay, 0))
-            continue
+            span["results"] = len(rows) if isinstance(rows, list) else 0
+        return rows if isinstance(rows, list) else []
 
-        if isinstance(rows, list):
-            for row in rows:
-                if not isinstance(row, dict):
-                    continue
-                score = score_nominatim_result(name, row)
-                if score > best_score:
-                    best_score = score
-                    best = {
-                        "status": "ok",
-                        "lat": float(row["lat"]),
-                        "lon": float(row["lon"]),
-                        "query": query,
-                        "display_name": row.get("display_name", ""),
-                        "nominatim_type": row.get("type"),
-                        "nominatim_class": row.get("class"),
-                        "score": score,
-                    }
-                    # Score bom o suficiente: para cedo para reduzir chamadas.
-                    if score >= 80:
-                        break
-
-        time.sleep(max(geocode_delay, 0))
-        if best_score >= 80:
-            break
+    # Score bom o suficiente cancela as variantes seguintes para reduzir chamadas.
+    target_key = normalize_key(name)
+    city_keys = city_match_keys(city)
+    candidate, last_error = evaluate_query_candidates(
+        build_queries(name, city),
+        fetch,
+        lambda row: score_nominatim_record(target_key, nominatim_candidate_record(row), city_keys),
+        nominatim_candidate_key,
+        limiters["nominatim"],
+        NOMINATIM_SCORE_THRESHOLD,
+        "nominatim",
+        workers=query_workers,
+        executor=query_pool,
+    )
+    best: dict[str, Any] | None = None
+    if candidate is not None:
+        score, query, row = candidate
+        best = {
+            "status": "ok",
+            "lat": float(row["lat"]),
+            "lon": float(row["lon"]),
+            "query": query,
+            "display_name": row.get("display_name", ""),
+            "nominatim_type": row.get("type"),
+            "nominatim_class": row.get("class"),
+            "score": score,
+        }
 
     if best is None:
         fail = {
@@ -525,14 +1558,140 @@ def geocode_bairro(
             "error": last_error or "No result",
             "source": "nominatim",
         }
-        cache[cache_key] = fail
+        cache.put("nominatim", cache_key, fail)
         return fail
 
     best["source"] = "nominatim"
-    cache[cache_key] = best
+    cache.put("nominatim", cache_key, best)
     return best
 
 
+def geocode_bairros(
+    names: list[str],
+    workers: int,
+    executor: ThreadPoolExecutor | None = None,
+    query_workers: int = 1,
+    query_executor: ThreadPoolExecutor | None = None,
+    **geocode_kwargs: Any,
+) -> list[dict[str, Any]]:
+    """Geocodifica bairros em paralelo, preservando a ordem de entrada.
+
+    As variantes de consulta de cada bairro vao para um pool separado (as
+    tarefas de bairro esperam por elas; no mesmo pool poderiam travar); o
+    throughput e controlado pelos rate limiters.
+    """
+    results: list[dict[str, Any] | None] = [None] * len(names)
+    done = 0
+    with worker_pool(executor, workers) as pool, worker_pool(query_executor, workers * query_workers) as query_pool:
+        futures = {
+            pool.submit(
+                geocode_bairro,
+                name=name,
+                query_workers=query_workers,
+                query_pool=query_pool,
+                **geocode_kwargs,
+            ): idx
+            for idx, name in enumerate(names)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            geo = future.result()
+            results[idx] = geo
+            done += 1
+            print(
+                f"[GEOCODE] {done:03d}/{len(names)} "
+                f"{names[idx]}: {geo.get('status')}",
+                flush=True,
+            )
+    return [geo for geo in results if geo is not None]
+
+
+# Resultados que caem no centroide do bairro/cidade nao representam o logradouro.
+AREA_RESULT_TYPES = {"neighborhood", "sublocality", "sublocality_level_1", "locality", "political"}
+
+
+def geocode_bairro_points(
+    bairro: dict[str, Any],
+    streets: list[str],
+    points_per_bairro: int,
+    cache: GeocodeCache,
+    limiter: TokenBucket,
+    google_api_key: str,
+    city: dict[str, Any],
+    max_distance_m: float,
+) -> list[dict[str, Any]]:
+    """Geocodifica logradouros espalhados pela lista do RuaCEP como pontos do bairro.
+
+    Aceita so resultados de nivel de rua a ate `max_distance_m` do centroide.
+    """
+    points: list[dict[str, Any]] = []
+    for pos in sample_positions(len(streets), points_per_bairro):
+        street = format_street_for_query(streets[pos])
+        query = f"{street}, {bairro['name']}, {city['city_query']}"
+        cache_key = f"{city['cache_prefix']}point|{query}"
+        point = cache.get("google", cache_key)
+        if isinstance(point, dict) and point.get("status") in {"ok", "not_found"}:
+            REPORT.count("google", "cache_hits")
+        else:
+            REPORT.count("google", "cache_misses")
+            limiter.acquire()
+            try:
+                with REPORT.span("geocode_query", provider="google", bairro=bairro["name"], query=query, kind="point"):
+                    rows = google_geocode(query, google_api_key, city)
+            except Exception as exc:  # noqa: BLE001
+                REPORT.count("google", "errors")
+                print(f"[POINTS] {bairro['name']} / {street}: {exc}", flush=True)
+                continue
+            point = {"status": "not_found", "query": query, "street": street}
+            for row in rows:
+                location = row.get("geometry", {}).get("location", {}) if isinstance(row, dict) else {}
+                if location.get("lat") is None or location.get("lng") is None:
+                    continue
+                if AREA_RESULT_TYPES.issuperset(row.get("types") or ["political"]):
+                    continue
+                point = {
+                    "status": "ok",
+                    "lat": float(location["lat"]),
+                    "lon": float(location["lng"]),
+                    "query": query,
+                    "street": street,
+                    "display_name": row.get("formatted_address", ""),
+                }
+                break
+            cache.put("google", cache_key, point)
+        if point.get("status") != "ok":
+            continue
+        if haversine_m(bairro["lat"], bairro["lon"], point["lat"], point["lon"]) > max_distance_m:
+            continue
+        points.append({key: point[key] for key in ("lat", "lon", "street")})
+    return points
+
+
+def geocode_sub_points(
+    bairros: list[dict[str, Any]],
+    streets_by_bairro: dict[str, list[str]],
+    workers: int,
+    executor: ThreadPoolExecutor | None = None,
+    **point_kwargs: Any,
+) -> int:
+    """Preenche `bairro["points"]` dos bairros resolvidos com lista de logradouros."""
+    targets = [b for b in bairros if b.get("status") == "ok" and streets_by_bairro.get(b["name"])]
+    total = 0
+    with worker_pool(executor, workers) as pool:
+        futures = {
+            pool.submit(geocode_bairro_points, bairro, streets_by_bairro[bairro["name"]], **point_kwargs): bairro
+            for bairro in targets
+        }
+        for future in as_completed(futures):
+            bairro = futures[future]
+            points = future.result()
+            if points:
+                bairro["points"] = points
+                total += len(points)
+            print(f"[POINTS] {bairro['name']}: {len(points)} pontos", flush=True)
+    return total
+
+
 def osrm_table_block(
     src_coords: list[tuple[float, float]],
     dst_coords: list[tuple[float, float]],
@@ -566,9 +1725,302 @@ def osrm_table_block(
     return distances, durations
 
 
-def build_matrix(
+def osrm_table_block_with_retry(
+    src_coords: list[tuple[float, float]],
+    dst_coords: list[tuple[float, float]],
+    limiter: TokenBucket,
+    retries: int = 3,
+    wait_s: float = 2.0,
+) -> tuple[list[list[float | None]], list[list[float | None]]]:
+    while True:
+        limiter.acquire()
+        try:
+            with REPORT.span("osrm_block", sources=len(src_coords), destinations=len(dst_coords)):
+                result = osrm_table_block(src_coords, dst_coords)
+            REPORT.count("osrm", "blocks")
+            return result
+        except Exception as exc:  # noqa: BLE001
+            REPORT.count("osrm", "errors")
+            retries -= 1
+            if retries <= 0:
+                raise RuntimeError(f"Falha definitiva no OSRM: {exc}") from exc
+            print(f"[OSRM] retry em {wait_s:.1f}s: {exc}", flush=True)
+            REPORT.count("osrm", "retries")
+            REPORT.count("osrm", "retry_sleep_s", wait_s)
+            time.sleep(wait_s)
+            wait_s *= 2
+
+
+def sample_positions(size: int, sample: int) -> list[int]:
+    if size <= sample:
+        return list(range(size))
+    step = (size - 1) / (sample - 1) if sample > 1 else 0
+    return sorted({int(round(k * step)) for k in range(sample)})
+
+
+def within_tolerance(value: float | None, mirror: float | None, tolerance: float) -> bool:
+    if value is None or mirror is None:
+        return value is None and mirror is None
+    base = max(abs(float(mirror)), 1.0)
+    return abs(float(value) - float(mirror)) / base <= tolerance
+
+
+def transpose_block(rows: list[list[Any]]) -> list[list[Any]]:
+    return [list(col) for col in zip(*rows)] if rows else []
+
+
+def check_symmetric_block(
+    src_coords: list[tuple[float, float]],
+    dst_coords: list[tuple[float, float]],
+    mirror: tuple[list[list[float | None]], list[list[float | None]]],
+    limiter: TokenBucket,
+    tolerance: float,
+    sample: int = 3,
+) -> tuple[list[list[float | None]], list[list[float | None]], str]:
+    # `mirror` e o bloco (B,A) ja resolvido; confere uma amostra de (A,B)
+    # e so busca o bloco completo se a rota divergir alem da tolerancia.
+    mirror_dists, mirror_durs = mirror
+    rows = sample_positions(len(src_coords), sample)
+    cols = sample_positions(len(dst_coords), sample)
+    dists, durs = osrm_table_block_with_retry(
+        [src_coords[r] for r in rows],
+        [dst_coords[c] for c in cols],
+        limiter,
+    )
+    for a, r in enumerate(rows):
+        for b, c in enumerate(cols):
+            if not within_tolerance(dists[a][b], mirror_dists[c][r], tolerance) or not within_tolerance(
+                durs[a][b], mirror_durs[c][r], tolerance
+            ):
+                full_dists, full_durs = osrm_table_block_with_retry(src_coords, dst_coords, limiter)
+                return full_dists, full_durs, "fetched"
+    return transpose_block(mirror_dists), transpose_block(mirror_durs), "checked"
+
+
+def osrm_block_key(src_coords: list[tuple[float, float]], dst_coords: list[tuple[float, float]]) -> str:
+    # Mesma precisao das coordenadas enviadas ao OSRM: bloco igual, resposta igual.
+    raw = "|".join(";".join(f"{lon:.6f},{lat:.6f}" for lat, lon in coords) for coords in (src_coords, dst_coords))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class OsrmBlockJournal:
+    """Journal em JSON lines dos blocos OSRM concluidos.
+
+    Cada bloco vai para o arquivo (com flush) assim que chega, chaveado
+    pelas coordenadas de origem/destino. Com `resume`, os blocos de um
+    journal anterior do mesmo endpoint sao servidos sem consultar o OSRM;
+    em memoria fica so o offset de cada linha (o bloco e relido do disco no
+    `get`), nao os payloads. Uma linha truncada no fim (processo morto no
+    meio da escrita) e descartada antes de o journal voltar a crescer.
+    """
+
+    def __init__(self, path: Path, osrm_url: str, resume: bool = False) -> None:
+        self.path = path
+        self.osrm_url = osrm_url
+        self._lock = threading.Lock()
+        self._offsets: dict[str, int] = {}
+        end = self._load() if resume and path.exists() else 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if end:
+            with path.open("r+b") as fh:
+                fh.truncate(end)
+            self._fh = path.open("a", encoding="utf-8")
+        else:
+            self._fh = path.open("w", encoding="utf-8")
+            self._write({"type": "journal", "osrm_url": osrm_url, "created_at": time.time()})
+        self._reader = path.open("rb")
+
+    def _load(self) -> int:
+        """Indexa os blocos do journal; devolve o fim da ultima linha integra (0 = recomecar)."""
+        end = 0
+        with self.path.open("rb") as fh:
+            for line_no, line in enumerate(iter(fh.readline, b"")):
+                if not line.endswith(b"\n"):
+                    break
+                offset = end
+                end += len(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    event = {}
+                if line_no == 0 and (event.get("type") != "journal" or event.get("osrm_url") != self.osrm_url):
+                    print(f"[OSRM] journal de outro endpoint ignorado: {self.path}", flush=True)
+                    return 0
+                if event.get("type") == "block":
+                    self._offsets[event["key"]] = offset
+        return end
+
+    def _write(self, event: dict[str, Any]) -> None:
+        line = json.dumps(event, separators=(",", ":"))
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def get(
+        self,
+        src_coords: list[tuple[float, float]],
+        dst_coords: list[tuple[float, float]],
+    ) -> tuple[list[list[float | None]], list[list[float | None]]] | None:
+        offset = self._offsets.get(osrm_block_key(src_coords, dst_coords))
+        if offset is None:
+            return None
+        with self._lock:
+            self._reader.seek(offset)
+            event = json.loads(self._reader.readline())
+        return event["distances"], event["durations"]
+
+    def record(
+        self,
+        src_coords: list[tuple[float, float]],
+        dst_coords: list[tuple[float, float]],
+        distances: list[list[float | None]],
+        durations: list[list[float | None]],
+    ) -> None:
+        # So vai para o arquivo; o indice em memoria cobre apenas os blocos do resume.
+        self._write(
+            {
+                "type": "block",
+                "key": osrm_block_key(src_coords, dst_coords),
+                "distances": distances,
+                "durations": durations,
+            }
+        )
+
+    def close(self, remove: bool = False) -> None:
+        with self._lock:
+            self._fh.close()
+            self._reader.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+def fill_matrix_blocks(
+    bairros: list[dict[str, Any]],
+    jobs: list[tuple[list[int], list[int]]],
+    distance_m: list[list[int | None]],
+    duration_s: list[list[int | None]],
+    workers: int = 1,
+    limiter: TokenBucket | None = None,
+    symmetric: str = "off",
+    symmetric_tolerance: float = 0.1,
+    executor: ThreadPoolExecutor | None = None,
+    journal: OsrmBlockJournal | None = None,
+) -> Counter[str]:
+    """Busca os blocos (origens, destinos) de `jobs` e preenche as matrizes.
+
+    Com `journal`, blocos ja gravados nao vao ao OSRM, cada bloco buscado e
+    gravado ao chegar e uma falha definitiva nao interrompe os demais: os
+    blocos restantes terminam (e ficam no journal) antes do erro subir.
+    """
+    limiter = limiter or TokenBucket(0)
+    total_calls = len(jobs)
+    call_no = 0
+    stats: Counter[str] = Counter()
+    failures: list[str] = []
+
+    def coords_of(block: list[int]) -> list[tuple[float, float]]:
+        return [(bairros[i]["lat"], bairros[i]["lon"]) for i in block]
+
+    def fetch(src: list[int], dst: list[int]) -> tuple[list[list[float | None]], list[list[float | None]], str]:
+        if journal is not None:
+            journaled = journal.get(coords_of(src), coords_of(dst))
+            if journaled is not None:
+                return journaled[0], journaled[1], "journaled"
+        dists, durs = osrm_table_block_with_retry(coords_of(src), coords_of(dst), limiter)
+        return dists, durs, "fetched"
+
+    def check(
+        src: list[int],
+        dst: list[int],
+        mirror: tuple[list[list[float | None]], list[list[float | None]]],
+    ) -> tuple[list[list[float | None]], list[list[float | None]], str]:
+        if journal is not None:
+            journaled = journal.get(coords_of(src), coords_of(dst))
+            if journaled is not None:
+                return journaled[0], journaled[1], "journaled"
+        return check_symmetric_block(coords_of(src), coords_of(dst), mirror, limiter, symmetric_tolerance)
+
+    def store(src: list[int], dst: list[int], dists: list[list[float | None]], durs: list[list[float | None]]) -> None:
+        for r, src_idx in enumerate(src):
+            for c, dst_idx in enumerate(dst):
+                d_val = dists[r][c]
+                t_val = durs[r][c]
+                distance_m[src_idx][dst_idx] = None if d_val is None else int(round(float(d_val)))
+                duration_s[src_idx][dst_idx] = None if t_val is None else int(round(float(t_val)))
+
+    # Com modo simetrico, so um lado de cada par (A,B)/(B,A) e buscado de
+    # inicio; o bloco espelhado e resolvido quando o primeiro retorna.
+    primary: list[tuple[list[int], list[int]]] = []
+    deferred: dict[tuple[tuple[int, ...], tuple[int, ...]], tuple[list[int], list[int]]] = {}
+    primary_keys: set[tuple[tuple[int, ...], tuple[int, ...]]] = set()
+    for src, dst in jobs:
+        key = (tuple(src), tuple(dst))
+        if symmetric != "off" and src != dst and (key[1], key[0]) in primary_keys:
+            deferred[(key[1], key[0])] = (src, dst)
+            continue
+        primary.append((src, dst))
+        primary_keys.add(key)
+
+    with worker_pool(executor, workers) as pool:
+        pending = {pool.submit(fetch, src, dst): (src, dst) for src, dst in primary}
+        try:
+            while pending:
+                future = next(as_completed(pending))
+                src, dst = pending.pop(future)
+                try:
+                    dists, durs, how = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    if journal is None:
+                        raise
+                    failures.append(str(exc))
+                    stats["failed"] += 1
+                    print(f"[OSRM] bloco falhou (src={len(src)} dst={len(dst)}): {exc}", flush=True)
+                    continue
+                if how == "journaled":
+                    REPORT.count("osrm", "journaled")
+                elif journal is not None:
+                    journal.record(coords_of(src), coords_of(dst), dists, durs)
+                store(src, dst, dists, durs)
+                call_no += 1
+                stats[how] += 1
+                print(
+                    f"[OSRM] bloco {call_no}/{total_calls} "
+                    f"(src={len(src)} dst={len(dst)} {how})",
+                    flush=True,
+                )
+                mirror = deferred.pop((tuple(src), tuple(dst)), None)
+                if mirror is None:
+                    continue
+                if symmetric == "skip":
+                    store(mirror[0], mirror[1], transpose_block(dists), transpose_block(durs))
+                    call_no += 1
+                    stats["mirrored"] += 1
+                    print(
+                        f"[OSRM] bloco {call_no}/{total_calls} "
+                        f"(src={len(mirror[0])} dst={len(mirror[1])} mirrored)",
+                        flush=True,
+                    )
+                    continue
+                pending[pool.submit(check, mirror[0], mirror[1], (dists, durs))] = mirror
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    print(f"[OSRM] blocos: {dict(stats)}", flush=True)
+    if failures and journal is not None:
+        raise RuntimeError(
+            f"Falha definitiva no OSRM em {len(failures)} bloco(s); os demais estao no journal "
+            f"{journal.path} (use --resume). Primeiro erro: {failures[0]}"
+        )
+    return stats
+
+
+def empty_matrix(
     bairros: list[dict[str, Any]],
-    block_size: int,
 ) -> tuple[list[list[int | None]], list[list[int | None]], list[int]]:
     n = len(bairros)
     distance_m: list[list[int | None]] = [[None for _ in range(n)] for _ in range(n)]
@@ -578,91 +2030,534 @@ def build_matrix(
     for i in resolved:
         distance_m[i][i] = 0
         duration_s[i][i] = 0
+    return distance_m, duration_s, resolved
+
+
+def split_blocks(indices: list[int], block_size: int) -> list[list[int]]:
+    return [indices[i : i + block_size] for i in range(0, len(indices), block_size)]
+
 
+def build_matrix(
+    bairros: list[dict[str, Any]],
+    block_size: int,
+    workers: int = 1,
+    limiter: TokenBucket | None = None,
+    symmetric: str = "off",
+    symmetric_tolerance: float = 0.1,
+    executor: ThreadPoolExecutor | None = None,
+    journal: OsrmBlockJournal | None = None,
+) -> tuple[list[list[int | None]], list[list[int | None]], list[int]]:
+    distance_m, duration_s, resolved = empty_matrix(bairros)
     if not resolved:
         return distance_m, duration_s, resolved
 
-    blocks = [resolved[i : i + block_size] for i in range(0, len(resolved), block_size)]
+    blocks = split_blocks(resolved, block_size)
+    fill_matrix_blocks(
+        bairros,
+        [(sb, db) for sb in blocks for db in blocks],
+        distance_m,
+        duration_s,
+        workers=workers,
+        limiter=limiter,
+        symmetric=symmetric,
+        symmetric_tolerance=symmetric_tolerance,
+        executor=executor,
+        journal=journal,
+    )
+    return distance_m, duration_s, resolved
+
+
+def same_coords(a: dict[str, Any], b: dict[str, Any]) -> bool:
+    try:
+        return math.isclose(float(a["lat"]), float(b["lat"]), abs_tol=1e-7) and math.isclose(
+            float(a["lon"]), float(b["lon"]), abs_tol=1e-7
+        )
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def build_matrix_incremental(
+    bairros: list[dict[str, Any]],
+    previous: dict[str, Any],
+    block_size: int,
+    workers: int = 1,
+    limiter: TokenBucket | None = None,
+    symmetric: str = "off",
+    symmetric_tolerance: float = 0.1,
+    executor: ThreadPoolExecutor | None = None,
+    journal: OsrmBlockJournal | None = None,
+) -> tuple[list[list[int | None]], list[list[int | None]], list[int], dict[str, Any]]:
+    """Reaproveita a matriz anterior e consulta so linhas/colunas alteradas.
+
+    Um bairro e reaproveitado quando existe na saida anterior com o mesmo
+    nome e as mesmas coordenadas; novos ou re-geocodificados viram linha e
+    coluna a recalcular (custo O(k*N) em vez de O(N^2)).
+    """
+    distance_m, duration_s, resolved = empty_matrix(bairros)
+
+    prev_matrix = previous.get("matrix") if isinstance(previous.get("matrix"), dict) else {}
+    prev_order = prev_matrix.get("order") if isinstance(prev_matrix.get("order"), list) else []
+    prev_dist = prev_matrix.get("distance_m") or []
+    prev_dur = prev_matrix.get("duration_s") or []
+    prev_pos = {name: i for i, name in enumerate(prev_order)}
+    prev_bairros = {
+        b.get("name"): b for b in previous.get("bairros", []) if isinstance(b, dict)
+    }
+
+    reused: list[tuple[int, int]] = []
+    changed: list[int] = []
+    for i in resolved:
+        name = bairros[i]["name"]
+        old = prev_bairros.get(name)
+        if name in prev_pos and old is not None and same_coords(bairros[i], old):
+            reused.append((i, prev_pos[name]))
+        else:
+            changed.append(i)
+
+    for i, oi in reused:
+        for j, oj in reused:
+            distance_m[i][j] = prev_dist[oi][oj]
+            duration_s[i][j] = prev_dur[oi][oj]
+
+    current_names = {b["name"] for b in bairros}
+    summary: dict[str, Any] = {
+        "reused_bairros": len(reused),
+        "recomputed_bairros": [bairros[i]["name"] for i in changed],
+        "removed_bairros": [name for name in prev_order if name not in current_names],
+        "osrm_blocks": 0,
+    }
+    if not changed:
+        return distance_m, duration_s, resolved, summary
+
+    changed_blocks = split_blocks(changed, block_size)
+    reused_blocks = split_blocks([i for i, _ in reused], block_size)
+    jobs = [(cb, db) for cb in changed_blocks for db in changed_blocks + reused_blocks]
+    jobs += [(rb, cb) for rb in reused_blocks for cb in changed_blocks]
+    summary["osrm_blocks"] = len(jobs)
+    fill_matrix_blocks(
+        bairros,
+        jobs,
+        distance_m,
+        duration_s,
+        workers=workers,
+        limiter=limiter,
+        symmetric=symmetric,
+        symmetric_tolerance=symmetric_tolerance,
+        executor=executor,
+        journal=journal,
+    )
+    return distance_m, duration_s, resolved, summary
+
+
+def apply_multipoint_routes(
+    bairros: list[dict[str, Any]],
+    distance_m: list[list[int | None]],
+    duration_s: list[list[int | None]],
+    **matrix_kwargs: Any,
+) -> dict[str, Any]:
+    """Troca cada par com pontos extras pela mediana das rotas entre pontos.
+
+    Os pontos de um bairro sao o centroide + `bairro["points"]`, e distancia
+    e duracao usam medianas independentes sobre os pares com rota. Centroide
+    -> centroide ja esta na matriz; do OSRM (em blocos) vem so o que falta:
+    linhas dos pontos extras para todos os pontos e colunas dos pontos extras
+    a partir dos centroides. O resultado fica esparso, por ponto de origem.
+    """
+    members: dict[int, list[int]] = {}
+    owner: list[int] = []
+    points: list[dict[str, Any]] = []
+    centroid_ids: list[int] = []
+    extra_ids: list[int] = []
+    for i, bairro in enumerate(bairros):
+        if bairro.get("status") != "ok":
+            continue
+        for k, (lat, lon) in enumerate(
+            [(bairro["lat"], bairro["lon"])] + [(p["lat"], p["lon"]) for p in bairro.get("points", [])]
+        ):
+            (extra_ids if k else centroid_ids).append(len(points))
+            members.setdefault(i, []).append(len(points))
+            owner.append(i)
+            points.append({"name": bairro["name"], "lat": lat, "lon": lon})
+    multi = {i for i, ids in members.items() if len(ids) > 1}
+    if not multi:
+        return {"points": len(points), "bairros_with_points": 0, "cells_replaced": 0, "osrm_blocks": 0}
+
+    block_size = matrix_kwargs.pop("block_size")
+    extra_blocks = split_blocks(extra_ids, block_size)
+    jobs = [(sb, db) for sb in extra_blocks for db in split_blocks(centroid_ids + extra_ids, block_size)]
+    jobs += [(sb, db) for sb in split_blocks(centroid_ids, block_size) for db in extra_blocks]
+    point_distance: dict[int, dict[int, int | None]] = {a: {} for a in range(len(points))}
+    point_duration: dict[int, dict[int, int | None]] = {a: {} for a in range(len(points))}
+    fill_matrix_blocks(points, jobs, point_distance, point_duration, **matrix_kwargs)  # type: ignore[arg-type]
+    is_centroid = set(centroid_ids)
+
+    def route(a: int, b: int) -> tuple[int | None, int | None]:
+        if a in is_centroid and b in is_centroid:
+            return distance_m[owner[a]][owner[b]], duration_s[owner[a]][owner[b]]
+        return point_distance[a].get(b), point_duration[a].get(b)
+
+    replaced = 0
+    for i, src_ids in members.items():
+        for j, dst_ids in members.items():
+            if i == j or (i not in multi and j not in multi):
+                continue
+            routes = [route(a, b) for a in src_ids for b in dst_ids]
+            pairs = [(d, t) for d, t in routes if d is not None and t is not None]
+            if not pairs:
+                continue
+            distance_m[i][j] = int(round(statistics.median(d for d, _ in pairs)))
+            duration_s[i][j] = int(round(statistics.median(t for _, t in pairs)))
+            replaced += 1
+    return {
+        "points": len(points),
+        "bairros_with_points": len(multi),
+        "cells_replaced": replaced,
+        "osrm_blocks": len(jobs),
+    }
+
+
+def nudge_toward(lat: float, lon: float, lat2: float, lon2: float, meters: float) -> tuple[float, float]:
+    """Ponto a `meters` de (lat, lon) rumo a (lat2, lon2), no maximo 1/4 do caminho (aprox. plana)."""
+    dist = haversine_m(lat, lon, lat2, lon2)
+    if dist <= 0:
+        return lat, lon
+    f = min(meters, dist / 4) / dist
+    return lat + (lat2 - lat) * f, lon + (lon2 - lon) * f
+
+
+def sanity_check_matrix(
+    bairros: list[dict[str, Any]],
+    distance_m: list[list[int | None]],
+    duration_s: list[list[int | None]],
+    thresholds: dict[str, float],
+    action: str = "flag",
+    workers: int = 1,
+    limiter: TokenBucket | None = None,
+    executor: ThreadPoolExecutor | None = None,
+) -> dict[str, Any]:
+    geodesic_m = haversine_matrix(bairros)
+    flagged = check_cells(distance_m, geodesic_m, thresholds)
+    print(f"[SANITY] {len(flagged)} celulas sinalizadas", flush=True)
+
+    persistent = flagged
+    by_origin: dict[int, list[int]] = {}
+    if flagged:
+        # Os mesmos centroides no mesmo OSRM devolvem a mesma rota. A reconsulta (uma chamada por
+        # origem) desloca a origem e cada destino SANITY_NUDGE_M um rumo ao outro, para o snap cair
+        # em outra via (centroide preso em rodovia ou rua sem saida); a rota nova so fica se passar.
+        limiter = limiter or TokenBucket(0)
+        original = {cell: (distance_m[cell[0]][cell[1]], duration_s[cell[0]][cell[1]]) for cell in flagged}
+        for i, j in sorted(flagged):
+            by_origin.setdefault(i, []).append(j)
+
+        def requery(i: int, dsts: list[int]) -> tuple[list[list[float | None]], list[list[float | None]]]:
+            origin = bairros[i]
+            toward_lat = statistics.fmean(bairros[j]["lat"] for j in dsts)
+            toward_lon = statistics.fmean(bairros[j]["lon"] for j in dsts)
+            src = [nudge_toward(origin["lat"], origin["lon"], toward_lat, toward_lon, SANITY_NUDGE_M)]
+            dst = [
+                nudge_toward(bairros[j]["lat"], bairros[j]["lon"], origin["lat"], origin["lon"], SANITY_NUDGE_M)
+                for j in dsts
+            ]
+            return osrm_table_block_with_retry(src, dst, limiter)
+
+        with worker_pool(executor, workers) as pool:
+            futures = {pool.submit(requery, i, dsts): (i, dsts) for i, dsts in by_origin.items()}
+            for future in as_completed(futures):
+                i, dsts = futures[future]
+                dists, durs = future.result()
+                for c, j in enumerate(dsts):
+                    if dists[0][c] is not None and durs[0][c] is not None:
+                        distance_m[i][j] = int(round(float(dists[0][c])))
+                        duration_s[i][j] = int(round(float(durs[0][c])))
+        rechecked = check_cells(distance_m, geodesic_m, thresholds, cells=set(flagged))
+        for i, j in rechecked:
+            distance_m[i][j], duration_s[i][j] = original[(i, j)]
+        persistent = {cell: flagged[cell] for cell in rechecked}
+
+    dropped = 0
+    if action == "drop":
+        for i, j in persistent:
+            distance_m[i][j] = None
+            duration_s[i][j] = None
+            dropped += 1
+
+    print(
+        f"[SANITY] {len(flagged) - len(persistent)} corrigidas na reconsulta, "
+        f"{len(persistent)} persistentes, {dropped} anuladas",
+        flush=True,
+    )
+    return {
+        "thresholds": {**DEFAULT_THRESHOLDS, **thresholds},
+        "initial_flagged_cells": len(flagged),
+        "requery_calls": len(by_origin),
+        "fixed_by_requery": len(flagged) - len(persistent),
+        "dropped_cells": dropped,
+        **summarize_findings([b["name"] for b in bairros], persistent),
+    }
+
+
+def resolved_indices(bairros: list[dict[str, Any]]) -> list[int]:
+    return [i for i, b in enumerate(bairros) if isinstance(b.get("lat"), float) and isinstance(b.get("lon"), float)]
+
+
+class StreamingMatrixJsonWriter:
+    """Escreve o JSON da matriz linha a linha.
+
+    `distance_m` vai direto para o arquivo; `duration_s` passa por um
+    arquivo temporario e e anexado no fim, junto com as chaves finais
+    (ex.: metrics), que so sao conhecidas depois da ultima linha.
+    """
+
+    def __init__(self, path: Path, head: dict[str, Any], order: list[str]) -> None:
+        self.path = path
+        self._tmp_path = path.with_name(path.name + ".tmp")
+        self._fh = self._tmp_path.open("w", encoding="utf-8")
+        self._spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._rows = 0
+        self._fh.write("{\n")
+        for key, value in head.items():
+            self._fh.write(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+        self._fh.write('  "matrix": {\n')
+        self._fh.write('    "units": {"distance": "meters", "duration": "seconds"},\n')
+        self._fh.write(f'    "order": {json.dumps(order, ensure_ascii=False)},\n')
+        self._fh.write('    "distance_m": [\n')
+
+    @staticmethod
+    def _row_json(row: array) -> str:
+        return "[" + ",".join("null" if v == NULL_U32 else str(v) for v in row) + "]"
+
+    def write_row(self, distance_row: array, duration_row: array) -> None:
+        sep = ",\n" if self._rows else ""
+        self._fh.write(f"{sep}      {self._row_json(distance_row)}")
+        self._spool.write(f"{sep}      {self._row_json(duration_row)}")
+        self._rows += 1
+
+    def close(self, tail: dict[str, Any]) -> None:
+        self._fh.write('\n    ],\n    "duration_s": [\n')
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, self._fh)
+        self._spool.close()
+        self._fh.write("\n    ]\n  }")
+        for key, value in tail.items():
+            self._fh.write(f",\n  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False, indent=2)}")
+        self._fh.write("\n}\n")
+        self._fh.close()
+        os.replace(self._tmp_path, self.path)
+
+
+def stream_matrix(
+    bairros: list[dict[str, Any]],
+    json_writer: StreamingMatrixJsonWriter,
+    bin_writer: MatrixBinStreamWriter,
+    block_size: int,
+    workers: int = 1,
+    limiter: TokenBucket | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    journal: OsrmBlockJournal | None = None,
+) -> int:
+    """Monta a matriz por faixa de origens e grava cada faixa ao concluir.
+
+    So os buffers da faixa atual e da proxima (ja em voo no pool) ficam em
+    memoria: pico O(block_size * N) em vez de O(N^2). Retorna a quantidade
+    de celulas com rota.
+    """
+    n = len(bairros)
+    limiter = limiter or TokenBucket(0)
+    blocks = split_blocks(resolved_indices(bairros), block_size)
     total_calls = len(blocks) * len(blocks)
     call_no = 0
+    non_null_cells = 0
+    next_row = 0
+    null_row = array("I", [NULL_U32]) * n
+
+    def coords_of(block: list[int]) -> list[tuple[float, float]]:
+        return [(bairros[i]["lat"], bairros[i]["lon"]) for i in block]
+
+    def fetch(sb: list[int], db: list[int]) -> tuple[list[list[float | None]], list[list[float | None]]]:
+        if journal is not None:
+            journaled = journal.get(coords_of(sb), coords_of(db))
+            if journaled is not None:
+                REPORT.count("osrm", "journaled")
+                return journaled
+        dists, durs = osrm_table_block_with_retry(coords_of(sb), coords_of(db), limiter)
+        if journal is not None:
+            journal.record(coords_of(sb), coords_of(db), dists, durs)
+        return dists, durs
+
+    def emit(row_index: int, distance_row: array, duration_row: array) -> None:
+        nonlocal non_null_cells
+        json_writer.write_row(distance_row, duration_row)
+        bin_writer.write_row(row_index, distance_row, duration_row)
+        non_null_cells += sum(
+            1 for d_val, t_val in zip(distance_row, duration_row) if d_val != NULL_U32 and t_val != NULL_U32
+        )
 
-    for sb in blocks:
-        src_coords = [(bairros[i]["lat"], bairros[i]["lon"]) for i in sb]
-        for db in blocks:
-            call_no += 1
-            print(
-                f"[OSRM] bloco {call_no}/{total_calls} "
-                f"(src={len(sb)} dst={len(db)})",
-                flush=True,
-            )
-            dst_coords = [(bairros[i]["lat"], bairros[i]["lon"]) for i in db]
-
-            retries = 3
-            wait_s = 2.0
-            while True:
-                try:
-                    dists, durs = osrm_table_block(src_coords, dst_coords)
-                    break
-                except Exception as exc:  # noqa: BLE001
-                    retries -= 1
-                    if retries <= 0:
-                        raise RuntimeError(f"Falha definitiva no OSRM: {exc}") from exc
-                    print(f"[OSRM] retry em {wait_s:.1f}s: {exc}", flush=True)
-                    time.sleep(wait_s)
-                    wait_s *= 2
+    with worker_pool(executor, workers) as pool:
+
+        def submit_band(sb: list[int]) -> dict[Any, list[int]]:
+            return {pool.submit(fetch, sb, db): db for db in blocks}
+
+        inflight = [submit_band(sb) for sb in blocks[:2]]
+        for band_no, sb in enumerate(blocks):
+            futures = inflight.pop(0)
+            if band_no + 2 < len(blocks):
+                inflight.append(submit_band(blocks[band_no + 2]))
+
+            distance_rows = [array("I", null_row) for _ in sb]
+            duration_rows = [array("I", null_row) for _ in sb]
+            for future in as_completed(futures):
+                db = futures[future]
+                dists, durs = future.result()
+                for r in range(len(sb)):
+                    for c, dst_idx in enumerate(db):
+                        d_val = dists[r][c]
+                        t_val = durs[r][c]
+                        distance_rows[r][dst_idx] = NULL_U32 if d_val is None else int(round(float(d_val)))
+                        duration_rows[r][dst_idx] = NULL_U32 if t_val is None else int(round(float(t_val)))
+                call_no += 1
+                print(
+                    f"[OSRM] bloco {call_no}/{total_calls} (src={len(sb)} dst={len(db)} streamed)",
+                    flush=True,
+                )
 
             for r, src_idx in enumerate(sb):
-                for c, dst_idx in enumerate(db):
-                    d_val = dists[r][c]
-                    t_val = durs[r][c]
-                    distance_m[src_idx][dst_idx] = None if d_val is None else int(round(float(d_val)))
-                    duration_s[src_idx][dst_idx] = None if t_val is None else int(round(float(t_val)))
+                # Bairros sem coordenada ficam como linhas nulas, na ordem original.
+                while next_row < src_idx:
+                    emit(next_row, null_row, null_row)
+                    next_row += 1
+                emit(src_idx, distance_rows[r], duration_rows[r])
+                next_row = src_idx + 1
 
-    return distance_m, duration_s, resolved
+    while next_row < n:
+        emit(next_row, null_row, null_row)
+        next_row += 1
+    return non_null_cells
 
 
-def main() -> None:
-    args = parse_args()
-    in_path = Path(args.input)
-    out_path = Path(args.output)
-    cache_path = Path(args.cache)
-
-    bairros = parse_bairros(in_path)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
+def build_metrics(bairros: list[dict[str, Any]], non_null_cells: int) -> tuple[list[str], dict[str, Any]]:
+    unresolved = [b["name"] for b in bairros if b.get("lat") is None or b.get("lon") is None]
+    status_counts = Counter(b.get("status", "unknown") for b in bairros)
+    total_cells = len(bairros) * len(bairros)
+    metrics = {
+        "total_bairros": len(bairros),
+        "geocoded_bairros": int(status_counts.get("ok", 0)),
+        "unresolved_bairros": len(unresolved),
+        "matrix_cells_total": total_cells,
+        "matrix_cells_with_route": non_null_cells,
+        "coverage_percent": round((non_null_cells / total_cells) * 100, 2) if total_cells else 0,
+        "pairs_directed": len(bairros) * (len(bairros) - 1),
+        "pairs_undirected": (len(bairros) * (len(bairros) - 1)) // 2,
+        "status_breakdown": dict(status_counts),
+    }
+    return unresolved, metrics
 
-    if cache_path.exists():
-        cache = json.loads(cache_path.read_text(encoding="utf-8"))
-        if not isinstance(cache, dict):
-            cache = {}
-    else:
-        cache = {}
 
-    if args.provider == "google" and not args.google_api_key.strip():
+def open_geocode_cache(args: argparse.Namespace, cache_path: Path) -> GeocodeCache:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache = GeocodeCache(cache_path, not_found_ttl_s=args.not_found_ttl_days * 86400)
+    seed_path = Path(args.cache_seed) if args.cache_seed else None
+    if cache.is_empty() and seed_path is not None and seed_path.exists():
+        imported = cache.import_json(seed_path)
+        print(f"[CACHE] {imported} entradas importadas de {seed_path}", flush=True)
+    if args.refresh_not_found:
+        print(f"[CACHE] {cache.evict(status='not_found')} entradas not_found removidas", flush=True)
+    if args.cache_max_age_days > 0:
+        evicted = cache.evict(older_than_s=args.cache_max_age_days * 86400)
+        print(f"[CACHE] {evicted} entradas antigas removidas", flush=True)
+    return cache
+
+
+def city_time_profiles(args: argparse.Namespace, city: dict[str, Any]) -> tuple[str, dict[str, Any] | None]:
+    """Caminho e perfis de faixa horaria da cidade; None com 'off' ou em --stream (camadas ignoradas)."""
+    path = str(city.get("time_profiles", args.time_profiles))
+    if path == "off" or args.stream:
+        return path, None
+    if not resolve_profiles_path(path).is_file():
         raise RuntimeError(
-            "Provider 'google' exige API key. "
-            "Use --google-api-key ou env GOOGLE_MAPS_API_KEY.",
+            f"Perfis de faixa horaria nao encontrados: {path} (caminho relativo ao diretorio atual; "
+            "informe --time-profiles ou use --time-profiles off)."
         )
+    return path, load_time_profiles(path)
+
+
+def run_city(
+    args: argparse.Namespace,
+    city: dict[str, Any],
+    cache: GeocodeCache,
+    limiters: dict[str, TokenBucket],
+    osrm_limiter: TokenBucket,
+    geocode_pool: ThreadPoolExecutor | None = None,
+    osrm_pool: ThreadPoolExecutor | None = None,
+    query_pool: ThreadPoolExecutor | None = None,
+) -> dict[str, Any]:
+    """Geocodifica, monta e grava a matriz de uma cidade; retorna a entrada do indice."""
+    in_path = Path(city["bairros_file"])
+    out_path = Path(city["output"])
+    cache_path = Path(args.cache)
+
+    # Validados antes de geocode/OSRM: um perfil ausente ou invalido falharia so depois da matriz pronta.
+    time_profiles_path, profiles = city_time_profiles(args, city)
+    neighbor_limit = parse_neighbor_limit(city.get("neighbors", args.neighbors))
+
+    bairros = parse_bairros(in_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    ruacep_index = parse_ruacep_index(args.ruacep_pages) if args.provider == "google" else None
+    ruacep_index: dict[str, dict[str, str]] | None = None
     ruacep_context_cache: dict[str, dict[str, Any]] = {}
+    ruacep_fetch: Callable[[str], dict[str, Any]] = parse_ruacep_context
+    page_cache: PageCache | None = None
+    if args.provider == "google":
+        # So bairros ainda sem geocode precisam do contexto de logradouros.
+        page_cache = PageCache(cache_path)
+        ruacep_limiter = TokenBucket(args.ruacep_qps, name="ruacep")
+        ruacep_max_age_s = args.ruacep_max_age_days * 86400
+        with REPORT.span("ruacep_prefetch", city=city["name"]):
+            ruacep_index, ruacep_context_cache = prefetch_ruacep(
+                int(city.get("ruacep_pages", args.ruacep_pages)),
+                [
+                b["name"]
+                for b in bairros
+                if args.points_per_bairro > 0 or cache.get("google", city["cache_prefix"] + b["name"]) is None
+            ],
+                page_cache,
+                workers=args.ruacep_workers,
+                limiter=ruacep_limiter,
+                max_age_s=ruacep_max_age_s,
+                base_url=city["ruacep_base_url"],
+                executor=geocode_pool,
+            )
+        # Contexto que o prefetch nao trouxe (pagina com erro) sai no geocode, pelo mesmo cache e limite.
+        ruacep_fetch = partial(
+            fetch_ruacep_context, page_cache=page_cache, limiter=ruacep_limiter, max_age_s=ruacep_max_age_s
+        )
 
+    print(f"[INFO] Cidade: {city['name']}-{city['state']}", flush=True)
     print(f"[INFO] Bairros lidos: {len(bairros)}", flush=True)
     print(f"[INFO] Provider de geocoding: {args.provider}", flush=True)
     if ruacep_index is not None:
         print(f"[INFO] RuaCEP indexado: {len(ruacep_index)} bairros", flush=True)
-    for idx, bairro in enumerate(bairros, start=1):
-        name = bairro["name"]
-        geo = geocode_bairro(
-            name=name,
-            cache=cache,
-            geocode_delay=args.geocode_delay,
-            provider=args.provider,
-            google_api_key=args.google_api_key,
-            city_query=args.city_query,
-            ruacep_index=ruacep_index,
-            ruacep_context_cache=ruacep_context_cache,
-        )
+    try:
+        with REPORT.span("geocode", city=city["name"], bairros=len(bairros)):
+            geo_results = geocode_bairros(
+                [b["name"] for b in bairros],
+                workers=args.geocode_workers,
+                executor=geocode_pool,
+                query_workers=args.geocode_query_workers,
+                query_executor=query_pool,
+                cache=cache,
+                limiters=limiters,
+                provider=args.provider,
+                google_api_key=args.google_api_key,
+                city=city,
+                ruacep_index=ruacep_index,
+                ruacep_context_cache=ruacep_context_cache,
+                ruacep_fetch=ruacep_fetch,
+            )
+    finally:
+        if page_cache is not None:
+            page_cache.close()
+    for bairro, geo in zip(bairros, geo_results):
         bairro["status"] = geo.get("status")
         if geo.get("status") == "ok":
             bairro["lat"] = float(geo["lat"])
@@ -678,70 +2573,415 @@ def main() -> None:
             bairro["geocode_display_name"] = None
             bairro["geocode_error"] = geo.get("error")
 
-        print(
-            f"[GEOCODE] {idx:03d}/{len(bairros)} "
-            f"{name}: {bairro['status']}",
-            flush=True,
-        )
-
-    cache_path.write_text(
-        json.dumps(cache, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
-
-    distance_m, duration_s, resolved = build_matrix(bairros, block_size=args.block_size)
-
-    unresolved = [b["name"] for b in bairros if b.get("lat") is None or b.get("lon") is None]
-    status_counts = Counter(b.get("status", "unknown") for b in bairros)
-    non_null_cells = sum(
-        1
-        for r in range(len(bairros))
-        for c in range(len(bairros))
-        if distance_m[r][c] is not None and duration_s[r][c] is not None
-    )
-    total_cells = len(bairros) * len(bairros)
+    # Contexto RuaCEP por bairro: do prefetch ou o gravado junto do geocode.
+    contexts_by_bairro: dict[str, dict[str, Any]] = {}
+    for bairro, geo in zip(bairros, geo_results):
+        entry = (ruacep_index or {}).get(normalize_key(bairro["name"]))
+        ctx = ruacep_context_cache.get(entry["slug"]) if entry else None
+        ctx = ctx or geo.get("ruacep_context")
+        if ctx:
+            contexts_by_bairro[bairro["name"]] = ctx
+
+    if args.points_per_bairro > 0 and (args.stream or args.provider != "google"):
+        print("[INFO] --points-per-bairro ignorado (exige provider google e matriz completa).", flush=True)
+    elif args.points_per_bairro > 0:
+        with REPORT.span("geocode_points", city=city["name"]) as span:
+            span["points"] = geocode_sub_points(
+                bairros,
+                {name: ctx.get("streets", []) for name, ctx in contexts_by_bairro.items()},
+                workers=args.geocode_workers,
+                executor=geocode_pool,
+                points_per_bairro=args.points_per_bairro,
+                cache=cache,
+                limiter=limiters["google"],
+                google_api_key=args.google_api_key,
+                city=city,
+                max_distance_m=args.points_max_distance_m,
+            )
+        print(f"[INFO] Pontos de logradouro geocodificados: {span['points']}", flush=True)
 
-    result = {
+    bin_path = Path(city["binary_output"]) if city.get("binary_output") else out_path.with_suffix(".bin")
+    order = [b["name"] for b in bairros]
+    head = {
         "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
-        "city": {"name": "Imperatriz", "state": "MA", "country": "BR"},
+        "city": {"name": city["name"], "state": city["state"], "country": city["country"]},
         "source": {
             "bairros_file": str(in_path),
             "geocoding": args.provider,
-            "routing": "OSRM public table API (driving)",
-        },
-        "metrics": {
-            "total_bairros": len(bairros),
-            "geocoded_bairros": int(status_counts.get("ok", 0)),
-            "unresolved_bairros": len(unresolved),
-            "matrix_cells_total": total_cells,
-            "matrix_cells_with_route": non_null_cells,
-            "coverage_percent": round((non_null_cells / total_cells) * 100, 2) if total_cells else 0,
-            "pairs_directed": len(bairros) * (len(bairros) - 1),
-            "pairs_undirected": (len(bairros) * (len(bairros) - 1)) // 2,
-            "status_breakdown": dict(status_counts),
-        },
-        "unresolved_bairros": unresolved,
-        "bairros": bairros,
-        "matrix": {
-            "units": {"distance": "meters", "duration": "seconds"},
-            "order": [b["name"] for b in bairros],
-            "distance_m": distance_m,
-            "duration_s": duration_s,
+            "routing": (
+                "OSRM public table API (driving)"
+                if "router.project-osrm.org" in args.osrm_url
+                else f"OSRM-compatible table API ({args.osrm_url})"
+            ),
         },
     }
 
-    out_path.write_text(
-        json.dumps(result, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    pg_export_dir = city.get("pg_export_dir")
+    previous_snapshot: Path | None = None
+    if pg_export_dir:
+        # A matriz anterior precisa ser copiada antes de a saida ser sobrescrita. Vira um RBMX no
+        # diretorio do export, lido via mmap no diff (sem as n*n celulas em memoria, inclusive em --stream).
+        pg_previous = city.get("pg_previous")
+        previous_path = Path(pg_previous) if pg_previous else (bin_path if bin_path.exists() else out_path)
+        if previous_path.exists():
+            previous_snapshot = Path(pg_export_dir) / "previous.bin"
+            previous_snapshot.parent.mkdir(parents=True, exist_ok=True)
+            if previous_path.suffix.lower() == ".bin":
+                shutil.copyfile(previous_path, previous_snapshot)
+            else:
+                convert_json(previous_path, previous_snapshot)
+
+    if args.stream and args.sanity_check:
+        print("[INFO] Sanity check ignorado em --stream (exige a matriz completa).", flush=True)
+    if args.stream and time_profiles_path != "off":
+        print("[INFO] Camadas por faixa horaria ignoradas em --stream.", flush=True)
+    if args.stream and neighbor_limit is not None:
+        print("[INFO] Listas de vizinhos ignoradas em --stream.", flush=True)
+
+    journal_path = osrm_journal_path(args, city, out_path)
+    journal = OsrmBlockJournal(journal_path, args.osrm_url, resume=args.resume) if journal_path else None
+    if journal is not None and len(journal):
+        print(f"[OSRM] journal: {len(journal)} blocos retomados de {journal_path}", flush=True)
+
+    if args.stream:
+        unresolved, _ = build_metrics(bairros, 0)
+        json_writer = StreamingMatrixJsonWriter(
+            out_path,
+            {**head, "unresolved_bairros": unresolved, "bairros": bairros},
+            order,
+        )
+        bin_writer = MatrixBinStreamWriter(bin_path, order)
+        with REPORT.span("matrix", city=city["name"], mode="stream"):
+            non_null_cells = stream_matrix(
+                bairros,
+                json_writer,
+                bin_writer,
+                block_size=args.block_size,
+                workers=args.osrm_workers,
+                limiter=osrm_limiter,
+                executor=osrm_pool,
+                journal=journal,
+            )
+        _, metrics = build_metrics(bairros, non_null_cells)
+        with REPORT.span("json_write", city=city["name"], mode="stream"):
+            json_writer.close({"metrics": metrics})
+        with REPORT.span("bin_write", city=city["name"], mode="stream"):
+            bin_writer.close()
+        print(f"[DONE] JSON salvo em: {out_path}", flush=True)
+        print(f"[DONE] Matriz binaria salva em: {bin_path}", flush=True)
+    else:
+        matrix_kwargs = {
+            "block_size": args.block_size,
+            "workers": args.osrm_workers,
+            "limiter": osrm_limiter,
+            "symmetric": args.osrm_symmetric,
+            "symmetric_tolerance": args.osrm_symmetric_tolerance,
+            "executor": osrm_pool,
+            "journal": journal,
+        }
+        incremental_summary: dict[str, Any] | None = None
+        if args.incremental and out_path.exists():
+            with REPORT.span("json_load", city=city["name"]):
+                previous = json.loads(out_path.read_text(encoding="utf-8"))
+            with REPORT.span("matrix", city=city["name"], mode="incremental"):
+                distance_m, duration_s, resolved, incremental_summary = build_matrix_incremental(
+                    bairros,
+                    previous,
+                    **matrix_kwargs,
+                )
+            print(
+                "[INFO] Incremental: "
+                f"{incremental_summary['reused_bairros']} reaproveitados, "
+                f"{len(incremental_summary['recomputed_bairros'])} recalculados",
+                flush=True,
+            )
+        else:
+            with REPORT.span("matrix", city=city["name"], mode="full"):
+                distance_m, duration_s, resolved = build_matrix(bairros, **matrix_kwargs)
+
+        # Antes do sanity: a checagem vale para a matriz final, medianas incluidas.
+        multipoint_summary: dict[str, Any] | None = None
+        if any(b.get("points") for b in bairros):
+            with REPORT.span("multipoint", city=city["name"]):
+                multipoint_summary = apply_multipoint_routes(bairros, distance_m, duration_s, **matrix_kwargs)
+            print(
+                f"[INFO] Multiponto: {multipoint_summary['cells_replaced']} celulas pela mediana "
+                f"({multipoint_summary['points']} pontos)",
+                flush=True,
+            )
+
+        sanity_summary: dict[str, Any] | None = None
+        if args.sanity_check and resolved:
+            with REPORT.span("sanity", city=city["name"]) as span:
+                sanity_summary = sanity_check_matrix(
+                    bairros,
+                    distance_m,
+                    duration_s,
+                    {
+                        "max_ratio": args.sanity_max_ratio,
+                        "min_ratio": args.sanity_min_ratio,
+                        "asymmetry": args.sanity_asymmetry,
+                        "triangle": args.sanity_triangle,
+                        "triangle_neighbors": args.sanity_triangle_neighbors,
+                    },
+                    action=args.sanity_action,
+                    workers=args.osrm_workers,
+                    limiter=osrm_limiter,
+                    executor=osrm_pool,
+                )
+                span["flagged_cells"] = sanity_summary.get("flagged_cells")
+
+        non_null_cells = sum(
+            1
+            for r in range(len(bairros))
+            for c in range(len(bairros))
+            if distance_m[r][c] is not None and duration_s[r][c] is not None
+        )
+        unresolved, metrics = build_metrics(bairros, non_null_cells)
+        if incremental_summary is not None:
+            metrics["incremental"] = incremental_summary
+        if multipoint_summary is not None:
+            metrics["sub_bairro"] = {"points_per_bairro": args.points_per_bairro, **multipoint_summary}
+        if sanity_summary is not None:
+            metrics["sanity"] = sanity_summary
+
+        extra_sections: dict[str, bytes] = {}
+        base_duration = array("I", (NULL_U32 if v is None else int(v) for row in duration_s for v in row))
+        if profiles is not None:
+            with REPORT.span("time_layers", city=city["name"]):
+                extra_sections.update(layer_sections(order, base_duration, profiles))
+            metrics["time_buckets"] = {
+                "profiles": str(time_profiles_path),
+                "version": profiles.get("version"),
+                "buckets": [bucket["name"] for bucket in profiles["buckets"]],
+                "default_bucket": profiles.get("default_bucket", profiles["buckets"][-1]["name"]),
+            }
+        if neighbor_limit is not None:
+            base_distance = array("I", (NULL_U32 if v is None else int(v) for row in distance_m for v in row))
+            with REPORT.span("neighbor_lists", city=city["name"]):
+                extra_sections.update(neighbor_sections(len(order), base_distance, base_duration, neighbor_limit))
+            metrics["neighbors"] = {"limit": neighbor_limit, "orders": ["duration", "distance"]}
+
+        result = {
+            **head,
+            "metrics": metrics,
+            "unresolved_bairros": unresolved,
+            "bairros": bairros,
+            "matrix": {
+                "units": {"distance": "meters", "duration": "seconds"},
+                "order": order,
+                "distance_m": distance_m,
+                "duration_s": duration_s,
+            },
+        }
+
+        with REPORT.span("json_write", city=city["name"]) as span:
+            payload = json.dumps(result, ensure_ascii=False, indent=2)
+            out_path.write_text(payload, encoding="utf-8")
+            span["bytes"] = len(payload)
+        print(f"[DONE] JSON salvo em: {out_path}", flush=True)
+
+        with REPORT.span("bin_write", city=city["name"]):
+            write_matrix_bin(bin_path, order, distance_m, duration_s, extra_sections)
+        print(f"[DONE] Matriz binaria salva em: {bin_path}", flush=True)
+
+    if journal is not None:
+        # Matriz gravada: o journal so serve para retomar uma execucao interrompida.
+        journal.close(remove=True)
 
-    print(f"[DONE] JSON salvo em: {out_path}", flush=True)
+    names_path = (
+        Path(city["name_index_output"]) if city.get("name_index_output") else out_path.with_suffix(".names.json")
+    )
+    with REPORT.span("name_index_write", city=city["name"]):
+        write_name_index(names_path, build_name_index(order, ruacep_index))
+    print(f"[DONE] Indice de nomes salvo em: {names_path}", flush=True)
+    spatial_path = (
+        Path(city["spatial_index_output"])
+        if city.get("spatial_index_output")
+        else out_path.with_suffix(".spatial.json")
+    )
+    # Contextos antigos (antes das listas completas) so trazem o primeiro CEP.
+    ceps_by_bairro = {
+        name: ctx.get("ceps") or [ctx["first_cep"]]
+        for name, ctx in contexts_by_bairro.items()
+        if ctx.get("first_cep")
+    }
+    with REPORT.span("spatial_index_write", city=city["name"]):
+        spatial_index = build_spatial_index(order, bairros, ceps_by_bairro)
+        write_spatial_index(spatial_path, spatial_index)
+    print(
+        f"[DONE] Indice espacial salvo em: {spatial_path} "
+        f"({len(spatial_index['points'])} pontos, {len(spatial_index['ceps'])} CEPs)",
+        flush=True,
+    )
+    if pg_export_dir:
+        source = {
+            "city": city["name"],
+            "state": city["state"],
+            "generated_at": head["generated_at"],
+            "source_file": str(out_path),
+        }
+        with REPORT.span("pg_export", city=city["name"], format=args.pg_export_format):
+            if previous_snapshot is not None:
+                with open_matrix(previous_snapshot) as previous_matrix:
+                    export = export_pg(bin_path, Path(pg_export_dir), previous_matrix, args.pg_export_format, source)
+                previous_snapshot.unlink(missing_ok=True)
+            else:
+                export = export_pg(bin_path, Path(pg_export_dir), None, args.pg_export_format, source)
+        print(
+            f"[DONE] Export PG: {export['upsert_cells']} celulas para upsert "
+            f"({export['new']} novas, {export['changed']} alteradas, {export['unchanged']} iguais) "
+            f"em {pg_export_dir}",
+            flush=True,
+        )
     print(
-        "[DONE] Cobertura: "
-        f"{result['metrics']['coverage_percent']}% "
-        f"({result['metrics']['matrix_cells_with_route']}/{result['metrics']['matrix_cells_total']})",
+        f"[DONE] Cobertura {city['name']}-{city['state']}: "
+        f"{metrics['coverage_percent']}% "
+        f"({metrics['matrix_cells_with_route']}/{metrics['matrix_cells_total']})",
         flush=True,
     )
+    return {
+        "name": city["name"],
+        "state": city["state"],
+        "country": city["country"],
+        "generated_at": head["generated_at"],
+        "bairros_file": str(in_path),
+        "output": str(out_path),
+        "binary_output": str(bin_path),
+        "name_index_output": str(names_path),
+        "spatial_index_output": str(spatial_path),
+        "total_bairros": metrics["total_bairros"],
+        "unresolved_bairros": metrics["unresolved_bairros"],
+        "coverage_percent": metrics["coverage_percent"],
+    }
+
+
+def load_manifest(path: Path) -> tuple[list[dict[str, Any]], Path]:
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    cities = []
+    for entry in manifest.get("cities", []):
+        missing = [key for key in ("name", "state", "bairros_file", "output") if not entry.get(key)]
+        if missing:
+            raise RuntimeError(f"Cidade do manifest sem {', '.join(missing)}: {entry}")
+        cities.append(city_profile(entry))
+    if not cities:
+        raise RuntimeError(f"Manifest sem cidades: {path}")
+    index_output = Path(manifest.get("index_output") or path.with_suffix(".index.json"))
+    return cities, index_output
+
+
+def osrm_journal_path(args: argparse.Namespace, city: dict[str, Any], out_path: Path) -> Path | None:
+    # Com --manifest cada cidade tem o seu (chave "osrm_journal" ou ao lado da saida).
+    setting = city.get("osrm_journal") or ("off" if args.osrm_journal == "off" else "")
+    if setting == "off":
+        return None
+    return Path(setting) if setting else out_path.with_suffix(".osrm-journal.jsonl")
+
+
+def run_report_path(args: argparse.Namespace) -> Path | None:
+    if args.run_report == "off":
+        return None
+    if args.run_report:
+        return Path(args.run_report)
+    if args.manifest:
+        _, index_output = load_manifest(Path(args.manifest))
+        return index_output.with_suffix(".run.jsonl")
+    return Path(args.output).with_suffix(".run.jsonl")
+
+
+def main() -> None:
+    global REPORT
+    args = parse_args()
+    configure_http(args)
+
+    if args.stream and (args.incremental or args.osrm_symmetric != "off"):
+        raise RuntimeError("--stream nao suporta --incremental nem --osrm-symmetric.")
+
+    if args.provider == "google" and not args.google_api_key.strip() and args.http_mode != "replay":
+        raise RuntimeError(
+            "Provider 'google' exige API key. "
+            "Use --google-api-key ou env GOOGLE_MAPS_API_KEY.",
+        )
+
+    if args.manifest:
+        cities, index_output = load_manifest(Path(args.manifest))
+        if args.pg_previous and len(cities) > 1:
+            raise RuntimeError("--pg-previous com --manifest exige uma so cidade; use a chave pg_previous por cidade.")
+        # Flags globais do export PG valem para as cidades sem a chave no manifest.
+        for city in cities:
+            if args.pg_export_dir:
+                city.setdefault("pg_export_dir", str(Path(args.pg_export_dir) / city_slug(city["name"])))
+            if args.pg_previous:
+                city.setdefault("pg_previous", args.pg_previous)
+    else:
+        cities = [
+            city_profile(
+                {
+                    **DEFAULT_CITY,
+                    "city_query": args.city_query,
+                    "ruacep_base_url": args.ruacep_base_url,
+                    "bairros_file": args.input,
+                    "output": args.output,
+                    "binary_output": args.binary_output,
+                    "name_index_output": args.name_index_output,
+                    "pg_export_dir": args.pg_export_dir,
+                    "pg_previous": args.pg_previous,
+                    "osrm_journal": args.osrm_journal,
+                }
+            )
+        ]
+    # Falha antes de abrir cache/rede se o perfil de alguma cidade nao carrega.
+    for city in cities:
+        city_time_profiles(args, city)
+        parse_neighbor_limit(city.get("neighbors", args.neighbors))
+
+    report_path = run_report_path(args)
+    REPORT = RunReport(report_path, meta={"provider": args.provider, "http_mode": args.http_mode})
+
+    with REPORT.span("cache_load"):
+        cache = open_geocode_cache(args, Path(args.cache))
+    # Limiters unicos: todas as cidades dividem a mesma cota de cada provider.
+    limiters = build_rate_limiters(args.geocode_delay, args.google_qps)
+    osrm_limiter = TokenBucket(args.osrm_qps, name="osrm")
+
+    if args.manifest:
+        manifest_path = Path(args.manifest)
+        # Cada cidade roda numa thread coordenadora; o trabalho de rede vai para
+        # os pools compartilhados, dimensionados por --geocode-workers/--osrm-workers.
+        with ThreadPoolExecutor(max_workers=max(1, args.geocode_workers)) as geocode_pool, ThreadPoolExecutor(
+            max_workers=max(1, args.geocode_workers * args.geocode_query_workers)
+        ) as query_pool, ThreadPoolExecutor(max_workers=max(1, args.osrm_workers)) as osrm_pool, ThreadPoolExecutor(
+            max_workers=len(cities)
+        ) as city_pool:
+            futures = [
+                city_pool.submit(
+                    run_city, args, city, cache, limiters, osrm_limiter, geocode_pool, osrm_pool, query_pool
+                )
+                for city in cities
+            ]
+            entries = [future.result() for future in futures]
+        index = {
+            "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "manifest": str(manifest_path),
+            "cities": entries,
+        }
+        index_output.parent.mkdir(parents=True, exist_ok=True)
+        with REPORT.span("index_write"):
+            index_output.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+    else:
+        run_city(args, cities[0], cache, limiters, osrm_limiter)
+
+    seed_path = Path(args.cache_seed) if args.cache_seed else None
+    with REPORT.span("cache_save", export_json=bool(args.export_json_cache and seed_path is not None)):
+        if args.export_json_cache and seed_path is not None:
+            cache.export_json(seed_path)
+        cache.close()
+    HTTP_CLIENT.log_stats()
+    if args.manifest:
+        print(f"[DONE] Indice de cidades salvo em: {index_output}", flush=True)
+    REPORT.close({"http": {host: dict(stats) for host, stats in sorted(HTTP_CLIENT.stats.items())}})
+    if report_path is not None:
+        print(f"[DONE] Relatorio de execucao salvo em: {report_path}", flush=True)
 
 
 if __name__ == "__main__":
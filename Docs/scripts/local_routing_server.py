@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Servidor local compativel com o endpoint `table` do OSRM.
+
+Substitui o OSRM publico em execucoes offline (CI, benchmark): distancia =
+haversine x fator de desvio, duracao = distancia / velocidade media. Nao e
+roteamento real; serve para exercitar o pipeline de ponta a ponta.
+
+Uso:
+  python Docs/scripts/local_routing_server.py --port 5055
+  python Docs/scripts/generate_imperatriz_bairro_matrix.py \
+    --osrm-url http://127.0.0.1:5055/table/v1/driving ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def parse_indices(raw: str | None, total: int) -> list[int]:
+    if not raw or raw == "all":
+        return list(range(total))
+    return [int(part) for part in raw.split(";") if part != ""]
+
+
+def table_response(
+    coords_path: str,
+    query: dict[str, list[str]],
+    detour_factor: float,
+    speed_kmh: float,
+) -> dict[str, object]:
+    coords: list[tuple[float, float]] = []
+    for pair in coords_path.split(";"):
+        lon, lat = pair.split(",")
+        coords.append((float(lat), float(lon)))
+
+    sources = parse_indices(query.get("sources", [None])[0], len(coords))
+    destinations = parse_indices(query.get("destinations", [None])[0], len(coords))
+    speed_ms = speed_kmh / 3.6
+
+    distances: list[list[float]] = []
+    durations: list[list[float]] = []
+    for s in sources:
+        d_row: list[float] = []
+        t_row: list[float] = []
+        for t in destinations:
+            dist = haversine_m(*coords[s], *coords[t]) * detour_factor
+            d_row.append(round(dist, 1))
+            t_row.append(round(dist / speed_ms, 1))
+        distances.append(d_row)
+        durations.append(t_row)
+
+    return {"code": "Ok", "distances": distances, "durations": durations}
+
+
+def make_handler(detour_factor: float, speed_kmh: float) -> type[BaseHTTPRequestHandler]:
+    class TableHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args: object) -> None:
+            return
+
+        def _send_json(self, status: int, payload: dict[str, object]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            gzip_ok = "gzip" in self.headers.get("Accept-Encoding", "")
+            if gzip_ok:
+                body = gzip.compress(body)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if gzip_ok:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            parsed = urllib.parse.urlsplit(self.path)
+            prefix = "/table/v1/"
+            if not parsed.path.startswith(prefix):
+                self._send_json(404, {"code": "InvalidUrl", "message": "Use /table/v1/<profile>/<coords>"})
+                return
+            try:
+                _profile, coords_path = parsed.path[len(prefix) :].split("/", 1)
+                payload = table_response(
+                    urllib.parse.unquote(coords_path),
+                    urllib.parse.parse_qs(parsed.query),
+                    detour_factor,
+                    speed_kmh,
+                )
+            except (ValueError, IndexError) as exc:
+                self._send_json(400, {"code": "InvalidQuery", "message": str(exc)})
+                return
+            self._send_json(200, payload)
+
+    return TableHandler
+
+
+def start_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    detour_factor: float = 1.3,
+    speed_kmh: float = 30.0,
+) -> ThreadingHTTPServer:
+    """Sobe o servidor em thread daemon; `server.server_port` da a porta real."""
+    server = ThreadingHTTPServer((host, port), make_handler(detour_factor, speed_kmh))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor local compativel com OSRM table.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--detour-factor", type=float, default=1.3, help="Multiplicador sobre o haversine (default: 1.3).")
+    parser.add_argument("--speed-kmh", type=float, default=30.0, help="Velocidade media urbana (default: 30).")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.detour_factor, args.speed_kmh))
+    print(f"[INFO] OSRM local em http://{args.host}:{server.server_port}/table/v1/driving", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
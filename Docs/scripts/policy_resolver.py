@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""Resolucao `ordered_failover` de um dominio da politica de frete.
+
+Implementa, para um dominio de `domains` em
+`Docs/config/freight-fallback-policy.json`:
+  - providers em ordem de `priority` (so `enabled`), cada um com
+    `timeout_ms`, `max_retries`/`retry_backoff_ms` e `success_requirements`;
+  - circuit breaker por provider (`circuit_breaker`: failure_threshold,
+    open_seconds, half_open_max_requests);
+  - cache LRU com TTL e stale-while-revalidate (`cache.ttl_seconds` e
+    `cache.stale_while_revalidate_seconds`): entrada velha dentro da janela
+    e servida na hora e revalidada em background;
+  - misses concorrentes da mesma chave coalescidos em uma unica resolucao;
+  - `on_all_fail.action`: "apply_default" devolve `on_all_fail.default` com
+    `default_applied`; so vai para o cache num miss de verdade (nunca por
+    cima de entrada velha de provider) e a proxima leitura dele reagenda os
+    providers em background (com `retry_default=False` o default vale o TTL
+    como qualquer entrada). Qualquer outra acao levanta ResolveError com `code`.
+
+Providers sao callables `fetch(request) -> dict` que levantam ProviderError;
+`local_file` roda na thread do chamador, `http_api` no pool com o timeout
+da politica (o chamador nao espera alem dele). Os modulos de dominio
+(`distance_time_resolver.py`, `climate_resolver.py`) montam os providers e a chave de cache.
+"""
+
+from __future__ import annotations
+
+import operator
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+DEFAULT_MAX_ENTRIES = 100_000
+REQUIREMENT_RE = re.compile(r"^\s*(\w+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$")
+REQUIREMENT_OPS: dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+Provider = Callable[[dict[str, Any]], dict[str, Any]]
+
+
+class ProviderError(RuntimeError):
+    """Falha de um provider (a resolucao segue para o proximo)."""
+
+
+class ProviderTimeout(ProviderError):
+    pass
+
+
+class ResolveError(RuntimeError):
+    """Nenhum provider resolveu; `code`/`message` vem de `on_all_fail`."""
+
+    def __init__(self, code: str, message: str, errors: list[str] | None = None) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.errors = errors or []
+
+
+def compile_requirements(requirements: list[str]) -> Callable[[dict[str, Any]], str | None]:
+    """`["distance_m > 0", ...]` -> funcao que devolve o primeiro requisito violado."""
+    checks: list[tuple[str, str, Callable[[Any, Any], bool], float]] = []
+    for raw in requirements:
+        match = REQUIREMENT_RE.match(raw)
+        if not match:
+            raise ValueError(f"success_requirement nao suportado: {raw!r}")
+        field, op, value = match.groups()
+        checks.append((raw, field, REQUIREMENT_OPS[op], float(value)))
+
+    def violated(result: dict[str, Any]) -> str | None:
+        for raw, field, op, value in checks:
+            current = result.get(field)
+            if not isinstance(current, (int, float)) or not op(current, value):
+                return raw
+        return None
+
+    return violated
+
+
+def authorized(spec: dict[str, Any], credential: str) -> tuple[str, dict[str, str]]:
+    """Endpoint e headers conforme `request.auth` da politica.
+
+    "query.<param>" e "header.<nome>" levam a chave; "user_agent_required"
+    leva `credential` como User-Agent (ex.: met.no).
+    """
+    endpoint = spec["request"]["endpoint"]
+    auth = spec["request"].get("auth", "")
+    if auth == "user_agent_required":
+        return endpoint, {"User-Agent": credential}
+    where, _, name = auth.partition(".")
+    if where == "query":
+        sep = "&" if "?" in endpoint else "?"
+        return f"{endpoint}{sep}{urllib.parse.urlencode({name: credential})}", {}
+    if where == "header":
+        return endpoint, {name: credential}
+    return endpoint, {}
+
+
+class SwrCache:
+    """LRU com TTL e janela de stale-while-revalidate (thread-safe)."""
+
+    def __init__(
+        self,
+        ttl_s: float,
+        stale_s: float = 0.0,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[dict[str, Any] | None, str]:
+        """(valor, "fresh" | "stale" | "miss")."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, "miss"
+            age = now - entry[0]
+            if age >= self.ttl_s + self.stale_s:
+                del self._entries[key]
+                return None, "miss"
+            self._entries.move_to_end(key)
+            return entry[1], "fresh" if age < self.ttl_s else "stale"
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SingleFlight:
+    """Uma execucao por chave; chamadas concorrentes esperam e recebem o mesmo resultado."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, dict[str, Any]] = {}
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """(resultado, compartilhado); `compartilhado` e True para quem so esperou."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "value": None, "error": None}
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"], True
+        try:
+            call["value"] = fn()
+        except BaseException as exc:
+            call["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["value"], False
+
+
+class CircuitBreaker:
+    """closed -> open apos `failure_threshold` falhas seguidas; depois de
+    `open_seconds`, half_open libera ate `half_open_max_requests` chamadas de
+    teste: um sucesso fecha, uma falha reabre.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        open_seconds: float = 60.0,
+        half_open_max_requests: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = float(open_seconds)
+        self.half_open_max_requests = max(1, int(half_open_max_requests))
+        self.clock = clock
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if self.clock() - self._opened_at < self.open_seconds:
+                    return False
+                self.state = "half_open"
+                self._trials = 0
+            if self.state == "half_open":
+                if self._trials >= self.half_open_max_requests:
+                    return False
+                self._trials += 1
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trials = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = self.clock()
+                self._trials = 0
+
+
+class OrderedFailoverResolver:
+    """Cache SWR + single-flight + providers em ordem com breaker por provider."""
+
+    def __init__(
+        self,
+        domain: dict[str, Any],
+        providers: dict[str, Provider],
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        workers: int = 16,
+        clock: Callable[[], float] = time.monotonic,
+        retry_default: bool = True,
+    ) -> None:
+        if domain.get("strategy") != "ordered_failover":
+            raise ValueError(f"Estrategia nao suportada: {domain.get('strategy')}")
+        self.domain = domain
+        self.retry_default = retry_default
+        self.stats: Counter[str] = Counter()
+        self._stats_lock = threading.Lock()
+        # Provider da politica sem implementacao/credencial fica de fora da cadeia.
+        self.specs = [
+            spec
+            for spec in sorted(domain.get("providers", []), key=lambda item: item.get("priority", 0))
+            if spec.get("enabled", True) and spec["id"] in providers
+        ]
+        self.skipped = [
+            spec["id"]
+            for spec in domain.get("providers", [])
+            if spec.get("enabled", True) and spec["id"] not in providers
+        ]
+        self.providers = providers
+        self.requirements = {
+            spec["id"]: compile_requirements(spec.get("success_requirements", [])) for spec in self.specs
+        }
+        self.breakers = {
+            spec["id"]: CircuitBreaker(clock=clock, **spec["circuit_breaker"])
+            for spec in self.specs
+            if spec.get("circuit_breaker")
+        }
+        cache_cfg = domain.get("cache", {})
+        self.cache = SwrCache(
+            float(cache_cfg.get("ttl_seconds", 0)),
+            float(cache_cfg.get("stale_while_revalidate_seconds", 0)),
+            max_entries=max_entries,
+            clock=clock,
+        )
+        self._flight = SingleFlight()
+        self._scheduled: set[str] = set()
+        self._scheduled_lock = threading.Lock()
+        self._calls = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="provider")
+        self._revalidate = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidate")
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def resolve(self, key: str, request: dict[str, Any]) -> dict[str, Any]:
+        """Resultado do provider + `provider`, `fallback_used`, `cache` ("hit"/"stale"/"miss")."""
+        value, state = self.cache.get(key)
+        if value is not None:
+            self._count(f"cache_{'hit' if state == 'fresh' else 'stale'}_total")
+            if not self._settled(value, state):
+                self._schedule(key, request, "revalidate_total")
+            return {**value, "cache": "hit" if state == "fresh" else "stale"}
+
+        self._count("cache_miss_total")
+        value, shared = self._flight.do(key, lambda: self._load(key, request))
+        if shared:
+            self._count("coalesced_total")
+        return {**value, "cache": "miss"}
+
+    def prefetch(self, key: str, request: dict[str, Any]) -> bool:
+        """Agenda a resolucao de `key` em background se ainda nao houver entrada fresca."""
+        value, state = self.cache.get(key)
+        if value is not None and self._settled(value, state):
+            return False
+        return self._schedule(key, request, "prefetch_total")
+
+    def _settled(self, value: dict[str, Any], state: str) -> bool:
+        """Entrada fresca que dispensa nova passada pelos providers."""
+        return state == "fresh" and not (self.retry_default and value.get("default_applied"))
+
+    def _schedule(self, key: str, request: dict[str, Any], counter: str) -> bool:
+        with self._scheduled_lock:
+            if key in self._scheduled:
+                return False
+            self._scheduled.add(key)
+        self._count(counter)
+        self._revalidate.submit(self._background_load, key, request)
+        return True
+
+    def _background_load(self, key: str, request: dict[str, Any]) -> None:
+        try:
+            self._flight.do(key, lambda: self._load(key, request))
+        except ResolveError:
+            # Nada foi para o cache: a entrada velha segue servida ate o fim da janela de stale.
+            self._count("background_error_total")
+        finally:
+            with self._scheduled_lock:
+                self._scheduled.discard(key)
+
+    def _load(self, key: str, request: dict[str, Any]) -> dict[str, Any]:
+        # Outra resolucao (background ou a anterior desta chave) pode ter terminado
+        # entre o miss do chamador e a entrada no single-flight.
+        current, state = self.cache.get(key)
+        if current is not None and self._settled(current, state):
+            return current
+        value = self._failover(request)
+        if value.get("default_applied") and current is not None and not current.get("default_applied"):
+            # Resultado velho de provider vale mais que o default: fica ate o fim da janela de stale.
+            return current
+        self.cache.put(key, value)
+        return value
+
+    def _failover(self, request: dict[str, Any]) -> dict[str, Any]:
+        errors: list[str] = []
+        for position, spec in enumerate(self.specs):
+            provider_id = spec["id"]
+            breaker = self.breakers.get(provider_id)
+            if breaker is not None and not breaker.allow():
+                self._count("provider_circuit_open_total")
+                errors.append(f"{provider_id}: circuito aberto")
+                continue
+            try:
+                result = self._call(spec, request)
+            except ProviderError as exc:
+                if breaker is not None:
+                    breaker.failure()
+                errors.append(f"{provider_id}: {exc}")
+                continue
+            if breaker is not None:
+                breaker.success()
+            if position > 0:
+                self._count("fallback_trigger_total")
+            self._count(f"provider_{provider_id}_total")
+            return {**result, "provider": provider_id, "fallback_used": position > 0}
+
+        on_all_fail = self.domain.get("on_all_fail", {})
+        if on_all_fail.get("action") == "apply_default":
+            self._count("default_applied_total")
+            default = on_all_fail.get("default", {})
+            return {
+                **default,
+                "provider": default.get("source", "default"),
+                "fallback_used": True,
+                "default_applied": True,
+                "errors": errors,
+            }
+        raise ResolveError(
+            on_all_fail.get("code", "UNAVAILABLE"),
+            on_all_fail.get("message", "Nenhum provider resolveu."),
+            errors,
+        )
+
+    def _call(self, spec: dict[str, Any], request: dict[str, Any]) -> dict[str, Any]:
+        provider = self.providers[spec["id"]]
+        timeout_s = float(spec.get("timeout_ms", 1000)) / 1000
+        backoff_s = float(spec.get("retry_backoff_ms", 0)) / 1000
+        attempts = 1 + int(spec.get("max_retries", 0))
+        error: ProviderError | None = None
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(backoff_s * attempt)
+            try:
+                if spec.get("kind") == "local_file":
+                    result = provider(request)
+                else:
+                    try:
+                        result = self._calls.submit(provider, request).result(timeout=timeout_s)
+                    except FutureTimeoutError as exc:
+                        self._count("provider_timeout_total")
+                        raise ProviderTimeout(f"timeout de {spec.get('timeout_ms')} ms") from exc
+            except ProviderError as exc:
+                error = exc
+                continue
+            violated = self.requirements[spec["id"]](result)
+            if violated is not None:
+                # Resposta valida mas fora do contrato: outra tentativa nao muda o dado.
+                raise ProviderError(f"requisito nao atendido: {violated}")
+            return result
+        assert error is not None
+        raise error
+
+    def breaker_states(self) -> dict[str, str]:
+        return {provider_id: breaker.state for provider_id, breaker in self.breakers.items()}
+
+    def close(self) -> None:
+        self._revalidate.shutdown(wait=False, cancel_futures=True)
+        self._calls.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Relatorio de execucao (JSON lines) do pipeline da matriz de bairros.
+
+Cada linha e um evento:
+  - {"type": "run_start", ...}: argv e horario de inicio;
+  - {"type": "span", "stage": ..., "duration_ms": ...}: um trecho cronometrado
+    (pagina do RuaCEP, consulta de geocode, bloco OSRM, escrita do JSON...),
+    com atributos livres e o span pai da mesma thread;
+  - {"type": "summary", ...}: totais por etapa, contadores e histogramas de
+    latencia por provider, e o tempo total.
+
+Sem caminho de saida o relatorio so agrega em memoria (o resumo continua
+disponivel via `summary()`).
+
+Uso (resumir um relatorio gravado):
+  python Docs/scripts/run_report.py Docs/data/imperatriz_bairros_matriz.run.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SECRET_FLAG_MARKERS = ("key", "token", "secret", "password")
+
+
+def redact_argv(argv: list[str]) -> list[str]:
+    """Mascara valores de flags de credencial (--google-api-key X / --x-key=X)."""
+    redacted: list[str] = []
+    hide_next = False
+    for arg in argv:
+        if hide_next:
+            redacted.append("***")
+            hide_next = False
+            continue
+        flag, sep, _value = arg.partition("=")
+        is_secret = flag.startswith("--") and any(marker in flag.lower() for marker in SECRET_FLAG_MARKERS)
+        if is_secret and sep:
+            redacted.append(f"{flag}=***")
+        else:
+            redacted.append(arg)
+            hide_next = is_secret
+    return redacted
+
+
+class Histogram:
+    """Histograma de latencia em buckets fixos (ms)."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        slot = len(LATENCY_BUCKETS_MS)
+        for k, bound in enumerate(LATENCY_BUCKETS_MS):
+            if value_ms <= bound:
+                slot = k
+                break
+        self.buckets[slot] += 1
+        self.count += 1
+        self.total += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> float:
+        # Limite superior do bucket que contem o quantil (o ultimo usa o maximo).
+        target = q * self.count
+        seen = 0
+        for k, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= target:
+                return min(float(LATENCY_BUCKETS_MS[k]), round(self.max, 1)) if k < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 1),
+            "avg_ms": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max, 1),
+            "buckets_ms": {
+                **{f"le_{bound}": n for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                "inf": self.buckets[-1],
+            },
+        }
+
+
+class RunReport:
+    """Spans e contadores thread-safe, gravados em JSON lines."""
+
+    def __init__(self, path: Path | None = None, meta: dict[str, Any] | None = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = time.perf_counter()
+        self._stages: dict[str, Histogram] = {}
+        self._errors: Counter[str] = Counter()
+        self._counters: dict[str, Counter[str]] = {}
+        self._latency: dict[str, Histogram] = {}
+        self._fh = None
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = path.open("w", encoding="utf-8")
+        self._write(
+            {
+                "type": "run_start",
+                "started_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "argv": redact_argv(sys.argv),
+                **(meta or {}),
+            }
+        )
+
+    def _write(self, event: dict[str, Any]) -> None:
+        if self._fh is None:
+            return
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Iterator[dict[str, Any]]:
+        """Cronometra o bloco; `attrs` pode ser enriquecido dentro do `with`."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else None
+        stack.append(stage)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield attrs
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            stack.pop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stages.setdefault(stage, Histogram()).observe(duration_ms)
+                if status == "error":
+                    self._errors[stage] += 1
+            self._write(
+                {
+                    "type": "span",
+                    "stage": stage,
+                    "parent": parent,
+                    "thread": threading.current_thread().name,
+                    "start_s": round(started - self._started, 4),
+                    "duration_ms": round(duration_ms, 2),
+                    "status": status,
+                    **attrs,
+                }
+            )
+
+    def count(self, provider: str, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters.setdefault(provider, Counter())[name] += value
+
+    def observe(self, provider: str, value_ms: float) -> None:
+        with self._lock:
+            self._latency.setdefault(provider, Histogram()).observe(value_ms)
+
+    def _provider_stats(self, provider: str) -> dict[str, Any]:
+        stats: dict[str, Any] = {
+            name: round(value, 3) for name, value in sorted(self._counters.get(provider, Counter()).items())
+        }
+        if provider in self._latency:
+            stats["latency"] = self._latency[provider].to_dict()
+        return stats
+
+    def summary(self, extra: dict[str, Any] | None = None) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "type": "summary",
+                "finished_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "wall_s": round(time.perf_counter() - self._started, 3),
+                "stages": {
+                    stage: {**hist.to_dict(), "errors": self._errors.get(stage, 0)}
+                    for stage, hist in sorted(self._stages.items())
+                },
+                "providers": {
+                    provider: self._provider_stats(provider)
+                    for provider in sorted(set(self._counters) | set(self._latency))
+                },
+                **(extra or {}),
+            }
+
+    def close(self, extra: dict[str, Any] | None = None) -> dict[str, Any]:
+        summary = self.summary(extra)
+        self._write(summary)
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resume um relatorio de execucao (JSON lines).")
+    parser.add_argument("input", help="Arquivo .run.jsonl gravado pelo gerador da matriz.")
+    args = parser.parse_args()
+
+    summary: dict[str, Any] | None = None
+    for line in Path(args.input).read_text(encoding="utf-8").splitlines():
+        event = json.loads(line)
+        if event.get("type") == "summary":
+            summary = event
+    if summary is None:
+        raise SystemExit(f"Relatorio sem resumo (execucao interrompida?): {args.input}")
+
+    print(f"wall: {summary['wall_s']}s", flush=True)
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_ms"]):
+        print(
+            f"{stage:<20} n={stats['count']:<6} total={stats['total_ms'] / 1000:8.2f}s "
+            f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms max={stats['max_ms']}ms",
+            flush=True,
+        )
+    for provider, counters in summary["providers"].items():
+        flat = {name: value for name, value in counters.items() if name != "latency"}
+        latency = counters.get("latency")
+        if latency:
+            flat["latency"] = f"n={latency['count']} p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms"
+        print(f"[{provider}] {flat}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
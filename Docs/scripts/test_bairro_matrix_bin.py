@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Testes do `bairro_matrix_bin.py`: ida e volta JSON -> RBMX -> leitor mmap.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from bairro_matrix_bin import HEADER, MAGIC, NULL_U32, SECTION, BinaryBairroMatrix, convert_json, write_matrix_bin
+
+ORDER = ["Centro", "Parque São José", "Vila Lobão", "Bacuri"]
+DISTANCE = [[0, 1200, None, 4100], [1300, 0, 2500, None], [None, 2400, 0, 3900], [4000, 0xFFFFFFFE, 3800, 0]]
+DURATION = [[0, 150, None, 420], [160, 0, 300, None], [None, 290, 0, 400], [410, 7, 380, 0]]
+
+
+class MatrixBinTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def assert_matrix(self, matrix: BinaryBairroMatrix) -> None:
+        self.assertEqual((matrix.n, matrix.order), (len(ORDER), ORDER))
+        for o, origin in enumerate(ORDER):
+            for d, destination in enumerate(ORDER):
+                dist, dur = DISTANCE[o][d], DURATION[o][d]
+                expected = None if dist is None or dur is None else (dist, dur)
+                self.assertEqual(matrix.lookup(o, d), expected, (origin, destination))
+                self.assertEqual(matrix.lookup_names(origin, destination), expected)
+        self.assertIsNone(matrix.lookup_names("Centro", "Inexistente"))
+
+    def test_json_round_trip(self) -> None:
+        json_path = self.dir / "m.json"
+        json_path.write_text(
+            json.dumps({"matrix": {"order": ORDER, "distance_m": DISTANCE, "duration_s": DURATION}}),
+            encoding="utf-8",
+        )
+        bin_path = self.dir / "m.bin"
+        convert_json(json_path, bin_path)
+        with BinaryBairroMatrix(bin_path) as matrix:
+            self.assert_matrix(matrix)
+            self.assertEqual(matrix.distance_m[2], NULL_U32)
+            self.assertEqual(bytes(matrix.section("order")).decode("utf-8"), "\n".join(ORDER))
+
+    def test_layout_and_extra_sections(self) -> None:
+        bin_path = self.dir / "m.bin"
+        write_matrix_bin(bin_path, ORDER, DISTANCE, DURATION, extra_sections={"meta": b'{"v":1}'})
+        raw = bin_path.read_bytes()
+        magic, _version, _reserved, n, section_count = HEADER.unpack_from(raw, 0)
+        self.assertEqual((magic, n, section_count), (MAGIC, len(ORDER), 4))
+        for k in range(section_count):
+            _tag, offset, _length = SECTION.unpack_from(raw, HEADER.size + k * SECTION.size)
+            self.assertEqual(offset % 8, 0)
+        with BinaryBairroMatrix(bin_path) as matrix:
+            self.assert_matrix(matrix)
+            self.assertEqual(bytes(matrix.section("meta")), b'{"v":1}')
+            # Little-endian no disco, qualquer que seja a plataforma.
+            offset, _length = matrix.sections["dist_m"]
+            self.assertEqual(struct.unpack_from("<I", raw, offset + 4)[0], 1200)
+
+    def test_rejects_other_files(self) -> None:
+        bad = self.dir / "bad.bin"
+        bad.write_bytes(b"XXXX" + bytes(64))
+        with self.assertRaisesRegex(ValueError, "RBMX"):
+            BinaryBairroMatrix(bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Testes do `bairro_matrix_neighbors.py`: k mais proximos e raio contra forca bruta.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import random
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+
+from bairro_matrix_bin import NULL_U32, write_matrix_bin
+from bairro_matrix_neighbors import NeighborMatrix, neighbor_sections, parse_neighbor_limit
+
+N = 40
+
+
+def random_matrix(seed: int) -> tuple[list[list[int | None]], list[list[int | None]]]:
+    """Valores pequenos (muitos empates) e ~10% de pares sem rota."""
+    rng = random.Random(seed)
+    distance: list[list[int | None]] = []
+    duration: list[list[int | None]] = []
+    for o in range(N):
+        dist_row: list[int | None] = []
+        dur_row: list[int | None] = []
+        for d in range(N):
+            routed = o == d or rng.random() > 0.1
+            dist_row.append(0 if o == d else rng.randint(1, 60) * 100 if routed else None)
+            dur_row.append(0 if o == d else rng.randint(1, 40) * 15 if routed else None)
+        distance.append(dist_row)
+        duration.append(dur_row)
+    return distance, duration
+
+
+def brute_force(values: list[int | None], other: list[int | None]) -> list[int]:
+    return sorted((j for j in range(N) if values[j] is not None and other[j] is not None), key=lambda j: (values[j], j))
+
+
+class NeighborMatrixTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.order = [f"Bairro {k}" for k in range(N)]
+        self.distance, self.duration = random_matrix(25)
+
+    def write(self, name: str, limit: int | None) -> Path:
+        path = self.dir / f"{name}.bin"
+        extra = None
+        if limit is not None:
+            flat = {
+                key: array("I", (NULL_U32 if v is None else v for row in rows for v in row))
+                for key, rows in (("distance", self.distance), ("duration", self.duration))
+            }
+            extra = neighbor_sections(N, flat["distance"], flat["duration"], limit)
+        write_matrix_bin(path, self.order, self.distance, self.duration, extra_sections=extra)
+        return path
+
+    def expected(self, origin: int, by: str) -> list[int]:
+        if by == "duration":
+            return brute_force(self.duration[origin], self.distance[origin])
+        return brute_force(self.distance[origin], self.duration[origin])
+
+    def test_nearest_and_within_match_brute_force(self) -> None:
+        # Com listas pre-calculadas e sem elas (ordena a linha na hora).
+        for path in (self.write("lists", 0), self.write("plain", None)):
+            with NeighborMatrix(path) as matrix:
+                for origin in range(N):
+                    for by, rows in (("duration", self.duration), ("distance", self.distance)):
+                        expected = self.expected(origin, by)
+                        for k in (1, 5, N, N + 3):
+                            got = matrix.nearest(origin, k, by)
+                            self.assertEqual([j for j, _dist, _dur in got], expected[:k], (path.name, origin, by, k))
+                            self.assertEqual(
+                                [(dist, dur) for _j, dist, dur in got],
+                                [(self.distance[origin][j], self.duration[origin][j]) for j in expected[:k]],
+                            )
+                        for radius in (0, 14, 15, 300, 1500, 10**6):
+                            got = [j for j, _dist, _dur in matrix.within(origin, radius, by)]
+                            self.assertEqual(got, [j for j in expected if rows[origin][j] <= radius])
+
+    def test_limit_caps_lists_and_radius(self) -> None:
+        with NeighborMatrix(self.write("top5", 5)) as matrix:
+            self.assertEqual(matrix.meta["limit"], 5)
+            for origin in range(N):
+                expected = self.expected(origin, "duration")[:5]
+                self.assertEqual([j for j, _dist, _dur in matrix.nearest(origin, 10)], expected)
+                within = [j for j, _dist, _dur in matrix.within(origin, 10**6)]
+                self.assertEqual(within, expected)
+
+    def test_parse_neighbor_limit(self) -> None:
+        self.assertEqual(
+            [parse_neighbor_limit(v) for v in ("off", "all", "", "12", 3, " OFF ")],
+            [None, 0, 0, 12, 3, None],
+        )
+        with self.assertRaises(ValueError):
+            parse_neighbor_limit("-1")
+
+
+if __name__ == "__main__":
+    unittest.main()
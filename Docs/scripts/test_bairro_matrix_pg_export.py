@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Testes do `bairro_matrix_pg_export.py`: diff de celulas, COPY BINARY e `load.sql`.
+
+O teste de carga roda o `load.sql` contra um PostgreSQL local descartavel
+(schema proprio, removido no fim) e so roda com `psql` no PATH e
+PGDATABASE (mais PGHOST/PGUSER/PGPASSWORD conforme o servidor) no ambiente.
+As tabelas vem de `Docs/database/roodi_schema.sql`, com as constraints reais.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+import uuid
+from array import array
+from pathlib import Path
+from typing import Any
+
+from bairro_matrix_bin import NULL_U32
+from bairro_matrix_pg_export import (
+    MATRIX_COLUMNS,
+    PGCOPY_SIGNATURE,
+    BinaryCopyWriter,
+    diff_cells,
+    export_pg,
+    open_matrix,
+)
+
+SCHEMA_SQL = Path(__file__).resolve().parents[1] / "database" / "roodi_schema.sql"
+N = NULL_U32
+
+
+def empty_summary() -> dict[str, int]:
+    return {"new": 0, "changed": 0, "unchanged": 0, "dropped": 0, "no_route": 0}
+
+
+def read_pgcopy(path: Path) -> tuple[bytes, list[list[bytes | None]]]:
+    """(cabecalho de 19 bytes, tuplas com os campos crus; None para NULL)."""
+    data = path.read_bytes()
+    header, pos = data[:19], 19
+    rows: list[list[bytes | None]] = []
+    while True:
+        (fields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if fields == -1:
+            break
+        row: list[bytes | None] = []
+        for _ in range(fields):
+            (size,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if size == -1:
+                row.append(None)
+                continue
+            row.append(data[pos : pos + size])
+            pos += size
+        rows.append(row)
+    assert pos == len(data), "bytes sobrando depois do trailer"
+    return header, rows
+
+
+def write_matrix_json(path: Path, order: list[str], distance: list[list[int | None]]) -> None:
+    duration = [[None if v is None else max(1, v // 10) for v in row] for row in distance]
+    payload = {
+        "city": {"name": "Cidade Teste", "state": "MA"},
+        "generated_at": "2026-01-01T00:00:00Z",
+        "matrix": {"order": order, "distance_m": distance, "duration_s": duration},
+    }
+    path.write_text(json.dumps(payload), encoding="utf-8")
+
+
+class DiffCellsTest(unittest.TestCase):
+    def test_without_previous_exports_every_routed_cell(self) -> None:
+        summary = empty_summary()
+        cells = list(diff_cells(["A", "B"], array("I", [0, 10, N, 0]), array("I", [0, 5, N, 0]), None, summary))
+        self.assertEqual(cells, [(0, 1, 10, 5)])
+        self.assertEqual(summary, {**empty_summary(), "new": 1, "no_route": 1})
+
+    def test_diff_by_name_against_reordered_previous(self) -> None:
+        # Anterior em outra ordem e com um bairro a menos: o diff casa por nome, nao por posicao.
+        previous = (["B", "A"], array("I", [0, 20, 10, 0]), array("I", [0, 9, 5, 0]))
+        order = ["A", "B", "C"]
+        distance = array("I", [0, 10, 30, 21, 0, N, 40, 50, 0])
+        duration = array("I", [0, 5, 3, 9, 0, N, 4, 5, 0])
+        summary = empty_summary()
+        cells = list(diff_cells(order, distance, duration, previous, summary))
+        self.assertEqual(cells, [(0, 2, 30, 3), (1, 0, 21, 9), (2, 0, 40, 4), (2, 1, 50, 5)])
+        self.assertEqual(summary, {"new": 3, "changed": 1, "unchanged": 1, "dropped": 0, "no_route": 1})
+
+    def test_lost_route_counts_as_dropped(self) -> None:
+        previous = (["A", "B"], array("I", [0, 10, 10, 0]), array("I", [0, 5, 5, 0]))
+        summary = empty_summary()
+        cells = list(diff_cells(["A", "B"], array("I", [0, N, 10, 0]), array("I", [0, N, 5, 0]), previous, summary))
+        self.assertEqual(cells, [])
+        self.assertEqual(summary, {**empty_summary(), "unchanged": 1, "dropped": 1})
+
+
+class BinaryCopyWriterTest(unittest.TestCase):
+    def test_tuple_encoding(self) -> None:
+        columns = (("id", "uuid"), ("n", "int4"), ("name", "text"), ("meta", "jsonb"))
+        bairro_id = "00000000-0000-0000-0000-000000000401"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "t.copy"
+            writer = BinaryCopyWriter(path, columns)
+            writer.write_row((bairro_id, -7, "São José", '{"a":1}'))
+            writer.write_row((None, None, None, None))
+            writer.close()
+            header, rows = read_pgcopy(path)
+
+        self.assertEqual(header, PGCOPY_SIGNATURE + b"\0\0\0\0" + b"\0\0\0\0")
+        self.assertEqual(len(PGCOPY_SIGNATURE), 11)
+        uuid_field, int_field, text_field, json_field = rows[0]
+        self.assertEqual(uuid_field, uuid.UUID(bairro_id).bytes)
+        self.assertEqual(len(int_field), 4)
+        self.assertEqual(struct.unpack(">i", int_field)[0], -7)
+        self.assertEqual(text_field.decode("utf-8"), "São José")
+        self.assertEqual(json_field, b'\x01{"a":1}')
+        self.assertEqual(rows[1], [None, None, None, None])
+
+    def test_export_binary_matches_csv_rows(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            matrix = Path(tmp) / "m.json"
+            write_matrix_json(matrix, ["Centro", "Bacuri"], [[0, 1200], [1300, 0]])
+            export_pg(matrix, Path(tmp) / "bin", copy_format="binary")
+            _header, rows = read_pgcopy(Path(tmp) / "bin" / "matrix.copy")
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(len(row) == len(MATRIX_COLUMNS) for row in rows))
+        self.assertEqual([struct.unpack(">i", row[2])[0] for row in rows], [1200, 1300])
+
+
+@unittest.skipUnless(shutil.which("psql") and os.getenv("PGDATABASE"), "sem psql/PGDATABASE para o PostgreSQL local")
+class LoadSqlTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.schema = f"roodi_export_test_{os.getpid()}"
+        self.env = {**os.environ, "PGOPTIONS": f"-c search_path={self.schema},public"}
+        ddl = SCHEMA_SQL.read_text(encoding="utf-8")
+        tables = [
+            re.search(rf"CREATE TABLE IF NOT EXISTS {table} \(.*?\n\);", ddl, re.S).group(0)
+            for table in ("locality_bairros", "locality_bairro_matrix")
+        ]
+        self.psql(f"CREATE SCHEMA {self.schema};")
+        self.addCleanup(self.psql, f"DROP SCHEMA {self.schema} CASCADE;")
+        self.psql("\n".join(tables))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def psql(self, sql: str | None = None, file: Path | None = None) -> str:
+        cmd = ["psql", "-X", "-q", "-t", "-A", "-v", "ON_ERROR_STOP=1"]
+        cmd += ["-f", str(file)] if file is not None else ["-c", sql or ""]
+        return subprocess.run(cmd, env=self.env, check=True, capture_output=True, text=True).stdout.strip()
+
+    def load(self, name: str, order: list[str], distance: list[list[int | None]], **kwargs: Any) -> dict[str, Any]:
+        matrix = self.tmp / f"{name}.json"
+        write_matrix_json(matrix, order, distance)
+        out = self.tmp / name
+        result = export_pg(matrix, out, **kwargs)
+        self.psql(file=out / "load.sql")
+        return result
+
+    def pairs(self) -> dict[tuple[str, str], int]:
+        rows = self.psql(
+            "SELECT o.normalized_name, d.normalized_name, m.distance_m FROM locality_bairro_matrix m "
+            "JOIN locality_bairros o ON o.id = m.origin_bairro_id "
+            "JOIN locality_bairros d ON d.id = m.destination_bairro_id"
+        )
+        return {(o, d): int(v) for o, d, v in (line.split("|") for line in rows.splitlines())}
+
+    def test_full_load_then_diff_upsert(self) -> None:
+        for copy_format in ("csv", "binary"):
+            with self.subTest(copy_format=copy_format):
+                self.psql("TRUNCATE locality_bairro_matrix, locality_bairros;")
+                first = self.tmp / f"first_{copy_format}.json"
+                self.load(
+                    f"first_{copy_format}",
+                    ["Centro", "Bacuri", "Parque São José"],
+                    [[0, 1000, 2000], [1100, 0, None], [2100, 2200, 0]],
+                    copy_format=copy_format,
+                )
+                self.assertEqual(
+                    self.pairs(),
+                    {
+                        ("centro", "bacuri"): 1000,
+                        ("centro", "sao jose"): 2000,
+                        ("bacuri", "centro"): 1100,
+                        ("sao jose", "centro"): 2100,
+                        ("sao jose", "bacuri"): 2200,
+                    },
+                )
+                self.assertEqual(
+                    self.psql("SELECT id FROM locality_bairros WHERE normalized_name = 'sao jose'"),
+                    "00000000-0000-0000-0000-000000000403",
+                )
+
+                # Diff: Parque Sao Jose sai, um par muda e um par ganha rota; o load reaplica sem duplicar.
+                with open_matrix(first) as previous:
+                    result = self.load(
+                        f"second_{copy_format}",
+                        ["Centro", "Bacuri"],
+                        [[0, 1500], [1100, 0]],
+                        previous=previous,
+                        copy_format=copy_format,
+                    )
+                self.assertEqual((result["changed"], result["unchanged"]), (1, 1))
+                self.assertEqual(result["removed_bairros"], ["sao jose"])
+                self.assertEqual(self.pairs(), {("centro", "bacuri"): 1500, ("bacuri", "centro"): 1100})
+                self.assertEqual(
+                    self.psql("SELECT is_active FROM locality_bairros WHERE normalized_name = 'sao jose'"), "f"
+                )
+                self.psql(file=self.tmp / f"second_{copy_format}" / "load.sql")
+                self.assertEqual(self.psql("SELECT count(*) FROM locality_bairro_matrix"), "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
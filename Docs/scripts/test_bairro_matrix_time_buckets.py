@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Testes do `bairro_matrix_time_buckets.py`: validacao do perfil, camadas e faixas.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import copy
+import datetime as dt
+import json
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+
+from bairro_matrix_bin import NULL_U32
+from bairro_matrix_time_buckets import (
+    DEFAULT_TIME_PROFILES,
+    build_duration_layers,
+    bucket_for,
+    layer_sections,
+    load_time_profiles,
+    resolve_profiles_path,
+)
+
+PROFILES = {
+    "timezone": "America/Fortaleza",
+    "utc_offset_hours": -3,
+    "default_bucket": "offpeak",
+    "buckets": [
+        {"name": "peak", "hours": [[18, 22]], "speed_factor": 0.5},
+        {"name": "night", "hours": [[22, 6]], "weekdays": [5, 6], "speed_factor": 2.0},
+        {"name": "offpeak", "speed_factor": 1.0},
+    ],
+    "corridors": [{"name": "centro", "bairros": ["Centro"], "speed_factors": {"peak": 0.25}}],
+}
+
+
+class TimeBucketsTest(unittest.TestCase):
+    def load(self, profiles: dict) -> dict:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "profiles.json"
+            path.write_text(json.dumps(profiles), encoding="utf-8")
+            return load_time_profiles(path)
+
+    def test_rejects_bad_corridor_factors(self) -> None:
+        for bad in (0, -1.5):
+            profiles = copy.deepcopy(PROFILES)
+            profiles["corridors"][0]["speed_factors"]["peak"] = bad
+            with self.assertRaisesRegex(ValueError, "Corredor centro"):
+                self.load(profiles)
+        profiles = copy.deepcopy(PROFILES)
+        profiles["corridors"][0]["speed_factors"] = {"rush": 0.5}
+        with self.assertRaisesRegex(ValueError, "faixa desconhecida"):
+            self.load(profiles)
+        self.assertEqual(self.load(PROFILES)["default_bucket"], "offpeak")
+
+    def test_layers_apply_bucket_and_corridor_factors(self) -> None:
+        order = ["Centro", "Bacuri"]
+        duration = array("I", [0, 100, 120, NULL_U32])
+        layers = build_duration_layers(order, duration, PROFILES)
+        # Par com o corredor usa o fator do corredor (o menor entre origem e destino).
+        self.assertEqual(list(layers["peak"]), [0, 400, 480, NULL_U32])
+        self.assertEqual(list(layers["night"]), [0, 50, 60, NULL_U32])
+        self.assertEqual(list(layers["offpeak"]), [0, 100, 120, NULL_U32])
+
+    def test_bucket_for_local_hours_and_weekdays(self) -> None:
+        meta = json.loads(layer_sections(["A"], array("I", [0]), PROFILES)["tb_meta"])
+        tz = dt.timezone(dt.timedelta(hours=-3))
+        self.assertEqual(bucket_for(meta, dt.datetime(2026, 10, 16, 18, 30, tzinfo=tz)), "peak")
+        self.assertEqual(bucket_for(meta, dt.datetime(2026, 10, 16, 21, 30, tzinfo=dt.timezone.utc)), "peak")
+        # Sexta 23h nao e "night" (so sabado/domingo); sabado 23h e.
+        self.assertEqual(bucket_for(meta, dt.datetime(2026, 10, 16, 23, 0, tzinfo=tz)), "offpeak")
+        self.assertEqual(bucket_for(meta, dt.datetime(2026, 10, 17, 23, 0, tzinfo=tz)), "night")
+
+    def test_default_profiles_resolve_outside_repo_root(self) -> None:
+        self.assertTrue(resolve_profiles_path(DEFAULT_TIME_PROFILES).is_file())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Testes do `bairro_name_index.py`: nomes exatos, aliases, RuaCEP e fuzzy.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import unittest
+
+from bairro_name_index import BairroNameIndex, build_name_index
+
+ORDER = [
+    "Centro",
+    "Vila Lobão",
+    "Parque São José",
+    "São José do Egito",
+    "Jardim São Luís",
+    "Parque das Palmeiras",
+    "Residencial Verona",
+    "Jardim Verona",
+]
+
+
+def ruacep(name: str, slug: str) -> dict[str, str]:
+    return {"slug": slug, "url": f"https://example.invalid/{slug}/logradouros/", "bairro_name": name}
+
+
+class NameIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = BairroNameIndex(build_name_index(ORDER))
+
+    def name_of(self, query: str, index: BairroNameIndex | None = None) -> str | None:
+        idx = (index or self.index).resolve(query)
+        return None if idx is None else ORDER[idx]
+
+    def test_exact_and_normalized(self) -> None:
+        self.assertEqual(self.name_of("VILA LOBAO"), "Vila Lobão")
+        self.assertEqual(self.name_of("  vl. lobão "), "Vila Lobão")
+        self.assertEqual(self.name_of("Jd São Luís"), "Jardim São Luís")
+        self.assertEqual(self.index.resolve_with_score("Centro"), (0, 1.0, "exact"))
+
+    def test_seed_alias(self) -> None:
+        # 020_locality.seed.ts grava "Parque São José" como "São José".
+        self.assertEqual(self.name_of("São José"), "Parque São José")
+        self.assertEqual(self.name_of("Sao Jose do Egito"), "São José do Egito")
+
+    def test_prefix_alias_only_when_unique(self) -> None:
+        self.assertEqual(self.name_of("Lobão"), "Vila Lobão")
+        self.assertEqual(self.name_of("das Palmeiras"), "Parque das Palmeiras")
+        self.assertNotIn("verona", self.index.keys)
+
+    def test_fuzzy_with_floor(self) -> None:
+        self.assertEqual(self.index.resolve_with_score("Vila Lobaoo")[2], "fuzzy")
+        self.assertEqual(self.name_of("Vila Lobaoo"), "Vila Lobão")
+        self.assertIsNone(self.name_of("Bairro Inexistente Qualquer"))
+
+    def test_ruacep_spellings_become_aliases(self) -> None:
+        index = BairroNameIndex(
+            build_name_index(
+                ORDER,
+                {
+                    "jardim sao luiz": ruacep("Jardim São Luiz", "jardim-sao-luiz"),
+                    "parque palmeiras": ruacep("Parque Palmeiras", "pq-palmeiras"),
+                    "nada parecido": ruacep("Nada Parecido", "nada-parecido"),
+                },
+            )
+        )
+        self.assertEqual(index.resolve_with_score("Jardim São Luiz")[2], "exact")
+        self.assertEqual(self.name_of("Jardim São Luiz", index), "Jardim São Luís")
+        self.assertEqual(self.name_of("pq palmeiras", index), "Parque das Palmeiras")
+        self.assertNotIn("nada parecido", index.keys)
+        self.assertEqual(self.name_of("Centro", index), "Centro")
+
+
+if __name__ == "__main__":
+    unittest.main()
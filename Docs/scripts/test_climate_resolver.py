@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Testes do `climate_resolver.py`: uma passada upstream por faixa, com ou sem queda.
+
+Usa a politica real (`Docs/config/freight-fallback-policy.json`), relogio
+virtual e ClimateStub no lugar dos fetchers HTTP.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from climate_resolver import ClimateResolver, ClimateStub
+from freight_quote import load_policy
+
+POLICY = Path(__file__).resolve().parents[1] / "config" / "freight-fallback-policy.json"
+
+
+class ClimateResolverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.policy = load_policy(POLICY)
+        self.now = 1_800_000_000.0
+        self.now -= self.now % 600
+
+    def run_buckets(self, stubs: dict[str, ClimateStub], buckets: int = 3) -> ClimateResolver:
+        resolver = ClimateResolver(self.policy, fetchers=stubs, lat=-5.52, lon=-47.47, clock=lambda: self.now)
+        self.addCleanup(resolver.close)
+        base = self.now
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            for bucket in range(buckets):
+                # Inicio, meio, janela de prefetch e fim da faixa.
+                for offset in (1.0, 300.0, 570.0, 599.0):
+                    self.now = base + bucket * 600 + offset
+                    results = list(pool.map(lambda _i: resolver.resolve(), range(50)))
+                    self.assertEqual(len({r["bucket"] for r in results}), 1)
+                    self.wait_background(resolver)
+        return resolver
+
+    @staticmethod
+    def wait_background(resolver: ClimateResolver) -> None:
+        deadline = time.monotonic() + 2.0
+        while resolver.resolver._scheduled:
+            if time.monotonic() > deadline:
+                raise AssertionError("background nao terminou")
+            time.sleep(0.005)
+
+    def attempts(self, provider_id: str) -> int:
+        spec = next(s for s in self.policy["domains"]["climate"]["providers"] if s["id"] == provider_id)
+        return 1 + int(spec.get("max_retries", 0))
+
+    def test_one_call_per_bucket_when_healthy(self) -> None:
+        stubs = {"openweather": ClimateStub("openweather", latency_ms=20), "met_no": ClimateStub("met_no")}
+        self.run_buckets(stubs)
+        self.assertEqual(set(stubs["openweather"].calls.values()), {1})
+        self.assertEqual(len(stubs["openweather"].calls), 4)  # 3 faixas + prefetch da seguinte
+        self.assertEqual(sum(stubs["met_no"].calls.values()), 0)
+
+    def test_one_pass_per_bucket_when_all_providers_fail(self) -> None:
+        stubs = {
+            "openweather": ClimateStub("openweather", latency_ms=20, failure_rate=1.0),
+            "met_no": ClimateStub("met_no", latency_ms=10, failure_rate=1.0),
+        }
+        resolver = self.run_buckets(stubs)
+        # Uma passada por faixa: cada provider so repete os `max_retries` da politica.
+        for provider_id, stub in stubs.items():
+            self.assertEqual(set(stub.calls.values()), {self.attempts(provider_id)}, provider_id)
+            self.assertEqual(len(stub.calls), 4)
+        self.assertEqual(resolver.resolver.stats["default_applied_total"], 4)
+        result = resolver.resolve()
+        self.assertEqual((result["source"], result["is_raining"]), ("climate_default_no_rain", False))
+
+
+if __name__ == "__main__":
+    unittest.main()
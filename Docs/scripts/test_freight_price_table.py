@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Testes do `freight_price_table.py`: a tabela pre-calculada bate com o motor.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from array import array
+from pathlib import Path
+
+from bairro_matrix_bin import NULL_U32
+from freight_price_table import (
+    PRICE_NO_ROUTE,
+    PRICE_OUT_OF_COVERAGE,
+    ActivePriceTable,
+    PriceTable,
+    write_price_table,
+)
+from freight_quote import FLAG_COMBINATIONS, ZONE_NO_ROUTE, FreightQuoteEngine, load_policy
+
+POLICY = Path(__file__).resolve().parents[1] / "config" / "freight-fallback-policy.json"
+N = NULL_U32
+ORDER = ["A", "B", "C", "D", "E"]
+# Zonas variadas, um par entre faixas (1550 m), sem rota e acima da distancia maxima.
+DISTANCE = [
+    [0, 900, 1550, 3500, N],
+    [900, 0, 2000, 7000, 99000],
+    [1600, 2100, 0, 5000, 12000],
+    [3400, 7100, 5100, 0, 800],
+    [N, 98000, 12100, 850, 0],
+]
+
+
+def engine_for(business_rules: dict) -> FreightQuoteEngine:
+    distance = array("I", (v for row in DISTANCE for v in row))
+    duration = array("I", (v if v == N else max(1, v // 8) for v in distance))
+    return FreightQuoteEngine(ORDER, distance, duration, business_rules)
+
+
+class PriceTableTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.rules = load_policy(POLICY)["business_rules"]
+        self.engine = engine_for(self.rules)
+
+    def write(self, version_code: str) -> Path:
+        path = self.dir / f"{version_code}.price.bin"
+        write_price_table(path, self.engine, version_code, "test")
+        return path
+
+    def test_table_matches_engine(self) -> None:
+        n = self.engine.n
+        origins = [o for o in range(n) for _d in range(n)]
+        destinations = [d for _o in range(n) for d in range(n)]
+        with PriceTable(self.write("v1")) as table:
+            # "expressa" nao tem regra: adicional 0 nos dois lados, como o backend.
+            for urgency in [*self.rules["urgency_addon_brl"], "expressa"]:
+                for flags in range(FLAG_COMBINATIONS):
+                    quote = self.engine.quote_batch(origins, destinations, urgency, flags)
+                    for k, (o, d) in enumerate(zip(origins, destinations)):
+                        zone = quote["zone"][k]
+                        expected = (
+                            quote["total_cents"][k]
+                            if zone > 0
+                            else PRICE_NO_ROUTE if zone == ZONE_NO_ROUTE else PRICE_OUT_OF_COVERAGE
+                        )
+                        self.assertEqual(table.quote_cents(o, d, urgency, flags), expected, (o, d, urgency, flags))
+                        self.assertEqual(table.price[table.index(o, d, urgency, flags)], expected)
+            self.assertEqual(table.quote_cents(0, 1, "expressa"), table.quote_cents(0, 1, "padrao"))
+            self.assertEqual(table.quote_cents(0, 4), PRICE_NO_ROUTE)
+            self.assertEqual(table.quote_cents(1, 4), PRICE_OUT_OF_COVERAGE)
+
+    def test_active_table_swaps_and_keeps_old_readable(self) -> None:
+        self.write("v1")
+        self.write("v2")
+        changes: list[tuple[str | None, str | None]] = []
+        active = ActivePriceTable(self.dir)
+        active.subscribe(lambda old, new: changes.append((old, new)))
+        first = active.activate("v1")
+        self.assertIs(active.activate("v1"), first)
+        second = active.activate("v2")
+        self.assertEqual(changes, [(None, "v1"), ("v1", "v2")])
+        # Um leitor que ainda segura a tabela aposentada continua cotando.
+        self.assertEqual(first.quote_cents(0, 1), second.quote_cents(0, 1))
+        active.invalidate()
+        self.assertIsNone(active.table)
+        active.close()
+        # As aposentadas ficam com quem as segura; o leitor fecha no fim.
+        first.close()
+        second.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Testes do `freight_quote.py`: zonas e precos contra as regras da politica real.
+
+A referencia le `business_rules` direto do JSON, em km e reais, par a par,
+como o quote.service do backend.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import random
+import unittest
+from array import array
+from pathlib import Path
+from typing import Any
+
+from bairro_matrix_bin import NULL_U32
+from freight_quote import (
+    FLAG_COMBINATIONS,
+    FLAG_HOLIDAY,
+    FLAG_PEAK,
+    FLAG_RAIN,
+    FLAG_SUNDAY,
+    NOT_PRICED,
+    ZONE_NO_ROUTE,
+    ZONE_OUT_OF_COVERAGE,
+    FreightQuoteEngine,
+    flags_mask,
+    load_policy,
+)
+
+POLICY = Path(__file__).resolve().parents[1] / "config" / "freight-fallback-policy.json"
+# Bordas das faixas, o vao entre faixas (1.5-1.6 km) e o limite de cobertura.
+EDGE_DISTANCES = [1, 1499, 1500, 1501, 1550, 1599, 1600, 2300, 2350, 12000, 12700, 12701, 30000]
+
+
+def reference_quote(
+    rules: dict[str, Any], distance_m: int, duration_s: int, urgency: str, flags: int
+) -> tuple[int, int]:
+    """(zona, total em centavos ou NOT_PRICED) calculados em km/reais."""
+    if distance_m == NULL_U32 or duration_s == NULL_U32 or distance_m <= 0 or duration_s <= 0:
+        return ZONE_NO_ROUTE, NOT_PRICED
+    km = distance_m / 1000
+    formula = rules["pricing_formula"]
+    if km > formula["max_distance_policy"]["when_distance_km_gt"]:
+        return ZONE_OUT_OF_COVERAGE, NOT_PRICED
+    zone = next((z for z in rules["distance_zones_brl"] if z["min_km"] <= km <= z["max_km"]), None)
+    if zone is None:
+        return ZONE_OUT_OF_COVERAGE, NOT_PRICED
+    addons = rules["conditional_addons_brl"]
+    total = zone["value"] + rules["urgency_addon_brl"].get(urgency, 0)
+    for flag, key in ((FLAG_SUNDAY, "sunday"), (FLAG_HOLIDAY, "holiday"), (FLAG_RAIN, "rain"), (FLAG_PEAK, "peak")):
+        if flags & flag:
+            total += addons[key]
+    return zone["zone"], round(max(total, formula["minimum_charge_brl"]) * 100)
+
+
+class FreightQuoteEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.rules = load_policy(POLICY)["business_rules"]
+        rng = random.Random(11)
+        self.n = 24
+        cells = self.n * self.n
+        values = [rng.choice(EDGE_DISTANCES) if rng.random() < 0.3 else rng.randint(0, 14000) for _ in range(cells)]
+        values[5] = NULL_U32
+        self.distance = array("I", values)
+        self.duration = array("I", (v if v == NULL_U32 else v // 9 for v in values))
+        self.duration[7] = NULL_U32
+        self.engine = FreightQuoteEngine([f"B{k}" for k in range(self.n)], self.distance, self.duration, self.rules)
+
+    def test_quote_batch_matches_reference(self) -> None:
+        rng = random.Random(12)
+        size = 2000
+        origins = [rng.randrange(self.n) for _ in range(size)]
+        destinations = [rng.randrange(self.n) for _ in range(size)]
+        urgencies = [rng.choice([*self.rules["urgency_addon_brl"], "expressa"]) for _ in range(size)]
+        flags = [rng.randrange(FLAG_COMBINATIONS) for _ in range(size)]
+        quote = self.engine.quote_batch(origins, destinations, urgencies, flags)
+        for k in range(size):
+            cell = origins[k] * self.n + destinations[k]
+            expected = reference_quote(self.rules, self.distance[cell], self.duration[cell], urgencies[k], flags[k])
+            self.assertEqual((quote["zone"][k], quote["total_cents"][k]), expected, (self.distance[cell], k))
+            self.assertEqual(quote["distance_m"][k], self.distance[cell])
+        self.assertEqual({ZONE_NO_ROUTE, ZONE_OUT_OF_COVERAGE, 1, 15} - set(quote["zone"]), set())
+
+    def test_price_all_pairs_matches_batch(self) -> None:
+        origins = [o for o in range(self.n) for _d in range(self.n)]
+        destinations = [d for _o in range(self.n) for d in range(self.n)]
+        for urgency in ("padrao", "urgente", "expressa"):
+            for flags in (0, FLAG_RAIN, FLAG_COMBINATIONS - 1):
+                batch = self.engine.quote_batch(origins, destinations, urgency, flags)
+                self.assertEqual(self.engine.price_all_pairs(urgency, flags), batch["total_cents"])
+
+    def test_flags_mask(self) -> None:
+        self.assertEqual(flags_mask(), 0)
+        self.assertEqual(flags_mask(is_sunday=True, is_raining=True), FLAG_SUNDAY | FLAG_RAIN)
+        self.assertEqual(flags_mask(True, True, True, True), FLAG_COMBINATIONS - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Testes do `generate_imperatriz_bairro_matrix.py` sem rede.
+
+As chamadas HTTP sao trocadas por respostas deterministicas com latencia
+aleatoria: o caminho concorrente tem de dar o mesmo resultado do sequencial.
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import random
+import tempfile
+import time
+import unittest
+import zlib
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import generate_imperatriz_bairro_matrix as gen
+
+NAMES = [
+    "Centro",
+    "Bacuri",
+    "Vila Lobão",
+    "Parque São José",
+    "Jardim São Luís",
+    "Nova Imperatriz",
+    "Santa Rita",
+    "Bairro Inexistente",
+]
+
+
+def fake_nominatim_rows(query: str) -> list[dict[str, Any]]:
+    """Ate 3 linhas por consulta, fixas para a mesma string; poucas passam do threshold."""
+    if "Inexistente" in query:
+        return []
+    rng = random.Random(zlib.crc32(query.encode("utf-8")))
+    rows = []
+    for k in range(rng.randint(0, 3)):
+        display = ", ".join(
+            part
+            for part, keep in (
+                (query.split(",")[0], rng.random() < 0.3),
+                ("Imperatriz", rng.random() < 0.4),
+                ("Maranhao", rng.random() < 0.4),
+            )
+            if keep
+        )
+        rows.append(
+            {
+                "osm_type": "relation",
+                "osm_id": rng.randint(1, 6),
+                "lat": f"{-5.5 - rng.random() / 10:.6f}",
+                "lon": f"{-47.4 - rng.random() / 10:.6f}",
+                "display_name": display,
+                "type": rng.choice(["suburb", "residential", "road"]),
+                "class": rng.choice(["place", "highway"]),
+                "address": {"city": "Imperatriz" if k % 2 == 0 else ""},
+            }
+        )
+    return rows
+
+
+def fake_osrm_block(
+    src_coords: list[tuple[float, float]], dst_coords: list[tuple[float, float]]
+) -> tuple[list[list[float | None]], list[list[float | None]]]:
+    """Distancia assimetrica derivada so das coordenadas; pares com lat > -5.49 ficam sem rota."""
+    dists = [
+        [
+            None
+            if max(src[0], dst[0]) > -5.49 and src != dst
+            else abs(src[0] - dst[0]) * 111_000 + abs(src[1] - dst[1]) * 98_000 + (src[0] < dst[0]) * 37.4
+            for dst in dst_coords
+        ]
+        for src in src_coords
+    ]
+    return dists, [[None if d is None else d / 8.3 for d in row] for row in dists]
+
+
+def fake_http_get_json(url: str, params: dict[str, Any], timeout: int = 60) -> Any:
+    time.sleep(random.uniform(0, 0.004))
+    return fake_nominatim_rows(params["q"])
+
+
+class ConcurrentGeocodeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        patcher = mock.patch.object(gen, "http_get_json", fake_http_get_json)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def geocode(self, label: str, **pool: int) -> list[dict[str, Any]]:
+        cache = gen.GeocodeCache(self.tmp / f"{label}.sqlite3")
+        self.addCleanup(cache.close)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return gen.geocode_bairros(
+                NAMES,
+                cache=cache,
+                limiters=gen.build_rate_limiters(0, 0),
+                provider="nominatim",
+                google_api_key="",
+                city=gen.city_profile(gen.DEFAULT_CITY),
+                ruacep_index=None,
+                ruacep_context_cache={},
+                **pool,
+            )
+
+    def test_concurrent_matches_sequential(self) -> None:
+        sequential = self.geocode("seq", workers=1)
+        self.assertEqual({geo["status"] for geo in sequential}, {"ok", "not_found"})
+        for attempt in range(3):
+            self.assertEqual(self.geocode(f"par{attempt}", workers=8, query_workers=3), sequential)
+
+    def test_token_bucket_spaces_calls(self) -> None:
+        bucket = gen.TokenBucket(200.0, capacity=1.0)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # Sem rajada: 10 intervalos de 5 ms depois do primeiro token.
+        self.assertGreaterEqual(time.monotonic() - start, 0.045)
+
+
+def bairros_at(coords: dict[str, tuple[float, float] | None]) -> list[dict[str, Any]]:
+    return [
+        {"id": k + 1, "name": name, "lat": None if at is None else at[0], "lon": None if at is None else at[1]}
+        for k, (name, at) in enumerate(coords.items())
+    ]
+
+
+class IncrementalMatrixTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls: list[int] = []
+
+        def block(src: list[tuple[float, float]], dst: list[tuple[float, float]]) -> Any:
+            self.calls.append(len(src) * len(dst))
+            return fake_osrm_block(src, dst)
+
+        patcher = mock.patch.object(gen, "osrm_table_block", block)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def test_incremental_equals_full_rebuild(self) -> None:
+        rng = random.Random(3)
+        coords = {f"Bairro {k}": (-5.5 - rng.random() / 10, -47.4 - rng.random() / 10) for k in range(11)}
+        coords["Beira Rio"] = (-5.485, -47.49)
+        previous_bairros = bairros_at(coords)
+        distance_m, duration_s, _ = gen.build_matrix(previous_bairros, block_size=4)
+        previous = {
+            "bairros": previous_bairros,
+            "matrix": {"order": list(coords), "distance_m": distance_m, "duration_s": duration_s},
+        }
+
+        # Um bairro re-geocodificado, um removido, um novo, um sem coordenada e a ordem trocada.
+        current = dict(reversed(list(coords.items())))
+        current["Bairro 3"] = (-5.53, -47.41)
+        del current["Bairro 7"]
+        current["Bairro Novo"] = (-5.56, -47.45)
+        current["Sem Ponto"] = None
+        bairros = bairros_at(current)
+
+        self.calls.clear()
+        *incremental, summary = gen.build_matrix_incremental(bairros, previous, block_size=4)
+        incremental_cells = sum(self.calls)
+        self.calls.clear()
+        full = gen.build_matrix(bairros, block_size=4)
+        self.assertEqual(list(incremental), list(full))
+        self.assertEqual(summary["recomputed_bairros"], ["Bairro 3", "Bairro Novo"])
+        self.assertEqual(summary["removed_bairros"], ["Bairro 7"])
+        self.assertLess(incremental_cells, sum(self.calls) / 2)
+
+
+class OsrmJournalResumeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "m.osrm-journal.jsonl"
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+        rng = random.Random(22)
+        self.bairros = bairros_at({f"B{k}": (-5.5 - rng.random() / 10, -47.4 - rng.random() / 10) for k in range(9)})
+
+    def build(self, block: Any, resume: bool) -> tuple[Any, ...]:
+        journal = gen.OsrmBlockJournal(self.path, "http://osrm.invalid/table", resume=resume)
+        try:
+            with mock.patch.object(gen, "osrm_table_block", block), mock.patch.object(gen.time, "sleep"):
+                return gen.build_matrix(self.bairros, block_size=3, workers=3, journal=journal)
+        finally:
+            journal.close()
+
+    def test_resume_skips_journaled_blocks(self) -> None:
+        first_origins: list[float] = []
+
+        def flaky(src: list[tuple[float, float]], dst: list[tuple[float, float]]) -> Any:
+            # O bloco de origens do meio nunca responde na primeira execucao.
+            if src[0][0] == self.bairros[3]["lat"]:
+                raise OSError("timeout")
+            first_origins.append(src[0][0])
+            return fake_osrm_block(src, dst)
+
+        with self.assertRaisesRegex(RuntimeError, "--resume"):
+            self.build(flaky, resume=False)
+        self.assertEqual(len(first_origins), 6)
+
+        resumed_blocks: list[tuple[float, float]] = []
+
+        def healthy(src: list[tuple[float, float]], dst: list[tuple[float, float]]) -> Any:
+            resumed_blocks.append((src[0][0], dst[0][0]))
+            return fake_osrm_block(src, dst)
+
+        resumed = self.build(healthy, resume=True)
+        # So os 3 blocos que falharam voltam ao OSRM.
+        self.assertEqual({origin for origin, _ in resumed_blocks}, {self.bairros[3]["lat"]})
+        self.assertEqual(len(resumed_blocks), 3)
+        with mock.patch.object(gen, "osrm_table_block", fake_osrm_block):
+            self.assertEqual(resumed, gen.build_matrix(self.bairros, block_size=3))
+
+
+def sequential_candidates(
+    queries: list[str], rows_of: dict[str, list[dict[str, Any]]], threshold: int
+) -> tuple[tuple[int, str, dict[str, Any]] | None, str | None]:
+    """O laco original: uma variante por vez, parando na primeira linha no threshold."""
+    best: tuple[int, str, dict[str, Any]] | None = None
+    last_error = None
+    for query in queries:
+        rows = rows_of[query]
+        if rows is None:
+            last_error = f"falha {query}"
+            continue
+        for row in rows:
+            if best is None or row["score"] > best[0]:
+                best = (row["score"], query, row)
+                if row["score"] >= threshold:
+                    break
+        if best is not None and best[0] >= threshold:
+            break
+    return best, last_error
+
+
+class EvaluateQueryCandidatesTest(unittest.TestCase):
+    def test_matches_sequential_loop(self) -> None:
+        rng = random.Random(19)
+        for case in range(200):
+            queries = [f"q{case}-{k}" for k in range(rng.randint(1, 6))]
+            # None = erro HTTP; ids repetidos entre variantes exercitam o dedupe.
+            rows_of = {
+                query: None
+                if rng.random() < 0.15
+                else [
+                    {"id": (ident := rng.randint(0, 8)), "score": ident * 12 + 3}
+                    for _ in range(rng.randint(0, 4))
+                ]
+                for query in queries
+            }
+
+            def fetch(query: str) -> list[dict[str, Any]]:
+                time.sleep(rng.random() / 2000)
+                if rows_of[query] is None:
+                    raise OSError(f"falha {query}")
+                return rows_of[query]
+
+            best, last_error = gen.evaluate_query_candidates(
+                queries,
+                fetch,
+                lambda row: row["score"],
+                lambda row: row["id"],
+                gen.TokenBucket(0),
+                75,
+                "test",
+                workers=4,
+            )
+            expected_best, expected_error = sequential_candidates(queries, rows_of, 75)
+            self.assertEqual(best, expected_best, rows_of)
+            if expected_best is None:
+                self.assertEqual(last_error, expected_error)
+
+
+class RuacepContextTest(unittest.TestCase):
+    def test_context_goes_through_page_cache_and_limiter(self) -> None:
+        client = mock.Mock()
+        client.get.return_value = (200, {"ETag": '"v1"'}, b"<html></html>")
+        limiter = mock.Mock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(gen, "HTTP_CLIENT", client):
+            page_cache = gen.PageCache(Path(tmp) / "pages.sqlite3")
+            url = "https://example.invalid/centro/logradouros/"
+            first = gen.fetch_ruacep_context(url, page_cache, limiter, max_age_s=3600)
+            second = gen.fetch_ruacep_context(url, page_cache, limiter, max_age_s=3600)
+            page_cache.close()
+        self.assertEqual(first, second)
+        self.assertEqual((client.get.call_count, limiter.acquire.call_count), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
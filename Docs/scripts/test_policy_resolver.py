@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Testes do `policy_resolver.py` com relogio falso e StubProvider.
+
+Cobre stale-while-revalidate (fresh/stale/miss), default do `on_all_fail`
+sem sobrescrever entrada velha, coalescencia de misses e as transicoes do
+circuit breaker (closed -> open -> half_open -> closed).
+
+Uso:
+  python -m unittest discover -s Docs/scripts -p "test_*.py"
+"""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import Any, Callable
+
+from distance_time_resolver import MatrixSource, StubProvider
+from policy_resolver import OrderedFailoverResolver
+
+REQUEST = {"origin_index": 0, "destination_index": 1}
+DEFAULT = {"distance_m": 1, "duration_s": 1, "source": "default_test"}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wait_for(condition: Callable[[], bool], timeout_s: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condicao nao atingida a tempo")
+        time.sleep(0.005)
+
+
+def provider_spec(provider_id: str, priority: int, **extra: Any) -> dict[str, Any]:
+    return {"id": provider_id, "kind": "local_file", "enabled": True, "priority": priority, "max_retries": 0, **extra}
+
+
+class PolicyResolverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "matriz.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "matrix": {
+                        "order": ["Centro", "Bacuri"],
+                        "distance_m": [[0, 1200], [1300, 0]],
+                        "duration_s": [[0, 180], [190, 0]],
+                    }
+                }
+            ),
+            encoding="utf-8",
+        )
+        self.source = MatrixSource(path)
+        self.clock = FakeClock()
+
+    def resolver(
+        self,
+        providers: dict[str, StubProvider],
+        specs: list[dict[str, Any]] | None = None,
+        on_all_fail: dict[str, Any] | None = None,
+    ) -> OrderedFailoverResolver:
+        domain = {
+            "strategy": "ordered_failover",
+            "cache": {"ttl_seconds": 10, "stale_while_revalidate_seconds": 5},
+            "providers": specs or [provider_spec(pid, i + 1) for i, pid in enumerate(providers)],
+            "on_all_fail": on_all_fail or {"action": "reject_quote", "code": "TEST_UNAVAILABLE"},
+        }
+        resolver = OrderedFailoverResolver(domain, dict(providers), clock=self.clock)
+        self.addCleanup(resolver.close)
+        return resolver
+
+    def test_stale_while_revalidate(self) -> None:
+        stub = StubProvider(self.source)
+        resolver = self.resolver({"primary": stub})
+        self.assertEqual(resolver.resolve("k", REQUEST)["cache"], "miss")
+        self.clock.now += 9
+        self.assertEqual(resolver.resolve("k", REQUEST)["cache"], "hit")
+        self.assertEqual(stub.calls, 1)
+
+        self.clock.now += 3
+        stub.factor = 2.0
+        stale = resolver.resolve("k", REQUEST)
+        self.assertEqual((stale["cache"], stale["distance_m"]), ("stale", 1200))
+        wait_for(lambda: stub.calls == 2 and not resolver._flight.in_flight("k"))
+        fresh = resolver.resolve("k", REQUEST)
+        self.assertEqual((fresh["cache"], fresh["distance_m"]), ("hit", 2400))
+
+        self.clock.now += 15
+        self.assertEqual(resolver.resolve("k", REQUEST)["cache"], "miss")
+        self.assertEqual(stub.calls, 3)
+
+    def test_default_never_replaces_stale_entry(self) -> None:
+        stub = StubProvider(self.source)
+        resolver = self.resolver({"primary": stub}, on_all_fail={"action": "apply_default", "default": DEFAULT})
+        resolver.resolve("k", REQUEST)
+        self.clock.now += 12
+        stub.failure_rate = 1.0
+        self.assertEqual(resolver.resolve("k", REQUEST)["cache"], "stale")
+        wait_for(lambda: resolver.stats["default_applied_total"] == 1 and not resolver._flight.in_flight("k"))
+        value, state = resolver.cache.get("k")
+        self.assertEqual((state, value["provider"]), ("stale", "primary"))
+
+    def test_default_on_miss_is_retried(self) -> None:
+        stub = StubProvider(self.source, failure_rate=1.0)
+        resolver = self.resolver({"primary": stub}, on_all_fail={"action": "apply_default", "default": DEFAULT})
+        first = resolver.resolve("k", REQUEST)
+        self.assertTrue(first["default_applied"])
+        self.assertEqual(first["provider"], "default_test")
+
+        stub.failure_rate = 0.0
+        second = resolver.resolve("k", REQUEST)
+        self.assertEqual((second["cache"], second["provider"]), ("hit", "default_test"))
+        wait_for(lambda: stub.calls == 2 and not resolver._flight.in_flight("k"))
+        third = resolver.resolve("k", REQUEST)
+        self.assertEqual((third["provider"], third["distance_m"]), ("primary", 1200))
+        self.assertNotIn("default_applied", third)
+
+    def test_concurrent_misses_coalesce(self) -> None:
+        stub = StubProvider(self.source, latency_ms=100)
+        resolver = self.resolver({"primary": stub})
+        barrier = threading.Barrier(8)
+        results: list[dict[str, Any]] = []
+
+        def run() -> None:
+            barrier.wait()
+            results.append(resolver.resolve("k", REQUEST))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stub.calls, 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(resolver.stats["coalesced_total"] + resolver.stats["cache_hit_total"], 7)
+
+    def test_breaker_transitions(self) -> None:
+        primary = StubProvider(self.source, failure_rate=1.0)
+        backup = StubProvider(self.source, factor=2.0)
+        breaker = {"failure_threshold": 2, "open_seconds": 30, "half_open_max_requests": 1}
+        specs = [provider_spec("primary", 1, circuit_breaker=breaker), provider_spec("backup", 2)]
+        resolver = self.resolver({"primary": primary, "backup": backup}, specs=specs)
+
+        for key in ("a", "b"):
+            self.assertEqual(resolver.resolve(key, REQUEST)["provider"], "backup")
+        self.assertEqual(resolver.breaker_states(), {"primary": "open"})
+        resolver.resolve("c", REQUEST)
+        self.assertEqual(primary.calls, 2)
+        self.assertEqual(resolver.stats["provider_circuit_open_total"], 1)
+
+        # half_open: uma falha reabre, um sucesso fecha.
+        self.clock.now += 30
+        resolver.resolve("d", REQUEST)
+        self.assertEqual((primary.calls, resolver.breaker_states()["primary"]), (3, "open"))
+        self.clock.now += 30
+        primary.failure_rate = 0.0
+        self.assertEqual(resolver.resolve("e", REQUEST)["provider"], "primary")
+        self.assertEqual(resolver.breaker_states(), {"primary": "closed"})
+
+
+if __name__ == "__main__":
+    unittest.main()